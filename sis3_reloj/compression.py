@@ -0,0 +1,92 @@
+# sis3_reloj/compression.py
+"""
+Compresión de cuerpos HTTP (Content-Encoding) para los sinks SIS3 / SIS2-http.
+
+- "gzip": siempre disponible (stdlib).
+- "zstd": requiere `pip install zstandard`; si no está, se usa gzip.
+- "none": JSON tal cual.
+
+Solo se comprime si el JSON pesa al menos `min_bytes` (cuerpos chicos no ganan
+nada). OJO: el servidor debe aceptar Content-Encoding en el request; por eso
+el default en config.ini es "none".
+"""
+from __future__ import annotations
+
+import gzip
+import json
+from dataclasses import dataclass
+from typing import Any
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+
+ENCODINGS = ("none", "gzip", "zstd")
+DEFAULT_MIN_BYTES = 1024
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    body: bytes
+    encoding: str  # "identity" | "gzip" | "zstd"
+    raw_bytes: int
+
+    @property
+    def sent_bytes(self) -> int:
+        return len(self.body)
+
+    @property
+    def ratio(self) -> float:
+        """
+        raw / enviado (1.0 = sin compresión).
+        """
+        return self.raw_bytes / self.sent_bytes if self.sent_bytes else 1.0
+
+    def headers(self) -> dict:
+        h = {"Content-Type": "application/json"}
+        if self.encoding != "identity":
+            h["Content-Encoding"] = self.encoding
+        return h
+
+
+def normalize_encoding(value: str) -> str:
+    v = (value or "none").strip().lower()
+    if v in ("", "off", "false", "no"):
+        return "none"
+    if v not in ENCODINGS:
+        raise ValueError(f"compresión inválida: {value!r}. Usa 'none', 'gzip' o 'zstd'.")
+    if v == "zstd" and zstandard is None:
+        return "gzip"
+    return v
+
+
+def encode_json(payload: Any, encoding: str = "none", *, min_bytes: int = DEFAULT_MIN_BYTES) -> EncodedBody:
+    """
+    Serializa `payload` a JSON (UTF-8) y lo comprime según `encoding`.
+    """
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoding = normalize_encoding(encoding)
+    if encoding == "none" or len(raw) < int(min_bytes or 0):
+        return EncodedBody(raw, "identity", len(raw))
+    if encoding == "zstd":
+        return EncodedBody(zstandard.ZstdCompressor(level=3).compress(raw), "zstd", len(raw))
+    # mtime=0: mismo payload → mismos bytes
+    return EncodedBody(gzip.compress(raw, compresslevel=6, mtime=0), "gzip", len(raw))
+
+
+def summarize(bodies: list[EncodedBody], upload_sec: float) -> dict:
+    """
+    Resumen para el dict de resultado del sink.
+    """
+    raw = sum(b.raw_bytes for b in bodies)
+    sent = sum(b.sent_bytes for b in bodies)
+    encodings = sorted({b.encoding for b in bodies}) or ["identity"]
+    return {
+        "encoding": encodings[0] if len(encodings) == 1 else ",".join(encodings),
+        "raw_bytes": raw,
+        "sent_bytes": sent,
+        "ratio": round(raw / sent, 2) if sent else 1.0,
+        "upload_sec": round(upload_sec, 3),
+    }
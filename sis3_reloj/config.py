@@ -1,9 +1,12 @@
 # sis3_reloj/config.py
 from configparser import ConfigParser
+from dataclasses import dataclass
 from pathlib import Path
 import sys
 import os
 
+from .compression import normalize_encoding
+
 APP_NAME = "SIS3RelojChecador"
 
 def _exe_dir() -> Path:
@@ -35,6 +38,60 @@ if getattr(sys, "frozen", False):
     CONFIG_PATH = _exe_dir() / "config.ini"
 else:
     CONFIG_PATH = BASE_DIR / "config.ini"
+
+
+@dataclass(frozen=True)
+class DeviceConfig:
+    """
+    Un reloj checador. [reloj] es el principal (primary=True);
+    los demás vienen de secciones [reloj:<nombre>].
+    """
+    name: str
+    ip: str
+    port: int = 4370
+    password: int = 0
+    primary: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.ip}:{self.port}"
+
+
+def _load_devices(parser: ConfigParser, primary: DeviceConfig) -> list:
+    devices = [primary]
+    seen = {primary.key}
+    for section in parser.sections():
+        if not section.lower().startswith("reloj:"):
+            continue
+        name = section.split(":", 1)[1].strip() or section
+        if not parser.getboolean(section, "enabled", fallback=True):
+            continue
+        ip = parser.get(section, "ip", fallback="").strip()
+        if not ip:
+            continue
+        dev = DeviceConfig(
+            name=name,
+            ip=ip,
+            port=parser.getint(section, "port", fallback=4370),
+            password=parser.getint(section, "password", fallback=0),
+        )
+        # Mismo ip:port dos veces = mismo reloj (evita dos workers sobre un equipo)
+        if dev.key in seen:
+            continue
+        seen.add(dev.key)
+        devices.append(dev)
+    return devices
+
+
+def _get_compression(parser: ConfigParser, section: str) -> str:
+    # Se valida al cargar: un typo no debe aparecer hasta el envío (ya leído el reloj)
+    raw = parser.get(section, "compression", fallback="none")
+    try:
+        return normalize_encoding(raw)
+    except ValueError as e:
+        raise ValueError(f"config.ini [{section}] {e}") from None
+
+
 class AppConfig:
     def __init__(
         self,
@@ -60,6 +117,26 @@ class AppConfig:
         sis3_base_url: str,
         sis3_api_key: str,
         sis3_timeout_sec: int,
+        sis3_pool_size: int = 4,
+        sis3_keepalive: bool = True,
+        sis3_chunk_records: int = 2000,
+        sis3_chunk_max_kb: int = 512,
+        sis3_max_in_flight: int = 2,
+        sis3_compression: str = "none",
+        sis3_compress_min_bytes: int = 1024,
+        sis2_compression: str = "none",
+        sis2_compress_min_bytes: int = 1024,
+        sis2_db_insert_strategy: str = "bulk",
+        sis2_db_pool_size: int = 4,
+        sis2_db_pool_max_idle_sec: int = 300,
+        sis2_personal_page_size: int = 500,
+
+        # Flota: [reloj:<nombre>] + [fleet]
+        devices: list | None = None,
+        fleet_max_workers: int = 4,
+
+        # Reintentos / circuit breaker: overrides crudos de [retry] (ver retry.configure_retry)
+        retry: dict | None = None,
     ):
         self.ip = ip
         self.port = port
@@ -83,11 +160,34 @@ class AppConfig:
         self.sis2_db_password = sis2_db_password
         self.sis2_db_driver = sis2_db_driver
         self.sis2_db_trust_server_certificate = sis2_db_trust_server_certificate
+        self.sis2_db_insert_strategy = sis2_db_insert_strategy
+        self.sis2_db_pool_size = max(1, int(sis2_db_pool_size or 1))
+        self.sis2_db_pool_max_idle_sec = max(0, int(sis2_db_pool_max_idle_sec or 0))
+        self.sis2_personal_page_size = max(1, int(sis2_personal_page_size or 500))
 
         # ✅ SIS3 API
         self.sis3_base_url = sis3_base_url
         self.sis3_api_key = sis3_api_key
         self.sis3_timeout_sec = sis3_timeout_sec
+        self.sis3_pool_size = max(1, int(sis3_pool_size or 1))
+        self.sis3_keepalive = sis3_keepalive
+        self.sis3_chunk_records = max(0, int(sis3_chunk_records or 0))
+        self.sis3_chunk_max_kb = max(0, int(sis3_chunk_max_kb or 0))
+        self.sis3_max_in_flight = max(1, int(sis3_max_in_flight or 1))
+
+        # Compresión de requests HTTP (SIS3 y SIS2 mode=http)
+        self.sis3_compression = sis3_compression
+        self.sis3_compress_min_bytes = sis3_compress_min_bytes
+        self.sis2_compression = sis2_compression
+        self.sis2_compress_min_bytes = sis2_compress_min_bytes
+
+        # Flota (el primero siempre es [reloj])
+        self.devices = list(devices) if devices else [
+            DeviceConfig(name="principal", ip=ip, port=port, password=password, primary=True)
+        ]
+        self.fleet_max_workers = max(1, int(fleet_max_workers or 1))
+
+        self.retry = dict(retry or {})
 
 
 def load_config() -> AppConfig:
@@ -119,11 +219,35 @@ def load_config() -> AppConfig:
     sis2_db_password = parser.get("sis2_db", "password", fallback="")  # recomendado vacío + env
     sis2_db_driver = parser.get("sis2_db", "driver", fallback="ODBC Driver 18 for SQL Server")
     sis2_db_trust = parser.getboolean("sis2_db", "trust_server_certificate", fallback=True)
+    sis2_db_insert_strategy = parser.get("sis2_db", "insert_strategy", fallback="bulk")
+    sis2_db_pool_size = parser.getint("sis2_db", "pool_size", fallback=4)
+    sis2_db_pool_max_idle_sec = parser.getint("sis2_db", "pool_max_idle_sec", fallback=300)
+    sis2_personal_page_size = parser.getint("sis2_db", "personal_page_size", fallback=500)
 
     # ✅ SIS3 API
     sis3_base_url = parser.get("sis3", "base_url", fallback="")
     sis3_api_key  = parser.get("sis3", "api_key", fallback="")
     sis3_timeout_sec = parser.getint("sis3", "timeout_sec", fallback=20)
+    sis3_pool_size = parser.getint("sis3", "pool_size", fallback=4)
+    sis3_keepalive = parser.getboolean("sis3", "keepalive", fallback=True)
+    sis3_chunk_records = parser.getint("sis3", "chunk_records", fallback=2000)
+    sis3_chunk_max_kb = parser.getint("sis3", "chunk_max_kb", fallback=512)
+    sis3_max_in_flight = parser.getint("sis3", "max_in_flight", fallback=2)
+    sis3_compression = _get_compression(parser, "sis3")
+    sis3_compress_min_bytes = parser.getint("sis3", "compress_min_bytes", fallback=1024)
+    sis2_compression = _get_compression(parser, "sis2")
+    sis2_compress_min_bytes = parser.getint("sis2", "compress_min_bytes", fallback=1024)
+
+    # Flota
+    primary = DeviceConfig(
+        name=parser.get("reloj", "name", fallback="principal"),
+        ip=ip, port=port, password=password, primary=True,
+    )
+    devices = _load_devices(parser, primary)
+    fleet_max_workers = parser.getint("fleet", "max_workers", fallback=4)
+
+    # Reintentos: solo las llaves presentes (el resto queda en los defaults de retry.py)
+    retry = dict(parser.items("retry")) if parser.has_section("retry") else {}
 
     return AppConfig(
         ip, port, password,
@@ -133,6 +257,23 @@ def load_config() -> AppConfig:
 
         # ✅ SIS3
         sis3_base_url, sis3_api_key, sis3_timeout_sec,
+        sis3_pool_size=sis3_pool_size,
+        sis3_keepalive=sis3_keepalive,
+        sis3_chunk_records=sis3_chunk_records,
+        sis3_chunk_max_kb=sis3_chunk_max_kb,
+        sis3_max_in_flight=sis3_max_in_flight,
+        sis3_compression=sis3_compression,
+        sis3_compress_min_bytes=sis3_compress_min_bytes,
+        sis2_compression=sis2_compression,
+        sis2_compress_min_bytes=sis2_compress_min_bytes,
+        sis2_db_insert_strategy=sis2_db_insert_strategy,
+        sis2_db_pool_size=sis2_db_pool_size,
+        sis2_db_pool_max_idle_sec=sis2_db_pool_max_idle_sec,
+        sis2_personal_page_size=sis2_personal_page_size,
+
+        devices=devices,
+        fleet_max_workers=fleet_max_workers,
+        retry=retry,
     )
 
 
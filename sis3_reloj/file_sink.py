@@ -1,17 +1,18 @@
 # sis3_reloj/file_sink.py
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Iterable, List
 from .zk_client import AttendanceRecord, UserRecord
 import json
 
 def ensure_dir(path: Path):
     path.mkdir(parents=True, exist_ok=True)
 
-def write_attendance_jsonl(records: List[AttendanceRecord], base_dir: Path, *, subdir: str | None = None) -> Path:
+def write_attendance_jsonl(records: Iterable[AttendanceRecord], base_dir: Path, *, subdir: str | None = None) -> Path:
     """
     Escribe asistencia en JSONL y regresa el path.
     Compat: permite subdir="sis3"/"sis2" sin romper llamadas viejas.
+    Acepta lista o generador (se escribe registro por registro).
     """
     base_dir = Path(base_dir)
     if subdir:
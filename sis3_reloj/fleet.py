@@ -0,0 +1,245 @@
+# sis3_reloj/fleet.py
+"""
+Modo flota: sincroniza asistencias de varios relojes en paralelo.
+
+  python -m sis3_reloj.fleet [--target auto|sis2|sis3] [--workers N] [--device NOMBRE ...] [--no-clear]
+
+- Relojes: [reloj] (principal) + secciones [reloj:<nombre>] de config.ini.
+- Máximo global de workers: [fleet] max_workers (o --workers).
+- Máximo un pipeline a la vez por reloj (lock por ip:port).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from .config import AppConfig, DeviceConfig, load_config
+from .health import precheck
+from .retry import circuit_breaker, configure_retry
+from .zk_client import DeviceSession
+from .gui_tab_sis2 import _attendance_incremental_pipeline_in_session
+from .gui_tab_sis3 import _attendance_incremental_pipeline_sis3_in_session
+
+
+TARGETS = ("auto", "sis2", "sis3")
+
+
+# ───────────────────────────────────────────────────────────────
+# Lock por reloj (un solo pipeline por equipo)
+# ───────────────────────────────────────────────────────────────
+_DEVICE_LOCKS: dict[str, threading.Lock] = {}
+_DEVICE_LOCKS_GUARD = threading.Lock()
+
+
+def device_lock(key: str) -> threading.Lock:
+    with _DEVICE_LOCKS_GUARD:
+        lock = _DEVICE_LOCKS.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _DEVICE_LOCKS[key] = lock
+        return lock
+
+
+# ───────────────────────────────────────────────────────────────
+# Resultado por reloj
+# ───────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class FleetResult:
+    device: str
+    key: str
+    ok: bool
+    elapsed_sec: float
+    results: dict = field(default_factory=dict)  # target -> dict del pipeline
+    error: str = ""
+
+    @property
+    def count(self) -> int:
+        return sum(int(r.get("count", 0) or 0) for r in self.results.values() if not r.get("skipped"))
+
+    def status_text(self) -> str:
+        if self.error:
+            return f"ERROR ({self.error})"
+        parts = []
+        for target, r in self.results.items():
+            if not r.get("ok"):
+                parts.append(f"{target}: ERROR ({r.get('stage')})")
+            elif r.get("skipped"):
+                parts.append(f"{target}: {r.get('reason')}")
+            else:
+                parts.append(f"{target}: {r.get('count', 0)} enviadas")
+        return " | ".join(parts) or "—"
+
+
+def _targets_for(cfg: AppConfig, target: str) -> list[str]:
+    target = (target or "auto").strip().lower()
+    if target not in TARGETS:
+        raise ValueError(f"target inválido: {target!r}. Usa {', '.join(TARGETS)}.")
+    if target != "auto":
+        return [target]
+    # Transición: SIS3 primero (no limpia mientras SIS2 esté conectado), luego SIS2 (limpia)
+    # La limpieza de SIS2 reinicia contador/cursor de SIS3 también (reset_device_log_state)
+    if bool(getattr(cfg, "sis2_disconnected", False)):
+        return ["sis3"]
+    return ["sis3", "sis2"]
+
+
+def sync_device(
+    device: DeviceConfig,
+    cfg: AppConfig,
+    *,
+    targets: Iterable[str],
+    clear_enabled: bool = True,
+    log: Optional[Callable[[str], None]] = None,
+) -> FleetResult:
+    """
+    Corre los pipelines de asistencia de un reloj en una sola sesión.
+    Si un target falla, los siguientes no corren (no limpiar lo que otro destino no recibió).
+    """
+    def _log(msg: str) -> None:
+        if log:
+            log(f"[{device.name}] {msg}")
+
+    started = time.monotonic()
+    lock = device_lock(device.key)
+    if not lock.acquire(blocking=False):
+        _log("Reloj ocupado por otro pipeline; se omite.")
+        return FleetResult(device.name, device.key, False, 0.0, error="busy")
+
+    results: dict = {}
+    try:
+        # Reloj caído: no gastar el timeout de pyzk (ni el de cada target)
+        health = precheck(device.ip, device.port)
+        if health.down:
+            _log(f"❌ Reloj sin respuesta ({health.error or 'sin respuesta'}); se omite.")
+            return FleetResult(device.name, device.key, False, time.monotonic() - started, error="unreachable")
+        # Falló varias veces seguidas hace poco: esperar al half-open del breaker
+        breaker = circuit_breaker("reloj", device.key)
+        if breaker.state == "open":
+            _log(f"❌ Reloj marcado como caído; siguiente intento en {breaker.retry_in():.0f}s. Se omite.")
+            return FleetResult(device.name, device.key, False, time.monotonic() - started, error="circuit_open")
+
+        _log(f"Conectando a {device.ip}:{device.port} ...")
+        with DeviceSession(device.ip, device.port, device.password) as dev:
+            for target in targets:
+                if target == "sis3":
+                    res = _attendance_incremental_pipeline_sis3_in_session(
+                        dev, cfg, _log,
+                        runtime_connected=True,
+                        runtime_clear_enabled=clear_enabled,
+                        primary=device.primary,
+                    )
+                else:
+                    res = _attendance_incremental_pipeline_in_session(
+                        dev, cfg, _log,
+                        runtime_clear_enabled=clear_enabled,
+                        primary=device.primary,
+                    )
+                results[target] = res
+                if not res.get("ok"):
+                    break
+    except Exception as e:
+        _log(f"❌ Error: {e}")
+        return FleetResult(device.name, device.key, False, time.monotonic() - started, results, error=str(e))
+    finally:
+        lock.release()
+
+    ok = bool(results) and all(r.get("ok") for r in results.values())
+    return FleetResult(device.name, device.key, ok, time.monotonic() - started, results)
+
+
+def run_fleet(
+    cfg: AppConfig,
+    *,
+    target: str = "auto",
+    devices: Optional[Iterable[DeviceConfig]] = None,
+    max_workers: Optional[int] = None,
+    clear_enabled: bool = True,
+    log: Optional[Callable[[str], None]] = None,
+) -> list[FleetResult]:
+    """
+    Sincroniza todos los relojes en paralelo (pool acotado).
+    El tiempo total tiende al del reloj más lento, no a la suma.
+    Regresa los resultados en el orden de config.
+    """
+    devices = list(devices if devices is not None else cfg.devices)
+    if not devices:
+        return []
+
+    targets = _targets_for(cfg, target)
+    workers = max(1, min(int(max_workers or cfg.fleet_max_workers), len(devices)))
+
+    log_lock = threading.Lock()
+
+    def _log(msg: str) -> None:
+        if log:
+            with log_lock:
+                log(msg)
+
+    _log(f"[FLOTA] {len(devices)} reloj(es), workers={workers}, targets={','.join(targets)}")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet") as pool:
+        futures = [
+            pool.submit(sync_device, d, cfg, targets=targets, clear_enabled=clear_enabled, log=_log)
+            for d in devices
+        ]
+        return [f.result() for f in futures]
+
+
+def format_results(results: Iterable[FleetResult]) -> str:
+    rows = [("Reloj", "Equipo", "OK", "Nuevas", "Tiempo", "Detalle")]
+    for r in results:
+        rows.append((r.device, r.key, "sí" if r.ok else "NO", str(r.count), f"{r.elapsed_sec:.1f}s", r.status_text()))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    lines = []
+    for i, row in enumerate(rows):
+        lines.append("  ".join(c.ljust(w) for c, w in zip(row, widths)) + "  " + row[-1])
+        if i == 0:
+            lines.append("  ".join("-" * w for w in widths) + "  " + "-" * 7)
+    return "\n".join(lines)
+
+
+# ───────────────────────────────────────────────────────────────
+# CLI
+# ───────────────────────────────────────────────────────────────
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sis3_reloj.fleet", description="Sincroniza asistencias de todos los relojes.")
+    ap.add_argument("--target", choices=TARGETS, default="auto")
+    ap.add_argument("--workers", type=int, default=None, help="máximo de relojes en paralelo (default: [fleet] max_workers)")
+    ap.add_argument("--device", action="append", default=None, help="solo este reloj (nombre o ip:port); repetible")
+    ap.add_argument("--no-clear", action="store_true", help="no limpiar los relojes (modo prueba)")
+    args = ap.parse_args(argv)
+
+    cfg = load_config()
+    configure_retry(cfg.retry)
+    devices = cfg.devices
+    if args.device:
+        wanted = set(args.device)
+        devices = [d for d in devices if d.name in wanted or d.key in wanted]
+        if not devices:
+            print(f"Ningún reloj coincide con: {', '.join(args.device)}", file=sys.stderr)
+            return 2
+
+    started = time.monotonic()
+    results = run_fleet(
+        cfg,
+        target=args.target,
+        devices=devices,
+        max_workers=args.workers,
+        clear_enabled=not args.no_clear,
+        log=print,
+    )
+    elapsed = time.monotonic() - started
+
+    print()
+    print(format_results(results))
+    print(f"\nTotal: {elapsed:.1f}s (suma por reloj: {sum(r.elapsed_sec for r in results):.1f}s)")
+    return 0 if all(r.ok for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
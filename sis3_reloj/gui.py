@@ -5,6 +5,8 @@ from tkinter import ttk
 from pathlib import Path
 
 from .config import load_config, BASE_DIR
+from .health import HealthMonitor, cached_health
+from .retry import configure_retry
 from .gui_tab_sis2 import build_tab_sis2
 from .gui_tab_sis3 import build_tab_sis3
 from .gui_tab_ajustes import build_tab_ajustes
@@ -17,6 +19,7 @@ class SIS3RelojApp(tk.Tk):
     Hooks expuestos a pestañas:
       - set_sis2_badge_state(ok/phase/msg, auto_reset_ms=...)
       - set_reloj_badge_state(ok/phase/msg, auto_reset_ms=...)
+        (en reposo refleja el monitor de salud: en línea / sin respuesta)
       - clear_log()
       - apply_sis2_mode_from_config()
     """
@@ -29,6 +32,7 @@ class SIS3RelojApp(tk.Tk):
         self.geometry("740x720")
 
         self.config_obj = load_config()
+        configure_retry(self.config_obj.retry)
 
         # Vars globales (header)
         self.ip_var = tk.StringVar(value=self.config_obj.ip)
@@ -55,6 +59,14 @@ class SIS3RelojApp(tk.Tk):
         self._sis2_badge_reset_after_id = None
         self._reloj_badge_reset_after_id = None
 
+        # Badge reloj ocupado por una operación (el monitor no lo pisa)
+        self._reloj_busy = False
+
+        # Monitor de salud del reloj (connect TCP corto en segundo plano)
+        self.health = HealthMonitor(
+            on_change=lambda h: self.after(0, self._apply_reloj_health_badge),
+        )
+
         # entries header (para habilitar/deshabilitar)
         self.ent_ip = None
         self.ent_port = None
@@ -63,6 +75,12 @@ class SIS3RelojApp(tk.Tk):
         self._build_ui()
         self.log("[APP] Aplicación iniciada.")
 
+        # El monitor sigue a IP/Port del header
+        self.ip_var.trace_add("write", lambda *_: self._update_health_targets())
+        self.port_var.trace_add("write", lambda *_: self._update_health_targets())
+        self._update_health_targets()
+        self.health.start()
+
         # aplicar modo según config (si SIS2 está “post-SIS2”, ocultar tab)
         self.apply_sis2_mode_from_config()
 
@@ -206,6 +224,39 @@ class SIS3RelojApp(tk.Tk):
         password = int(pass_raw) if pass_raw != "" else 0
         return ip, port, password
 
+    def _update_health_targets(self):
+        try:
+            ip, port, _password = self.get_connection()
+        except ValueError:
+            return
+        if ip:
+            self.health.set_targets([(ip, port)])
+
+    def _reloj_idle_badge(self) -> tuple[str, str]:
+        """
+        Texto/estilo del badge en reposo según el cache de salud (sin conectar).
+        """
+        try:
+            ip, port, _password = self.get_connection()
+            health = cached_health(ip, port)
+        except ValueError:
+            health = None
+        if health is not None and health.up:
+            return f"Reloj: En línea ({health.latency_ms:.0f} ms)", "Reloj.Badge.Connected.TLabel"
+        if health is not None and health.down:
+            return "Reloj: Sin respuesta", "Reloj.Badge.Disconnected.TLabel"
+        return "Reloj: Desconectado", "Reloj.Badge.Disconnected.TLabel"
+
+    def _apply_reloj_health_badge(self):
+        # No pisar una operación en curso ni una confirmación con auto-reset
+        if self.lbl_reloj_state is None or self._reloj_busy or self._reloj_badge_reset_after_id is not None:
+            return
+        text, style = self._reloj_idle_badge()
+        try:
+            self.lbl_reloj_state.config(text=text, style=style)
+        except Exception:
+            pass
+
     def set_config_field(self, name: str, value):
         setattr(self.config_obj, name, value)
 
@@ -365,7 +416,8 @@ class SIS3RelojApp(tk.Tk):
         Badge del checador (ZK) como estado transitorio (socket-like):
           - connecting: durante operación
           - connected: confirmación breve (si auto_reset_ms)
-          - disconnected: estado por defecto (no hay socket abierto)
+          - disconnected: la operación falló / no hay socket abierto
+        Al terminar el auto-reset vuelve al estado del monitor de salud.
         """
         if self.lbl_reloj_state is None:
             if msg:
@@ -381,6 +433,7 @@ class SIS3RelojApp(tk.Tk):
             self._reloj_badge_reset_after_id = None
 
         ph = (phase or "").strip().lower()
+        self._reloj_busy = ph == "connecting"
 
         if ph == "connecting":
             try:
@@ -396,14 +449,8 @@ class SIS3RelojApp(tk.Tk):
 
             if auto_reset_ms and int(auto_reset_ms) > 0:
                 def _reset():
-                    try:
-                        self.lbl_reloj_state.config(
-                            text="Reloj: Desconectado",
-                            style="Reloj.Badge.Disconnected.TLabel",
-                        )
-                    except Exception:
-                        pass
                     self._reloj_badge_reset_after_id = None
+                    self._apply_reloj_health_badge()
 
                 try:
                     self._reloj_badge_reset_after_id = self.after(int(auto_reset_ms), _reset)
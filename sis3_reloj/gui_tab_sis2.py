@@ -5,21 +5,31 @@ from tkinter import ttk, messagebox
 from datetime import datetime
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
+from .compression import normalize_encoding
 from .config import BASE_DIR
-from .state_store import load_state, save_state, get_state_path
+from .health import precheck
+from .state_store import (
+    load_state, save_state, get_state_path,
+    device_key, load_device_state, update_device_state, device_last_ok_ts,
+    reset_device_log_state,
+)
 from .sis2_sink import (
     Sis2Config,
     send_attendance_to_sis2,
     send_probe_to_sis2_db,
-    fetch_pending_personal_from_sis2_db,
-    mark_personal_synced_in_sis2_db,
+    iter_pending_personal_from_sis2_db,
+    mark_personal_synced_bulk,
 )
 from .zk_client import (
-    read_attendance,
+    AttlogCursor,
+    DeviceSession,
+    format_timing,
+    session_scope,
+    iter_attendance,
     read_users,
-    clear_attendance,
-    upsert_user,
 )
 
 # ───────────────────────────────────────────────────────────────
@@ -32,6 +42,7 @@ def _human_reason(reason: str | None) -> str:
         "no_pending_personal": "No hay cambios de empleados.",
         "sis2_disconnected": "Modo post-SIS2: no se envió a SIS2.",
         "test_mode_no_clear": "Prueba activada: NO se limpió el reloj.",
+        "clear_deferred_new_records": "Se envió a SIS2; llegaron checadas nuevas y NO se limpió el reloj (se limpia en la siguiente corrida).",
         "test_mode_no_mark": "Prueba activada: NO se marcó como sincronizado en SIS2.",
         "missing_db_password": "Falta contraseña DB.",
     }
@@ -211,9 +222,67 @@ def _build_sis2_cfg(cfg) -> Sis2Config:
         db_database=str(getattr(cfg, "sis2_db_database", "admin_macasa_prod") or "admin_macasa_prod"),
         db_username=str(getattr(cfg, "sis2_db_username", "") or ""),
         db_password=db_password,
+        db_insert_strategy=str(getattr(cfg, "sis2_db_insert_strategy", "bulk") or "bulk"),
+        db_pool_size=int(getattr(cfg, "sis2_db_pool_size", 4) or 1),
+        db_pool_max_idle_sec=int(getattr(cfg, "sis2_db_pool_max_idle_sec", 300) or 0),
+        personal_page_size=int(getattr(cfg, "sis2_personal_page_size", 500) or 500),
+        compression=normalize_encoding(str(getattr(cfg, "sis2_compression", "none") or "none")),
+        compress_min_bytes=int(getattr(cfg, "sis2_compress_min_bytes", 1024) or 0),
     )
 
 
+def _personal_to_device_batch(page: list[dict]) -> list[dict]:
+    """
+    Pendientes de Tb_Personal → records para DeviceSession.upsert_users.
+    """
+    batch: list[dict] = []
+    for p in page:
+        try:
+            idp = int(p.get("IdPersonal"))
+        except Exception:
+            continue
+
+        user_id = str(idp)
+        name = str(p.get("full_name") or p.get("FullName") or p.get("nombre_completo") or "").strip()
+        pin = str(p.get("ClaveChecador") or "").strip()
+
+        try:
+            privilege = int(p.get("Privilegio") or 0)
+        except Exception:
+            privilege = 0
+
+        try:
+            card = int(p.get("NumeroTarjeta") or 0)
+        except Exception:
+            card = 0
+
+        batch.append({
+            "user_id": user_id,
+            "name": name,
+            "privilege": privilege,
+            "user_password": pin,
+            "card": card,
+            "enabled": True,
+        })
+    return batch
+
+
+def _prefetch_pages(pages: Iterator[list]) -> Iterator[list]:
+    """
+    Consume `pages` en un hilo, una página adelante: mientras el caller
+    procesa la página N (reloj), la N+1 ya se está leyendo de SIS2.
+    Las excepciones del productor salen en el caller, en orden.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="sis2-prefetch") as pool:
+        pending = pool.submit(next, pages, None)
+        while True:
+            page = pending.result()
+            if page is None:
+                return
+            pending = pool.submit(next, pages, None)
+            yield page
+
+
 def _users_bd_to_device_pipeline(
     ip: str,
     port: int,
@@ -223,14 +292,17 @@ def _users_bd_to_device_pipeline(
     *,
     ui_set_sis2_badge=None,
     runtime_mark_enabled: bool = True,
+    session: DeviceSession | None = None,
 ) -> dict:
     """
     Lógica legacy: SIS2(DB) -> Checador
-      - Fuente: Tb_Personal (Estatus='A' y SincronizadoEnDispositivo=0)
+      - Fuente: Tb_Personal (Estatus='A' y SincronizadoEnDispositivo=0), recorrida
+        completa en páginas keyset; el reloj aplica una página mientras se lee la siguiente
       - Identidad: IdPersonal => device.user_id
       - Nombre: Nombre + ApellidoP + ApellidoM (ya viene armado desde sis2_sink)
       - PIN: ClaveChecador
       - Al finalizar OK: marcar SincronizadoEnDispositivo=1 (si runtime_mark_enabled=True)
+      - session: sesión abierta con el reloj (opcional) para no reconectar por persona
     """
     sis2_cfg = _build_sis2_cfg(cfg)
 
@@ -245,77 +317,89 @@ def _users_bd_to_device_pipeline(
     if callable(ui_set_sis2_badge):
         ui_set_sis2_badge(None, phase="connecting", msg="[SIS2] Leyendo personal pendiente…")
 
-    pending = fetch_pending_personal_from_sis2_db(
+    # Páginas keyset de SIS2; mientras el reloj aplica una, ya se lee la siguiente
+    pages = _prefetch_pages(iter_pending_personal_from_sis2_db(
         sis2_cfg,
-        limit=500,
+        page_size=sis2_cfg.personal_page_size,
         log=lambda m: log(f"[SIS2] {m}"),
-    )
-
-    if not pending:
-        if callable(ui_set_sis2_badge):
-            ui_set_sis2_badge(True, phase="connected", msg="[SIS2] Personal: sin cambios.", auto_reset_ms=1200)
-        return {"ok": True, "skipped": True, "reason": "no_pending_personal"}
+    ))
 
+    pending_count = 0
     applied = 0
     failed = 0
     marked = 0
+    fetch_error = None
+    device_error = None
+    confirmed: list[int] = []
 
-    for p in pending:
-        try:
-            idp = int(p.get("IdPersonal"))
-        except Exception:
-            failed += 1
-            continue
-
-        user_id = str(idp)
-        name = str(p.get("full_name") or p.get("FullName") or p.get("nombre_completo") or "").strip()
-        pin = str(p.get("ClaveChecador") or "").strip()
+    try:
+        with session_scope(ip, port, password, session) as dev:
+            # Conectar ANTES de leer SIS2: un reloj caído es error del reloj, no de SIS2
+            try:
+                dev.open()
+            except Exception as e:
+                device_error = str(e)
+                log(f"[SIS2] ❌ No se pudo conectar al reloj {ip}:{port}: {e}")
+
+            for page in (pages if device_error is None else ()):
+                pending_count += len(page)
+                batch = _personal_to_device_batch(page)
+                failed += len(page) - len(batch)
+
+                # Un solo get_users() (cacheado entre páginas) + una ventana deshabilitada por página
+                try:
+                    results = dev.upsert_users(batch) if batch else []
+                except Exception as e:
+                    log(f"[SIS2] ⚠️ Upsert a reloj falló (lote de {len(batch)}): {e}")
+                    results = [{"user_id": b["user_id"], "ok": False, "error": str(e)} for b in batch]
+                    if not dev.is_open:
+                        # Se perdió la conexión (ya con reintentos): no seguir leyendo SIS2
+                        device_error = str(e)
+                        log(f"[SIS2] ❌ Conexión con el reloj {ip}:{port} perdida; se detiene.")
+
+                for res in results:
+                    idp = int(res["user_id"])
+                    if not res.get("ok"):
+                        failed += 1
+                        log(f"[SIS2] ⚠️ Upsert a reloj falló IdPersonal={idp}: {res.get('error')}")
+                        continue
+
+                    applied += 1
+                    confirmed.append(idp)
+
+                if device_error is not None:
+                    break
+    except Exception as e:
+        # Falló la lectura de una página: se marca lo ya aplicado y se reporta
+        fetch_error = str(e)
+        log(f"[SIS2] ❌ Error leyendo personal pendiente: {e}")
+    finally:
+        pages.close()
 
-        try:
-            privilege = int(p.get("Privilegio") or 0)
-        except Exception:
-            privilege = 0
+    if device_error is not None and pending_count == 0:
+        if callable(ui_set_sis2_badge):
+            ui_set_sis2_badge(True, phase="connected", msg="[SIS2] Personal: reloj sin conexión (SIS2 no se tocó).", auto_reset_ms=1200)
+        return {"ok": False, "stage": "device", "error": device_error}
 
-        try:
-            card = int(p.get("NumeroTarjeta") or 0)
-        except Exception:
-            card = 0
+    if pending_count == 0 and fetch_error is None:
+        if callable(ui_set_sis2_badge):
+            ui_set_sis2_badge(True, phase="connected", msg="[SIS2] Personal: sin cambios.", auto_reset_ms=1200)
+        return {"ok": True, "skipped": True, "reason": "no_pending_personal"}
 
+    # Un solo UPDATE (una transacción) con todos los confirmados por el reloj.
+    # Prueba: no marcar en BD
+    if runtime_mark_enabled and confirmed:
         try:
-            ok_dev = upsert_user(
-                ip, port, password,
-                user_id=user_id,
-                name=name,
-                privilege=privilege,
-                user_password=pin,
-                card=card,
-                enabled=True,
+            marked = mark_personal_synced_bulk(
+                sis2_cfg,
+                confirmed,
+                log=lambda m: log(f"[SIS2] {m}"),
             )
-            if not ok_dev:
-                failed += 1
-                continue
-
-            applied += 1
-
-            if runtime_mark_enabled:
-                ok_mark = mark_personal_synced_in_sis2_db(
-                    sis2_cfg,
-                    idp,
-                    log=lambda m: log(f"[SIS2] {m}"),
-                )
-                if ok_mark:
-                    marked += 1
-                else:
-                    log(f"[SIS2] ⚠️ No se pudo marcar SincronizadoEnDispositivo=1 para IdPersonal={idp}")
-            else:
-                # Prueba: no marcar en BD
-                pass
-
         except Exception as e:
-            failed += 1
-            log(f"[SIS2] ⚠️ Upsert a reloj falló IdPersonal={idp}: {e}")
+            # Quedan pendientes: el siguiente ciclo los re-aplica (upsert idempotente)
+            log(f"[SIS2] ⚠️ No se pudo marcar SincronizadoEnDispositivo=1 ({len(confirmed)} personas): {e}")
 
-    ok_all = (failed == 0)
+    ok_all = (failed == 0 and fetch_error is None and device_error is None)
     if callable(ui_set_sis2_badge):
         ui_set_sis2_badge(True if ok_all else False,
                           phase="connected" if ok_all else "disconnected",
@@ -327,9 +411,15 @@ def _users_bd_to_device_pipeline(
         "applied": applied,
         "failed": failed,
         "marked": marked,
-        "count": len(pending),
+        "count": pending_count,
         "skipped": False,
     }
+    if device_error is not None:
+        out["stage"] = "device"
+        out["error"] = device_error
+    elif fetch_error is not None:
+        out["stage"] = "fetch_personal"
+        out["error"] = fetch_error
     if not runtime_mark_enabled:
         out["test_mode"] = True
         out["reason"] = "test_mode_no_mark"
@@ -346,18 +436,62 @@ def _attendance_incremental_pipeline(
     *,
     ui_set_sis2_badge=None,
     runtime_clear_enabled: bool = True,
+    session: DeviceSession | None = None,
+    primary: bool = True,
 ) -> dict:
     log(f"[SIS2] Conectando a {ip}:{port} ...")
 
+    # Lectura y limpieza comparten sesión (un solo handshake con el reloj)
+    with session_scope(ip, port, password, session) as dev:
+        return _attendance_incremental_pipeline_in_session(
+            dev, cfg, log,
+            ui_set_sis2_badge=ui_set_sis2_badge,
+            runtime_clear_enabled=runtime_clear_enabled,
+            primary=primary,
+        )
+
+
+def _attendance_incremental_pipeline_in_session(
+    dev: DeviceSession,
+    cfg,
+    log,
+    *,
+    ui_set_sis2_badge=None,
+    runtime_clear_enabled: bool = True,
+    primary: bool = True,
+) -> dict:
+    # Config inválida (p.ej. [sis2] compression): fallar antes de tocar el reloj
     try:
-        all_records = read_attendance(ip, port, password)
-    except Exception as e:
-        log(f"[SIS2] ❌ Error al leer asistencia: {e}")
-        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+        _build_sis2_cfg(cfg)
+    except ValueError as e:
+        log(f"[SIS2] ❌ Configuración inválida: {e}. No se lee el reloj.")
+        return {"ok": False, "stage": "config", "error": str(e)}
+
+    # Tiempos por fase del reloj (connect/disable/transfer/decode/enable) en res["timing"]
+    mark = len(dev.spans)
+    res = _attendance_incremental_pipeline_steps(
+        dev, cfg, log,
+        ui_set_sis2_badge=ui_set_sis2_badge,
+        runtime_clear_enabled=runtime_clear_enabled,
+        primary=primary,
+    )
+    timing = dev.timing_since(mark)
+    if timing["phases"]:
+        res["timing"] = timing
+        log(f"[SIS2] ⏱ Reloj {dev.ip}:{dev.port}: {format_timing(timing)}")
+    return res
 
-    log(f"[SIS2] Se obtuvieron {len(all_records)} registros de asistencia (crudo).")
 
-    # checkpoint global SIS2
+def _attendance_incremental_pipeline_steps(
+    dev: DeviceSession,
+    cfg,
+    log,
+    *,
+    ui_set_sis2_badge=None,
+    runtime_clear_enabled: bool = True,
+    primary: bool = True,
+) -> dict:
+    # checkpoint global SIS2 (se carga antes de leer: el filtro va en línea)
     state_path = get_state_path("sis2")
     state = load_state(state_path)
 
@@ -367,21 +501,56 @@ def _attendance_incremental_pipeline(
     else:
         log(f"[SIS2] State: {state_path}")
 
+    # Checkpoint por reloj; el global solo aplica al principal
+    # (instalaciones de un solo reloj, previas a la flota)
+    dkey = device_key(dev.ip, dev.port)
+    device_state = load_device_state("sis2", dkey)
+    device_ts = device_last_ok_ts(device_state)
+    if device_ts or not primary:
+        state.last_ok_ts = device_ts
+
     log(f"[SIS2] Checkpoint actual: {state.last_ok_ts.isoformat() if state.last_ok_ts else '(vacío)'}")
 
+    # Pre-chequeo barato: si el contador del reloj no cambió desde la última
+    # corrida OK, no hay nada nuevo (evita deshabilitar + descargar el log completo)
+    try:
+        device_count = dev.record_count()
+    except Exception as e:
+        log(f"[SIS2] ❌ Error al leer contadores del reloj: {e}")
+        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+
+    last_count = device_state.get("record_count")
+    if state.last_ok_ts and last_count is not None and int(last_count) == device_count:
+        log(f"[SIS2] Sin checadas nuevas en el reloj (contador={device_count}). Se omite la descarga.")
+        return {"ok": True, "skipped": True, "reason": "no_new_records", "record_count": device_count}
+
+    # Solo los registros nuevos, en lote columnar (no el log completo)
+    read_stats: dict = {}
+    try:
+        records = dev.read_attendance_batch(
+            since=state.last_ok_ts,
+            cursor=AttlogCursor.from_dict(device_state.get("cursor")),
+            stats=read_stats,
+        )
+    except Exception as e:
+        log(f"[SIS2] ❌ Error al leer asistencia: {e}")
+        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+
+    log(f"[SIS2] Se obtuvieron {read_stats.get('total', 0)} registros de asistencia (crudo).")
+    if read_stats.get("cursor_skipped"):
+        log(f"[SIS2] Cursor: se omitieron {read_stats['cursor_skipped']} registros ya procesados (sin decodificar).")
+    next_cursor = read_stats.get("cursor")
+    next_cursor = next_cursor.to_dict() if next_cursor else None
+
     if state.last_ok_ts:
-        before = len(all_records)
-        records = [
-            r for r in all_records
-            if isinstance(getattr(r, "timestamp", None), datetime) and r.timestamp > state.last_ok_ts
-        ]
-        log(f"[SIS2] Incremental activo. Filtrados {before - len(records)}. Nuevos: {len(records)}")
+        log(f"[SIS2] Incremental activo. Filtrados {read_stats.get('filtered', 0)}. Nuevos: {len(records)}")
     else:
-        records = all_records
         log("[SIS2] Incremental: checkpoint vacío. Se procesan todos.")
 
     if len(records) == 0:
         log("[SIS2] No hay registros nuevos. Nada que enviar.")
+        if state.last_ok_ts:
+            update_device_state("sis2", dkey, last_ok_ts=state.last_ok_ts, record_count=device_count, cursor=next_cursor)
         return {"ok": True, "skipped": True, "reason": "no_new_records"}
 
     # post-SIS2 (no enviamos a DB)
@@ -418,36 +587,64 @@ def _attendance_incremental_pipeline(
         ui_set_sis2_badge(True, phase="connected", msg="[SIS2] Envío OK. Conexión cerrada.", auto_reset_ms=1500)
 
     # Test mode: NO limpiar, pero sí avanzar checkpoint (patrón nuevo)
-    max_ts = max((r.timestamp for r in records if isinstance(getattr(r, "timestamp", None), datetime)), default=None)
+    max_ts = records.max_ts()
     if not runtime_clear_enabled:
         log("[SIS2] Prueba activada: NO se limpió el reloj. ✅ Se actualiza checkpoint.")
         if max_ts:
             state.last_ok_ts = max_ts
-            save_state(state_path, state)
+            if primary:
+                save_state(state_path, state)
             log(f"[SIS2] Checkpoint actualizado (sin limpiar): last_ok_ts={max_ts.isoformat()}")
+        update_device_state("sis2", dkey, last_ok_ts=state.last_ok_ts, record_count=device_count, cursor=next_cursor)
 
         return {"ok": True, "count": len(records), "sink": sink_result, "skipped": True, "reason": "test_mode_no_clear"}
 
-    # limpiar reloj
-    try:
-        log("[SIS2] OK confirmado → limpiando registros de asistencia en el dispositivo...")
-        ok_clear = clear_attendance(ip, port, password)
-    except Exception as e:
-        log(f"[SIS2] ⚠️ Error limpiando dispositivo: {e}")
-        return {"ok": False, "stage": "clear", "error": str(e), "sink": sink_result}
-
-    if not ok_clear:
-        log("[SIS2] ⚠️ Limpieza no confirmada (retorno False). No se actualiza checkpoint.")
-        return {"ok": False, "stage": "clear", "error": "clear_attendance returned False", "sink": sink_result}
-
-    log("[SIS2] ✅ Dispositivo limpiado correctamente.")
+    # limpiar reloj: drain en la misma sesión (verifica contador; si llegaron
+    # checadas desde la lectura, entrega solo la cola y vuelve a intentar)
+    def _deliver_tail(tail) -> bool:
+        log(f"[SIS2] Llegaron {len(tail)} checadas durante el envío → enviando cola...")
+        tail_result = send_attendance_to_sis2(tail, sis2_cfg, log=lambda m: log(f"[SIS2] {m}"))
+        return bool(tail_result and tail_result.get("ok") is True)
+
+    log("[SIS2] OK confirmado → limpiando registros de asistencia en el dispositivo...")
+    drain = dev.drain_attendance(
+        _deliver_tail,
+        since=state.last_ok_ts,
+        cursor=read_stats.get("cursor"),
+        expected_count=read_stats.get("total"),
+    )
 
+    max_ts = max((t for t in (max_ts, drain.get("max_ts")) if t), default=None)
+    count = len(records) + int(drain.get("delivered", 0))
     if max_ts:
         state.last_ok_ts = max_ts
-        save_state(state_path, state)
+        if primary:
+            save_state(state_path, state)
         log(f"[SIS2] Checkpoint actualizado: last_ok_ts={max_ts.isoformat()}")
 
-    return {"ok": True, "count": len(records), "sink": sink_result, "cleared": True}
+    if drain.get("cleared"):
+        log("[SIS2] ✅ Dispositivo limpiado correctamente.")
+        update_device_state("sis2", dkey, last_ok_ts=state.last_ok_ts)
+        # Log vacío: contador/cursor de todos los targets (no solo SIS2) quedan en 0
+        reset_device_log_state(dkey)
+        return {"ok": True, "count": count, "sink": sink_result, "cleared": True}
+
+    # Lo entregado queda en checkpoint + cursor; lo demás se limpia en la siguiente corrida
+    drain_cursor = drain.get("cursor")
+    update_device_state(
+        "sis2", dkey,
+        last_ok_ts=state.last_ok_ts,
+        record_count=drain.get("total"),
+        cursor=drain_cursor.to_dict() if drain_cursor else None,
+    )
+
+    if not drain.get("ok"):
+        log(f"[SIS2] ⚠️ Error limpiando dispositivo ({drain.get('stage')}): {drain.get('error')}")
+        return {"ok": False, "stage": "clear", "error": drain.get("error"), "sink": sink_result}
+
+    # Reloj muy activo: siguieron llegando checadas en cada ronda
+    log("[SIS2] ⚠️ Siguen llegando checadas nuevas → NO se limpia. ✅ Se actualiza checkpoint.")
+    return {"ok": True, "count": count, "sink": sink_result, "skipped": True, "reason": "clear_deferred_new_records"}
 
 
 # ───────────────────────────────────────────────────────────────
@@ -555,6 +752,21 @@ class _SIS2Runner:
             self._reloj_badge(False, phase="disconnected", msg=f"[SIS2] Reloj: error: {e}")
             raise
 
+    def _reloj_reachable(self, ip: str, port: int) -> bool:
+        """
+        Pre-chequeo barato (cache del monitor o connect TCP corto): si el reloj
+        no responde, se falla rápido en vez de esperar el timeout de pyzk.
+        """
+        health = precheck(ip, port)
+        if not health.down:
+            return True
+        human = f"El reloj {ip}:{port} no responde ({health.error or 'sin respuesta'}). Revisa red/energía del equipo."
+        self._reloj_badge(False, phase="disconnected", msg=f"[SIS2] ❌ {human}")
+        self._ui(lambda: self.ui_set_summary("Reloj: sin respuesta"))
+        self._ui(lambda: self.ui_set_status("Error"))
+        self._ui(lambda: messagebox.showerror("Reloj", human))
+        return False
+
     def _run_guarded(self, action: str):
         if not self._lock.acquire(blocking=False):
             self.log("[SIS2] Lock ocupado; pipeline ya está en ejecución.")
@@ -592,6 +804,9 @@ class _SIS2Runner:
 
             cfg = self.get_config()
 
+            if not self._reloj_reachable(ip, port):
+                return
+
             if action == "read_users":
                 def _op():
                     self.log(f"[SIS2] Conectando a {ip}:{port} para leer usuarios...")
@@ -619,14 +834,19 @@ class _SIS2Runner:
             elif action == "read_attendance":
                 def _op():
                     self.log(f"[SIS2] Conectando a {ip}:{port} para leer asistencia...")
-                    return read_attendance(ip, port, password)
+                    # Streaming: contamos y guardamos solo la muestra
+                    count = 0
+                    first: list = []
+                    for r in iter_attendance(ip, port, password):
+                        count += 1
+                        if len(first) < 25:
+                            first.append(r)
+                    return count, first
 
-                records = self._run_reloj_op("leyendo asistencias", _op, ok_reset_ms=800)
+                total, sample = self._run_reloj_op("leyendo asistencias", _op, ok_reset_ms=800)
 
-                total = len(records)
                 self.log(f"[SIS2] Asistencias leídas: {total}")
 
-                sample = records[:25]
                 self.log("[SIS2] Muestra (hasta 25):")
                 for r in sample:
                     self.log(f"[SIS2]   - user_id={getattr(r,'user_id','?')} ts={getattr(r,'timestamp',None)} punch={getattr(r,'punch',None)} status={getattr(r,'status',None)}")
@@ -671,6 +891,8 @@ class _SIS2Runner:
                 else:
                     err = res.get("error") or res.get("stage") or "users"
                     human = _human_reason(res.get("error")) if res.get("error") in ("missing_db_password",) else str(err)
+                    if res.get("stage") == "device":
+                        human = f"reloj sin conexión: {err}"
                     summary = f"Empleados: ERROR ({human})"
                     ok = False
                     self._ui(lambda: messagebox.showerror("Error", f"No se pudo sincronizar personal.\nDetalle: {res}"))
@@ -708,21 +930,27 @@ class _SIS2Runner:
                     started = time.time()
                     self.log(f"[SIS2] Iniciando proceso completo en {ip}:{port} ...")
 
-                    users_result = _users_bd_to_device_pipeline(
-                        ip, port, password, cfg, self.log,
-                        ui_set_sis2_badge=lambda ok_, phase=None, msg=None, auto_reset_ms=None: self._badge(
-                            ok_, phase=phase, msg=msg, auto_reset_ms=auto_reset_ms
-                        ),
-                        runtime_mark_enabled=(not bool(self.is_test_mode())),
-                    )
+                    # Una sola sesión con el reloj para empleados + asistencias
+                    with DeviceSession(ip, port, password) as dev:
+                        users_result = _users_bd_to_device_pipeline(
+                            ip, port, password, cfg, self.log,
+                            ui_set_sis2_badge=lambda ok_, phase=None, msg=None, auto_reset_ms=None: self._badge(
+                                ok_, phase=phase, msg=msg, auto_reset_ms=auto_reset_ms
+                            ),
+                            runtime_mark_enabled=(not bool(self.is_test_mode())),
+                            session=dev,
+                        )
 
-                    attendance_result = _attendance_incremental_pipeline(
-                        ip, port, password, cfg, self.log,
-                        ui_set_sis2_badge=lambda ok_, phase=None, msg=None, auto_reset_ms=None: self._badge(
-                            ok_, phase=phase, msg=msg, auto_reset_ms=auto_reset_ms
-                        ),
-                        runtime_clear_enabled=(not bool(self.is_test_mode())),
-                    )
+                        attendance_result = _attendance_incremental_pipeline(
+                            ip, port, password, cfg, self.log,
+                            ui_set_sis2_badge=lambda ok_, phase=None, msg=None, auto_reset_ms=None: self._badge(
+                                ok_, phase=phase, msg=msg, auto_reset_ms=auto_reset_ms
+                            ),
+                            runtime_clear_enabled=(not bool(self.is_test_mode())),
+                            session=dev,
+                        )
+
+                    self.log(f"[SIS2] Conexiones al reloj en esta corrida: {dev.connects}")
 
                     elapsed = time.time() - started
                     ok_all = bool(users_result.get("ok")) and bool(attendance_result.get("ok"))
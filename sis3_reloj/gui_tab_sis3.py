@@ -7,11 +7,17 @@ from pathlib import Path
 import time
 import threading
 
-from .zk_client import read_attendance, read_users, clear_attendance
+from .zk_client import AttlogCursor, DeviceSession, format_timing, session_scope, iter_attendance, read_users
 from .file_sink import write_attendance_jsonl
 from .config import BASE_DIR
-from .state_store import load_state, save_state, get_state_path
-
+from .health import precheck
+from .state_store import (
+    load_state, save_state, get_state_path,
+    device_key, load_device_state, update_device_state, device_last_ok_ts,
+    reset_device_log_state,
+)
+
+from .compression import normalize_encoding
 from .sis3_sink import Sis3Config, send_attendance_to_sis3, probe_sis3
 
 
@@ -38,6 +44,7 @@ def _human_reason(reason: str | None) -> str:
         "missing_sis3_config": "Falta configuración de SIS3 (URL/KEY).",
         "recovery_no_files": "No encontré archivos en ese rango.",
         "test_mode_no_clear": "Prueba activada: se envió a SIS3 pero NO se limpió el reloj.",
+        "clear_deferred_new_records": "Se envió a SIS3; llegaron checadas nuevas y NO se limpió el reloj (se limpia en la siguiente corrida).",
     }
     return mapping.get(reason, f"Sin cambios ({reason})" if reason else "Sin cambios.")
 
@@ -65,8 +72,22 @@ def _build_sis3_cfg(cfg):
     if not sis3_base_url or not sis3_api_key:
         return None, {"ok": False, "error": "missing_sis3_config"}
 
+    try:
+        compression = normalize_encoding(str(getattr(cfg, "sis3_compression", "none") or "none"))
+    except ValueError as e:
+        return None, {"ok": False, "error": "invalid_sis3_compression", "detail": str(e)}
+
     return Sis3Config(
-        base_url=sis3_base_url, api_key=sis3_api_key, timeout_sec=sis3_timeout
+        base_url=sis3_base_url,
+        api_key=sis3_api_key,
+        timeout_sec=sis3_timeout,
+        pool_size=int(getattr(cfg, "sis3_pool_size", 4) or 4),
+        keepalive=bool(getattr(cfg, "sis3_keepalive", True)),
+        chunk_records=int(getattr(cfg, "sis3_chunk_records", 2000) or 0),
+        chunk_max_kb=int(getattr(cfg, "sis3_chunk_max_kb", 512) or 0),
+        max_in_flight=int(getattr(cfg, "sis3_max_in_flight", 2) or 1),
+        compression=compression,
+        compress_min_bytes=int(getattr(cfg, "sis3_compress_min_bytes", 1024) or 0),
     ), None
 
 
@@ -84,16 +105,62 @@ def _attendance_incremental_pipeline_sis3(
     *,
     runtime_connected: bool = True,
     runtime_clear_enabled: bool = True,  # <-- NUEVO (Prueba desactiva limpieza)
+    session: DeviceSession | None = None,
+    primary: bool = True,
 ) -> dict:
     log(f"[SIS3] Conectando a {ip}:{port} ...")
 
-    try:
-        all_records = read_attendance(ip, port, password)
-    except Exception as e:
-        log(f"[SIS3] ❌ Error al leer asistencia: {e}")
-        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+    # Lectura y limpieza comparten sesión (un solo handshake con el reloj)
+    with session_scope(ip, port, password, session) as dev:
+        return _attendance_incremental_pipeline_sis3_in_session(
+            dev, cfg, log,
+            runtime_connected=runtime_connected,
+            runtime_clear_enabled=runtime_clear_enabled,
+            primary=primary,
+        )
+
 
-    log(f"[SIS3] Se obtuvieron {len(all_records)} registros de asistencia (crudo).")
+def _attendance_incremental_pipeline_sis3_in_session(
+    dev: DeviceSession,
+    cfg,
+    log,
+    *,
+    runtime_connected: bool = True,
+    runtime_clear_enabled: bool = True,
+    primary: bool = True,
+) -> dict:
+    # Config inválida: fallar antes de tocar el reloj (la sesión conecta lazy)
+    if runtime_connected:
+        _sis3_cfg, err = _build_sis3_cfg(cfg)
+        if err and err["error"] == "invalid_sis3_compression":
+            log(f"[SIS3] ❌ Configuración inválida: {err['detail']}. No se lee el reloj.")
+            return {"ok": False, "stage": "config", "error": err["error"], "detail": err["detail"]}
+
+    # Tiempos por fase del reloj (connect/disable/transfer/decode/enable) en res["timing"]
+    mark = len(dev.spans)
+    res = _attendance_incremental_pipeline_sis3_steps(
+        dev, cfg, log,
+        runtime_connected=runtime_connected,
+        runtime_clear_enabled=runtime_clear_enabled,
+        primary=primary,
+    )
+    timing = dev.timing_since(mark)
+    if timing["phases"]:
+        res["timing"] = timing
+        log(f"[SIS3] ⏱ Reloj {dev.ip}:{dev.port}: {format_timing(timing)}")
+    return res
+
+
+def _attendance_incremental_pipeline_sis3_steps(
+    dev: DeviceSession,
+    cfg,
+    log,
+    *,
+    runtime_connected: bool = True,
+    runtime_clear_enabled: bool = True,
+    primary: bool = True,
+) -> dict:
+    ip, port = dev.ip, dev.port
 
     output_dir = (BASE_DIR / cfg.output_dir).resolve()
     state_path = get_state_path("sis3")
@@ -106,31 +173,65 @@ def _attendance_incremental_pipeline_sis3(
         log(f"[SIS3] State: {state_path}")
 
 
+    # Checkpoint por reloj; el global solo aplica al principal
+    # (instalaciones de un solo reloj, previas a la flota)
+    dkey = device_key(dev.ip, dev.port)
+    device_state = load_device_state("sis3", dkey)
+    device_ts = device_last_ok_ts(device_state)
+    if device_ts or not primary:
+        state.last_ok_ts = device_ts
+
     log(
         f"[SIS3] Checkpoint actual: {state.last_ok_ts.isoformat() if state.last_ok_ts else '(vacío)'}"
     )
 
+    # Pre-chequeo barato: contador del reloj igual al de la última corrida OK → nada nuevo
+    try:
+        device_count = dev.record_count()
+    except Exception as e:
+        log(f"[SIS3] ❌ Error al leer contadores del reloj: {e}")
+        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+
+    last_count = device_state.get("record_count")
+    if state.last_ok_ts and last_count is not None and int(last_count) == device_count:
+        log(f"[SIS3] Sin checadas nuevas en el reloj (contador={device_count}). Se omite la descarga.")
+        return {"ok": True, "skipped": True, "reason": "no_new_records", "record_count": device_count}
+
+    # Solo los registros nuevos, en lote columnar (no el log completo)
+    read_stats: dict = {}
+    try:
+        records = dev.read_attendance_batch(
+            since=state.last_ok_ts,
+            cursor=AttlogCursor.from_dict(device_state.get("cursor")),
+            stats=read_stats,
+        )
+    except Exception as e:
+        log(f"[SIS3] ❌ Error al leer asistencia: {e}")
+        return {"ok": False, "stage": "read_attendance", "error": str(e)}
+
+    log(f"[SIS3] Se obtuvieron {read_stats.get('total', 0)} registros de asistencia (crudo).")
+    if read_stats.get("cursor_skipped"):
+        log(f"[SIS3] Cursor: se omitieron {read_stats['cursor_skipped']} registros ya procesados (sin decodificar).")
+    next_cursor = read_stats.get("cursor")
+    next_cursor = next_cursor.to_dict() if next_cursor else None
+
     if state.last_ok_ts:
-        before = len(all_records)
-        records = [
-            r
-            for r in all_records
-            if isinstance(getattr(r, "timestamp", None), datetime)
-            and r.timestamp > state.last_ok_ts
-        ]
         log(
-            f"[SIS3] Incremental activo. Filtrados {before - len(records)}. Nuevos: {len(records)}"
+            f"[SIS3] Incremental activo. Filtrados {read_stats.get('filtered', 0)}. Nuevos: {len(records)}"
         )
     else:
-        records = all_records
         log("[SIS3] Incremental: checkpoint vacío. Se procesan todos.")
 
     if len(records) == 0:
         log("[SIS3] No hay registros nuevos. Nada que enviar ni limpiar.")
+        if state.last_ok_ts:
+            update_device_state("sis3", dkey, last_ok_ts=state.last_ok_ts, record_count=device_count, cursor=next_cursor)
         return {"ok": True, "skipped": True, "reason": "no_new_records"}
 
     # Guardado coherente con state/recovery
-    path_local = write_attendance_jsonl(records, output_dir, subdir="sis3")
+    # Relojes de la flota: carpeta propia (dos equipos pueden escribir en el mismo segundo)
+    subdir = "sis3" if primary else f"sis3/{dkey.replace(':', '_')}"
+    path_local = write_attendance_jsonl(records, output_dir, subdir=subdir)
     log(f"[SIS3] Archivo guardado en: {path_local}")
 
     # Si runtime_connected=False, eso significa "no enviar" (legacy).
@@ -148,14 +249,32 @@ def _attendance_incremental_pipeline_sis3(
 
     sis3_cfg, err = _build_sis3_cfg(cfg)
     if err:
-        log("[SIS3] ❌ Falta configuración SIS3 (URL/KEY). No se envía y NO se limpia.")
+        if err["error"] == "missing_sis3_config":
+            log("[SIS3] ❌ Falta configuración SIS3 (URL/KEY). No se envía y NO se limpia.")
+        else:
+            log(f"[SIS3] ❌ Configuración SIS3 inválida: {err.get('detail')}. No se envía y NO se limpia.")
         return {
             "ok": False,
             "stage": "sis3_sink",
-            "error": "missing_sis3_config",
+            "error": err["error"],
             "local_path": str(path_local),
         }
 
+    # Checkpoint por chunk: cada prefijo contiguo confirmado mueve last_ok_ts,
+    # así una falla a medio envío solo re-envía la cola. El cursor y el
+    # contador del reloj NO se tocan hasta terminar (la siguiente corrida relee
+    # desde el mismo cursor y filtra por last_ok_ts).
+    acked = {"count": 0}
+
+    def _on_progress(count: int, ts) -> None:
+        acked["count"] = count
+        if not isinstance(ts, datetime) or (state.last_ok_ts and ts <= state.last_ok_ts):
+            return
+        state.last_ok_ts = ts
+        if primary:
+            save_state(state_path, state)
+        update_device_state("sis3", dkey, last_ok_ts=ts)
+
     file_tag = Path(str(path_local)).name
     try:
         sis3_result = send_attendance_to_sis3(
@@ -166,14 +285,21 @@ def _attendance_incremental_pipeline_sis3(
             file_tag=file_tag,
             mode="incremental",
             log=lambda m: log(f"[SIS3] {m}"),
+            on_progress=_on_progress,
         )
     except Exception as e:
         log(f"[SIS3] ❌ Error enviando a SIS3: {e}")
+        if acked["count"]:
+            log(
+                f"[SIS3] Checkpoint avanzado a {state.last_ok_ts.isoformat()} "
+                f"({acked['count']}/{len(records)} confirmadas); la siguiente corrida envía solo el resto."
+            )
         log("[SIS3] No se limpia el dispositivo (SIS3 no confirmado).")
         return {
             "ok": False,
             "stage": "sis3_sink",
             "error": str(e),
+            "acked": acked["count"],
             "local_path": str(path_local),
         }
 
@@ -189,20 +315,15 @@ def _attendance_incremental_pipeline_sis3(
     # 1) Transición (SIS2 conectado): NO limpiar, pero SÍ actualizamos checkpoint (para evitar reenvíos).
     if not bool(getattr(cfg, "sis2_disconnected", False)):
         log("[SIS3] Transición activa (SIS2 conectado) → NO se limpia el dispositivo.")
-        max_ts = max(
-            (
-                r.timestamp
-                for r in records
-                if isinstance(getattr(r, "timestamp", None), datetime)
-            ),
-            default=None,
-        )
+        max_ts = records.max_ts()
         if max_ts:
             state.last_ok_ts = max_ts
-            save_state(state_path, state)
+            if primary:
+                save_state(state_path, state)
             log(
                 f"[SIS3] Checkpoint actualizado (sin limpiar): last_ok_ts={max_ts.isoformat()}"
             )
+        update_device_state("sis3", dkey, last_ok_ts=state.last_ok_ts, record_count=device_count, cursor=next_cursor)
         return {
             "ok": True,
             "count": len(records),
@@ -216,18 +337,13 @@ def _attendance_incremental_pipeline_sis3(
     if not runtime_clear_enabled:
         log("[SIS3] Prueba activada: NO se limpió el reloj. ✅ Se actualiza checkpoint (nuevo patrón).")
 
-        max_ts = max(
-            (
-                r.timestamp
-                for r in records
-                if isinstance(getattr(r, "timestamp", None), datetime)
-            ),
-            default=None,
-        )
+        max_ts = records.max_ts()
         if max_ts:
             state.last_ok_ts = max_ts
-            save_state(state_path, state)
+            if primary:
+                save_state(state_path, state)
             log(f"[SIS3] Checkpoint actualizado (prueba, sin limpiar): last_ok_ts={max_ts.isoformat()}")
+        update_device_state("sis3", dkey, last_ok_ts=state.last_ok_ts, record_count=device_count, cursor=next_cursor)
 
         return {
             "ok": True,
@@ -239,55 +355,80 @@ def _attendance_incremental_pipeline_sis3(
             "no_clear": True,
         }
 
-    # 3) Limpieza real
-    try:
-        log(
-            "[SIS3] OK confirmado. Limpiando registros de asistencia en el dispositivo..."
+    # 3) Limpieza real: drain en la misma sesión (verifica contador; si llegaron
+    #    checadas desde la lectura, entrega solo la cola y vuelve a intentar)
+    def _deliver_tail(tail) -> bool:
+        tail_path = write_attendance_jsonl(tail, output_dir, subdir=subdir)
+        log(f"[SIS3] Llegaron {len(tail)} checadas durante el envío → cola guardada en: {tail_path}")
+        tail_result = send_attendance_to_sis3(
+            tail,
+            sis3_cfg,
+            device_ip=ip,
+            device_port=port,
+            file_tag=Path(str(tail_path)).name,
+            mode="incremental",
+            log=lambda m: log(f"[SIS3] {m}"),
         )
-        ok_clear = clear_attendance(ip, port, password)
-    except Exception as e:
-        log(f"[SIS3] ⚠️ Error limpiando dispositivo: {e}")
+        return bool(tail_result and tail_result.get("ok") is True)
+
+    log("[SIS3] OK confirmado. Limpiando registros de asistencia en el dispositivo...")
+    drain = dev.drain_attendance(
+        _deliver_tail,
+        since=state.last_ok_ts,
+        cursor=read_stats.get("cursor"),
+        expected_count=read_stats.get("total"),
+    )
+
+    max_ts = max((t for t in (records.max_ts(), drain.get("max_ts")) if t), default=None)
+    count = len(records) + int(drain.get("delivered", 0))
+    if max_ts:
+        state.last_ok_ts = max_ts
+        if primary:
+            save_state(state_path, state)
+        log(f"[SIS3] Checkpoint actualizado: last_ok_ts={max_ts.isoformat()}")
+
+    if drain.get("cleared"):
+        log("[SIS3] ✅ Dispositivo limpiado correctamente.")
+        update_device_state("sis3", dkey, last_ok_ts=state.last_ok_ts)
+        # Log vacío: contador/cursor de todos los targets (no solo SIS3) quedan en 0
+        reset_device_log_state(dkey)
         return {
-            "ok": False,
-            "stage": "clear",
-            "error": str(e),
-            "sis3": sis3_result,
+            "ok": True,
+            "count": count,
             "local_path": str(path_local),
+            "sis3": sis3_result,
+            "cleared": True,
         }
 
-    if not ok_clear:
-        log(
-            "[SIS3] ⚠️ Limpieza no confirmada (retorno False). No se actualiza checkpoint."
-        )
+    # Lo entregado queda en checkpoint + cursor; lo demás se limpia en la siguiente corrida
+    drain_cursor = drain.get("cursor")
+    update_device_state(
+        "sis3", dkey,
+        last_ok_ts=state.last_ok_ts,
+        record_count=drain.get("total"),
+        cursor=drain_cursor.to_dict() if drain_cursor else None,
+    )
+
+    if not drain.get("ok"):
+        log(f"[SIS3] ⚠️ Error limpiando dispositivo ({drain.get('stage')}): {drain.get('error')}")
         return {
             "ok": False,
             "stage": "clear",
-            "error": "clear_attendance returned False",
+            "error": drain.get("error"),
             "sis3": sis3_result,
             "local_path": str(path_local),
         }
 
-    log("[SIS3] ✅ Dispositivo limpiado correctamente.")
-
-    max_ts = max(
-        (
-            r.timestamp
-            for r in records
-            if isinstance(getattr(r, "timestamp", None), datetime)
-        ),
-        default=None,
-    )
-    if max_ts:
-        state.last_ok_ts = max_ts
-        save_state(state_path, state)
-        log(f"[SIS3] Checkpoint actualizado: last_ok_ts={max_ts.isoformat()}")
-
+    # Reloj muy activo: siguieron llegando checadas en cada ronda
+    log("[SIS3] ⚠️ Siguen llegando checadas nuevas → NO se limpia. ✅ Se actualiza checkpoint.")
     return {
         "ok": True,
-        "count": len(records),
+        "count": count,
         "local_path": str(path_local),
         "sis3": sis3_result,
-        "cleared": True,
+        "skipped": True,
+        "reason": "clear_deferred_new_records",
+        "no_clear": True,
     }
 
 
@@ -635,6 +776,8 @@ class _SIS3Runner:
             cfg = self.get_config()
             sis3_cfg, err = _build_sis3_cfg(cfg)
             if err or not sis3_cfg:
+                if err and err.get("detail"):
+                    return False, f"[SIS3] Desconectado ({err['detail']})."
                 return False, "[SIS3] Desconectado (falta URL/KEY)."
 
             probe_res = probe_sis3(sis3_cfg, log=lambda m: self.log(f"[SIS3] {m}"))
@@ -646,6 +789,21 @@ class _SIS3Runner:
         
 
 
+    def _reloj_reachable(self, ip: str, port: int) -> bool:
+        """
+        Pre-chequeo barato (cache del monitor o connect TCP corto): si el reloj
+        no responde, se falla rápido en vez de esperar el timeout de pyzk.
+        """
+        health = precheck(ip, port)
+        if not health.down:
+            return True
+        human = f"El reloj {ip}:{port} no responde ({health.error or 'sin respuesta'}). Revisa red/energía del equipo."
+        self._reloj_badge(False, phase="disconnected", msg=f"[SIS3] ❌ {human}")
+        self._ui(lambda: self.ui_set_summary("Reloj: sin respuesta"))
+        self._ui(lambda: self.ui_set_status("Error"))
+        self._ui(lambda: messagebox.showerror("Reloj", human))
+        return False
+
     def _run_guarded(self, action: str):
         if not self._lock.acquire(blocking=False):
             self.log("[SIS3] Lock ocupado; pipeline ya está en ejecución.")
@@ -699,6 +857,9 @@ class _SIS3Runner:
 
             cfg = self.get_config()
 
+            if action in ("read_users", "read_attendance", "attendance", "full") and not self._reloj_reachable(ip, port):
+                return
+
             if action in ("read_users", "read_attendance", "attendance", "full"):
                 self._reloj_badge(None, phase="connecting", msg="[SIS3] Conectando al reloj…")
 
@@ -724,7 +885,8 @@ class _SIS3Runner:
             elif action == "read_attendance":
                 self.log(f"[SIS3] Conectando a {ip}:{port} para leer asistencia...")
                 try:
-                    records = read_attendance(ip, port, password)
+                    # Streaming: solo contamos, sin materializar el log
+                    total = sum(1 for _ in iter_attendance(ip, port, password))
                 except Exception as e:
                     self._reloj_badge(False, phase="disconnected", msg=f"[SIS3] Reloj error: {e}")
                     self.log(f"[SIS3] ❌ Error al leer asistencia: {e}")
@@ -732,7 +894,6 @@ class _SIS3Runner:
                     self._ui(lambda: self.ui_set_status("Error"))
                     return
 
-                total = len(records)
                 self.log(f"[SIS3] Asistencias leídas: {total}")
                 summary = f"Asistencias: {total} encontradas (ver Log)"
                 ok = True
@@ -0,0 +1,183 @@
+# sis3_reloj/health.py
+"""
+Salud de los relojes: connect TCP crudo con timeout corto (sin handshake ZK).
+
+- check_tcp(ip, port): una medición (up/down + latencia).
+- HealthMonitor: hilo de fondo que re-mide cada N segundos y avisa cambios.
+- precheck(ip, port): lo que consultan los runners antes de un pipeline pesado:
+  el estado en cache si está fresco; si no, una medición corta en el momento.
+
+El cache es global por ip:port (lo comparten GUI, runners y flota).
+Relojes con transporte UDP (probe_transport) no se miden: su estado queda "desconocido".
+"""
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from .zk_client import transport_profile
+
+
+CHECK_TIMEOUT_SEC = 1.5
+HEALTH_INTERVAL_SEC = 15.0
+# Un "down" en cache más viejo que esto se vuelve a medir antes de fallar rápido
+HEALTH_MAX_AGE_SEC = 30.0
+
+
+@dataclass(frozen=True)
+class DeviceHealth:
+    key: str  # ip:port
+    up: Optional[bool]  # None = desconocido (sin medir / UDP)
+    latency_ms: float = 0.0
+    error: str = ""
+    checked_at: float = 0.0  # time.monotonic()
+
+    @property
+    def down(self) -> bool:
+        return self.up is False
+
+    @property
+    def age_sec(self) -> float:
+        return time.monotonic() - self.checked_at if self.checked_at else float("inf")
+
+    def status_text(self) -> str:
+        if self.up is None:
+            return "desconocido"
+        if self.up:
+            return f"en línea ({self.latency_ms:.0f} ms)"
+        return f"sin respuesta ({self.error})" if self.error else "sin respuesta"
+
+
+_HEALTH: dict[str, DeviceHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+
+
+def _key(ip: str, port: int) -> str:
+    return f"{str(ip).strip()}:{int(port)}"
+
+
+def cached_health(ip: str, port: int) -> Optional[DeviceHealth]:
+    with _HEALTH_LOCK:
+        return _HEALTH.get(_key(ip, port))
+
+
+def _store(health: DeviceHealth) -> None:
+    with _HEALTH_LOCK:
+        _HEALTH[health.key] = health
+
+
+def check_tcp(ip: str, port: int, *, timeout: float = CHECK_TIMEOUT_SEC) -> DeviceHealth:
+    """
+    Abre y cierra un socket TCP al reloj. Nunca lanza; actualiza el cache.
+    """
+    key = _key(ip, port)
+    try:
+        if transport_profile(ip, port).force_udp:
+            health = DeviceHealth(key, None, checked_at=time.monotonic())
+            _store(health)
+            return health
+    except Exception:
+        pass
+
+    started = time.perf_counter()
+    try:
+        with socket.create_connection((str(ip).strip(), int(port)), timeout=timeout):
+            pass
+        health = DeviceHealth(key, True, (time.perf_counter() - started) * 1000, checked_at=time.monotonic())
+    except OSError as e:
+        error = "timeout" if isinstance(e, socket.timeout) else (e.strerror or str(e))
+        health = DeviceHealth(key, False, error=error, checked_at=time.monotonic())
+    _store(health)
+    return health
+
+
+def precheck(
+    ip: str,
+    port: int,
+    *,
+    max_age_sec: float = HEALTH_MAX_AGE_SEC,
+    timeout: float = CHECK_TIMEOUT_SEC,
+) -> DeviceHealth:
+    """
+    Estado para decidir si vale la pena abrir una sesión ZK:
+    cache fresco (lo dejó el monitor) o una medición corta ahora.
+    """
+    cached = cached_health(ip, port)
+    if cached is not None and cached.age_sec <= max_age_sec:
+        return cached
+    return check_tcp(ip, port, timeout=timeout)
+
+
+class HealthMonitor:
+    """
+    Mide periódicamente los relojes de set_targets(...) en un hilo daemon.
+    on_change(health) se llama (desde ese hilo) cuando cambia up/down o en la
+    primera medición de un reloj; la latencia sola no cuenta como cambio.
+
+        monitor = HealthMonitor(on_change=...)
+        monitor.set_targets([(ip, port)])
+        monitor.start()
+    """
+
+    def __init__(
+        self,
+        *,
+        interval_sec: float = HEALTH_INTERVAL_SEC,
+        timeout: float = CHECK_TIMEOUT_SEC,
+        on_change: Optional[Callable[[DeviceHealth], None]] = None,
+    ):
+        self.interval_sec = float(interval_sec)
+        self.timeout = float(timeout)
+        self.on_change = on_change
+
+        self._targets: list[tuple[str, int]] = []
+        self._notified: dict[str, Optional[bool]] = {}  # último up/down avisado por reloj
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_targets(self, targets: Iterable[tuple[str, int]]) -> None:
+        """
+        Reemplaza los relojes a medir y fuerza una medición inmediata.
+        """
+        with self._lock:
+            self._targets = [(str(ip).strip(), int(port)) for ip, port in targets]
+        self._wake.set()
+
+    def check_now(self) -> None:
+        self._wake.set()
+
+    def start(self) -> "HealthMonitor":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reloj-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                targets = list(self._targets)
+            for ip, port in targets:
+                if self._stop.is_set():
+                    return
+                health = check_tcp(ip, port, timeout=self.timeout)
+                if health.key in self._notified and self._notified[health.key] == health.up:
+                    continue
+                self._notified[health.key] = health.up
+                if self.on_change:
+                    try:
+                        self.on_change(health)
+                    except Exception:
+                        # Un callback de UI roto no debe matar el monitor
+                        pass
+            self._wake.wait(self.interval_sec)
@@ -0,0 +1,213 @@
+# sis3_reloj/probe_transport.py
+"""
+Mide el transporte de cada reloj (TCP vs UDP, tamaño de chunk) y guarda el más rápido.
+
+  python -m sis3_reloj.probe_transport [--device NOMBRE ...] [--rounds N] [--timeout S] [--no-save]
+
+- Por candidato: latencia del connect (handshake) y throughput de una lectura
+  bulk del buffer (ATTLOG; si el log está vacío, la tabla de usuarios).
+- El reloj NO se deshabilita: la lectura es solo de consulta.
+- Los relojes se miden uno por uno (en paralelo se estorbarían en la red).
+- El ganador queda en el state (transport["ip:port"]) y lo usan todas las
+  sesiones (DeviceSession / AsyncDeviceSession) de ahí en adelante.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import statistics
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, Optional
+
+from zk import const
+
+from .config import DeviceConfig, load_config
+from .state_store import save_transport_profile
+from .zk_client import TransportProfile, _connect, _read_attlog_from, _socket_timeout, set_transport_profile
+
+
+# TCP, UDP con chunk default (16 KB) y UDP con chunks chicos (enlaces con pérdida)
+CANDIDATES = (
+    TransportProfile(force_udp=False),
+    TransportProfile(force_udp=True),
+    TransportProfile(force_udp=True, chunk_size=4 * 1024),
+)
+
+
+# ───────────────────────────────────────────────────────────────
+# Medición
+# ───────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class ProbeResult:
+    profile: TransportProfile
+    ok: bool
+    connect_sec: float = 0.0
+    transfer_sec: float = 0.0
+    nbytes: int = 0
+    error: str = ""
+
+    @property
+    def total_sec(self) -> float:
+        return self.connect_sec + self.transfer_sec
+
+    @property
+    def kb_per_sec(self) -> float:
+        return self.nbytes / 1024 / self.transfer_sec if self.transfer_sec > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "transport": self.profile.name,
+            "ok": self.ok,
+            "connect_ms": round(self.connect_sec * 1000, 1),
+            "transfer_sec": round(self.transfer_sec, 3),
+            "kb_per_sec": round(self.kb_per_sec, 1),
+            "error": self.error,
+        }
+
+
+def measure_transport(ip: str, port: int, password: int, profile: TransportProfile) -> ProbeResult:
+    """
+    Un connect + una lectura bulk con `profile`. Nunca lanza: el error va en el resultado.
+    """
+    started = time.perf_counter()
+    try:
+        conn = _connect(ip, port, password, timeout=profile.timeout, force_udp=profile.force_udp)
+    except Exception as e:
+        return ProbeResult(profile, False, error=str(e))
+    connect_sec = time.perf_counter() - started
+
+    try:
+        conn.read_sizes()
+        records = int(getattr(conn, "records", 0) or 0)
+        started = time.perf_counter()
+        with _socket_timeout(conn, profile.transfer_timeout(records), profile.timeout):
+            if records > 0:
+                data, _record_size, _base = _read_attlog_from(conn, 0, records, chunk_size=profile.chunk_size)
+            else:
+                data, _size = conn.read_with_buffer(const.CMD_USERTEMP_RRQ, const.FCT_USER)
+        transfer_sec = time.perf_counter() - started
+    except Exception as e:
+        return ProbeResult(profile, False, connect_sec, error=str(e))
+    finally:
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    return ProbeResult(profile, True, connect_sec, transfer_sec, len(data))
+
+
+def _median_round(rounds: list[ProbeResult]) -> ProbeResult:
+    ok = [r for r in rounds if r.ok]
+    if not ok:
+        return rounds[-1]
+    ok.sort(key=lambda r: r.total_sec)
+    return ok[(len(ok) - 1) // 2]
+
+
+def probe_device(
+    device: DeviceConfig,
+    *,
+    candidates: Iterable[TransportProfile] = CANDIDATES,
+    rounds: int = 3,
+    timeout: int = 5,
+    log: Optional[Callable[[str], None]] = None,
+) -> tuple[list[ProbeResult], Optional[TransportProfile]]:
+    """
+    Mide cada candidato `rounds` veces (se queda con la mediana) y regresa
+    (resultados, perfil ganador | None si ninguno conectó).
+
+    El perfil ganador trae kb_per_sec medido (escala el timeout de
+    transferencia) y un timeout de connect con margen sobre la latencia vista.
+    """
+    results = []
+    for candidate in candidates:
+        candidate = replace(candidate, timeout=int(timeout))
+        samples = []
+        for _ in range(max(1, int(rounds))):
+            samples.append(measure_transport(device.ip, device.port, device.password, candidate))
+            if not samples[-1].ok:
+                break
+        res = _median_round(samples)
+        results.append(res)
+        if log:
+            if res.ok:
+                log(
+                    f"[{device.name}] {candidate.name}: connect {res.connect_sec * 1000:.0f} ms, "
+                    f"{res.nbytes / 1024:.1f} KB en {res.transfer_sec:.2f}s ({res.kb_per_sec:.1f} KB/s)"
+                )
+            else:
+                log(f"[{device.name}] {candidate.name}: ERROR ({res.error})")
+
+    ok = [r for r in results if r.ok]
+    if not ok:
+        return results, None
+
+    best = min(ok, key=lambda r: r.total_sec)
+    profile = replace(
+        best.profile,
+        timeout=max(int(timeout), math.ceil(best.connect_sec * 5)),
+        kb_per_sec=round(best.kb_per_sec, 1),
+    )
+    return results, profile
+
+
+def save_profile(device: DeviceConfig, profile: TransportProfile, results: Iterable[ProbeResult]) -> None:
+    """
+    Persiste el perfil (state unificado) y lo registra para las sesiones de este proceso.
+    """
+    save_transport_profile(device.key, {
+        **profile.to_dict(),
+        "probe": [r.to_dict() for r in results],
+    })
+    set_transport_profile(device.ip, device.port, profile)
+
+
+# ───────────────────────────────────────────────────────────────
+# CLI
+# ───────────────────────────────────────────────────────────────
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m sis3_reloj.probe_transport",
+        description="Compara TCP/UDP por reloj y guarda el transporte más rápido.",
+    )
+    ap.add_argument("--device", action="append", default=None, help="solo este reloj (nombre o ip:port); repetible")
+    ap.add_argument("--rounds", type=int, default=3, help="mediciones por candidato (default: 3)")
+    ap.add_argument("--timeout", type=int, default=5, help="timeout base en segundos (default: 5)")
+    ap.add_argument("--no-save", action="store_true", help="solo medir; no guardar el perfil")
+    args = ap.parse_args(argv)
+
+    cfg = load_config()
+    devices = cfg.devices
+    if args.device:
+        wanted = set(args.device)
+        devices = [d for d in devices if d.name in wanted or d.key in wanted]
+        if not devices:
+            print(f"Ningún reloj coincide con: {', '.join(args.device)}", file=sys.stderr)
+            return 2
+
+    failed = 0
+    for device in devices:
+        print(f"[{device.name}] Midiendo {device.key} ...")
+        results, profile = probe_device(device, rounds=args.rounds, timeout=args.timeout, log=print)
+        if profile is None:
+            print(f"[{device.name}] ❌ Ningún transporte conectó.")
+            failed += 1
+            continue
+
+        connect_ms = statistics.mean(r.connect_sec for r in results if r.ok) * 1000
+        print(
+            f"[{device.name}] ✅ Ganador: {profile.name} (timeout {profile.timeout}s, "
+            f"{profile.kb_per_sec:.1f} KB/s; connect promedio {connect_ms:.0f} ms)"
+        )
+        if not args.no_save:
+            save_profile(device, profile, results)
+            print(f"[{device.name}] Perfil guardado.")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# sis3_reloj/pyzk_compat.py
+"""
+Único punto de acceso a los internos de pyzk (atributos con name mangling
+`_ZK__*` de zk.base.ZK). Se usan para leer el ATTLOG por offset (cursor) y
+para ajustar el timeout del socket en transferencias largas.
+
+Probado con pyzk 0.9 (ver requirements.txt). Si otra versión cambia los
+nombres, `PyzkInternals.available` queda en False y zk_client cae al camino
+público (read_with_buffer completo); nada más en el proyecto los toca.
+"""
+from __future__ import annotations
+
+from typing import Any, Optional
+
+
+SEND_COMMAND = "_ZK__send_command"
+READ_CHUNK = "_ZK__read_chunk"
+RECEIVE_RAW = "_ZK__recieve_raw_data"  # sic (así se llama en pyzk)
+LAST_DATA = "_ZK__data"
+TCP_LENGTH = "_ZK__tcp_length"
+SOCKET = "_ZK__sock"
+
+# Métodos internos que zk_capture graba/reproduce, y estado que dejan
+INTERNAL_METHODS = (SEND_COMMAND, READ_CHUNK, RECEIVE_RAW)
+STATE_AFTER_SEND = (LAST_DATA, TCP_LENGTH)
+
+
+class PyzkInternals:
+    """
+    Vista sobre una conexión pyzk (o un proxy de zk_capture con los mismos nombres).
+    """
+
+    def __init__(self, conn: Any):
+        self.conn = conn
+
+    @property
+    def available(self) -> bool:
+        return all(callable(getattr(self.conn, name, None)) for name in (SEND_COMMAND, READ_CHUNK))
+
+    def send_command(self, command: int, data: bytes = b"", response_size: int = 8) -> dict:
+        return getattr(self.conn, SEND_COMMAND)(command, data, response_size)
+
+    def read_chunk(self, start: int, size: int) -> bytes:
+        return getattr(self.conn, READ_CHUNK)(start, size)
+
+    def receive_raw(self, size: int) -> bytes:
+        return getattr(self.conn, RECEIVE_RAW)(size)
+
+    @property
+    def last_data(self) -> bytes:
+        """
+        Payload de la última respuesta (lo que pyzk guarda en __data).
+        """
+        return getattr(self.conn, LAST_DATA)
+
+    @property
+    def tcp_length(self) -> int:
+        return int(getattr(self.conn, TCP_LENGTH))
+
+    @property
+    def sock(self) -> Optional[Any]:
+        return getattr(self.conn, SOCKET, None)
@@ -0,0 +1,254 @@
+# sis3_reloj/retry.py
+"""
+Reintentos con backoff exponencial (jitter) y circuit breaker por destino.
+
+- RetryPolicy por operación: "connect", "read", "clear", "set_user" (reloj) y
+  "sink" (SIS2/SIS3). Se ajustan en config.ini [retry] (ver configure_retry).
+- CircuitBreaker por destino (reloj ip:port, API SIS3, BD/API SIS2):
+  tras N fallas seguidas se abre y falla rápido (CircuitOpenError) sin tocar
+  la red; pasado reset_sec deja pasar UN intento (half-open): si sale bien
+  se cierra, si falla se vuelve a abrir.
+
+Solo se reintentan errores transitorios (red/timeout): los de validación o
+autenticación salen al primer intento.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class TransientError(RuntimeError):
+    """
+    Error de red/timeout/5xx: vale la pena reintentar.
+    Es RuntimeError para que los manejadores existentes lo sigan atrapando igual.
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    El destino está marcado como caído; no se intentó la operación.
+    """
+
+
+# ───────────────────────────────────────────────────────────────
+# Política de reintentos
+# ───────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 3  # total, incluyendo el primero
+    base_delay_sec: float = 1.0
+    max_delay_sec: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """
+        Espera antes del reintento `attempt` (1 = primer reintento):
+        full jitter sobre base * 2^(attempt-1), topado en max_delay_sec.
+        """
+        cap = min(self.max_delay_sec, self.base_delay_sec * (2 ** max(0, attempt - 1)))
+        return random.uniform(0, cap)
+
+
+OPERATIONS = ("connect", "read", "clear", "set_user", "sink")
+
+_DEFAULT_POLICIES = {
+    "connect": RetryPolicy(attempts=3, base_delay_sec=1.0),
+    "read": RetryPolicy(attempts=2, base_delay_sec=1.0),
+    # clear re-verifica el contador en cada intento: nunca borra checadas que
+    # llegaron después de la lectura. Si el CLEAR de un intento sí se aplicó
+    # (se perdió solo la respuesta), el reintento ve 0 registros y lo da por limpio.
+    "clear": RetryPolicy(attempts=2, base_delay_sec=1.0),
+    "set_user": RetryPolicy(attempts=2, base_delay_sec=1.0),
+    # los sinks son idempotentes (dedupe en SIS3 / NOT EXISTS en SIS2)
+    "sink": RetryPolicy(attempts=3, base_delay_sec=2.0),
+}
+_POLICIES = dict(_DEFAULT_POLICIES)
+
+BREAKER_FAILURES = 3
+BREAKER_RESET_SEC = 60.0
+
+
+def retry_policy(op: str) -> RetryPolicy:
+    return _POLICIES.get(op) or RetryPolicy(attempts=1)
+
+
+def set_retry_policy(op: str, policy: Optional[RetryPolicy]) -> None:
+    """
+    Cambia la política de una operación; None regresa al default.
+    """
+    if policy is None:
+        _POLICIES[op] = _DEFAULT_POLICIES.get(op, RetryPolicy(attempts=1))
+    else:
+        _POLICIES[op] = policy
+
+
+def configure_retry(overrides: Optional[dict]) -> None:
+    """
+    Aplica config.ini [retry] (AppConfig.retry):
+      <op>_attempts, <op>_base_delay_sec, <op>_max_delay_sec,
+      breaker_failures, breaker_reset_sec.
+    """
+    global BREAKER_FAILURES, BREAKER_RESET_SEC
+    overrides = overrides or {}
+    for op in OPERATIONS:
+        policy = _DEFAULT_POLICIES[op]
+        fields = {}
+        if f"{op}_attempts" in overrides:
+            fields["attempts"] = max(1, int(overrides[f"{op}_attempts"]))
+        if f"{op}_base_delay_sec" in overrides:
+            fields["base_delay_sec"] = max(0.0, float(overrides[f"{op}_base_delay_sec"]))
+        if f"{op}_max_delay_sec" in overrides:
+            fields["max_delay_sec"] = max(0.0, float(overrides[f"{op}_max_delay_sec"]))
+        _POLICIES[op] = replace(policy, **fields)
+    if "breaker_failures" in overrides:
+        BREAKER_FAILURES = max(1, int(overrides["breaker_failures"]))
+    if "breaker_reset_sec" in overrides:
+        BREAKER_RESET_SEC = max(0.0, float(overrides["breaker_reset_sec"]))
+
+
+# ───────────────────────────────────────────────────────────────
+# Circuit breaker
+# ───────────────────────────────────────────────────────────────
+class CircuitBreaker:
+    """
+    closed → (N fallas seguidas) → open → (reset_sec) → half_open → closed/open.
+    Thread-safe: la flota comparte breakers entre workers.
+    """
+
+    def __init__(self, name: str, *, failures: Optional[int] = None, reset_sec: Optional[float] = None):
+        self.name = name
+        self.failures = failures
+        self.reset_sec = reset_sec
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.last_error = ""
+
+    def _threshold(self) -> int:
+        return self.failures if self.failures is not None else BREAKER_FAILURES
+
+    def _reset_after(self) -> float:
+        return self.reset_sec if self.reset_sec is not None else BREAKER_RESET_SEC
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self._reset_after():
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        """
+        Segundos para el siguiente intento half-open (0 si no está abierto).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._reset_after() - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """
+        ¿Se puede intentar? En half-open solo pasa un intento a la vez.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+            self.last_error = ""
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self._consecutive += 1
+            self.last_error = error
+            if self._probing or self._consecutive >= self._threshold():
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+_BREAKERS: dict[tuple[str, str], CircuitBreaker] = {}
+_BREAKERS_GUARD = threading.Lock()
+
+
+def circuit_breaker(kind: str, key: str) -> CircuitBreaker:
+    """
+    Breaker compartido por destino: kind = "reloj" | "sis2" | "sis3".
+    """
+    with _BREAKERS_GUARD:
+        b = _BREAKERS.get((kind, key))
+        if b is None:
+            b = CircuitBreaker(f"{kind}:{key}")
+            _BREAKERS[(kind, key)] = b
+        return b
+
+
+# ───────────────────────────────────────────────────────────────
+# Ejecución con reintentos
+# ───────────────────────────────────────────────────────────────
+def call_with_retry(
+    op: str,
+    fn: Callable[[], T],
+    *,
+    retry_on: tuple = (TransientError,),
+    breaker: Optional[CircuitBreaker] = None,
+    log: Optional[Callable[[str], None]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """
+    Ejecuta fn() con la política de `op`. Solo reintenta excepciones de
+    `retry_on`; cualquier otra sale de inmediato (y no cuenta para el breaker).
+    Con breaker abierto lanza CircuitOpenError sin llamar a fn.
+    """
+    policy = retry_policy(op)
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(
+            f"{breaker.name} marcado como caído ({breaker.last_error or 'fallas seguidas'}); "
+            f"siguiente intento en {breaker.retry_in():.0f}s"
+        )
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = fn()
+        except CircuitOpenError:
+            raise
+        except retry_on as e:
+            if attempt >= policy.attempts:
+                if breaker is not None:
+                    breaker.record_failure(str(e))
+                raise
+            wait = policy.delay(attempt)
+            if log:
+                log(f"{op}: intento {attempt}/{policy.attempts} falló ({e}); reintento en {wait:.1f}s")
+            sleep(wait)
+            continue
+        except Exception:
+            # No transitorio: el destino respondió; no se cuenta como caída
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -1,14 +1,19 @@
 # sis3_reloj/sis2_sink.py
 from __future__ import annotations
 
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, date
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Iterable, Iterator, Optional
 import json
+import threading
 import time
 import os
 
+from .compression import DEFAULT_MIN_BYTES, encode_json, summarize
+from .retry import TransientError, call_with_retry, circuit_breaker
+
 try:
     import requests  # opcional si mode=http
 except Exception:
@@ -30,6 +35,19 @@ class Sis2Config:
     db_username: str = ""
     db_password: str = ""    # recomendado: vacío y usar env SIS2_DB_PASSWORD
 
+    # DB mode: "bulk" (staging #temp + un INSERT ... NOT EXISTS) | "prefetch" (llaves del
+    # rango en memoria + INSERT de faltantes) | "row" (SELECT+INSERT por checada)
+    db_insert_strategy: str = "bulk"
+    # Pool de conexiones pymssql (login remoto caro): tamaño y vida ociosa máx.
+    db_pool_size: int = 4
+    db_pool_max_idle_sec: int = 300
+    # Personal pendiente (SIS2 → reloj): renglones por página keyset
+    personal_page_size: int = 500
+
+    # HTTP mode: Content-Encoding del request ("none" | "gzip" | "zstd")
+    compression: str = "none"
+    compress_min_bytes: int = DEFAULT_MIN_BYTES
+
 
 def _now_tag() -> str:
     return time.strftime("%Y%m%d-%H%M%S")
@@ -40,6 +58,10 @@ def _to_jsonable(r: Any) -> Any:
         return {k: _to_jsonable(v) for k, v in r.items()}
     if isinstance(r, (datetime, date)):
         return r.isoformat()
+    # Records del reloj (__slots__): serialización explícita, sin reflexión
+    to_dict = getattr(r, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
     d = getattr(r, "__dict__", None)
     if isinstance(d, dict):
         return {k: _to_jsonable(v) for k, v in d.items()}
@@ -127,24 +149,338 @@ def _db_connect(cfg: Sis2Config):
     )
 
 
-def _send_db(records: list, cfg: Sis2Config, _log: callable) -> dict:
+# Una conexión devuelta hace menos de esto no se re-verifica al prestarla
+_POOL_PING_AFTER_SEC = 5.0
+
+
+class _DbPool:
     """
-    Inserción idempotente:
-      - NO duplicar (IdPersonal + Asistencia + Tipo + CodigoVerificador)
+    Pool thread-safe de conexiones pymssql hacia un mismo servidor/BD/usuario.
+
+    - acquire(): reutiliza la conexión ociosa más reciente; descarta las que
+      pasaron max_idle_sec y hace SELECT 1 a las que llevan rato sin usarse.
+      Si ya hay max_size prestadas, espera (timeout_sec) a que regrese una.
+    - release(cn): hace rollback antes de regresarla (pymssql no es autocommit:
+      hasta un SELECT deja una transacción abierta que heredaría el siguiente).
+    - release(cn, broken=True) o rollback fallido: se cierra en vez de regresar.
     """
-    sql_exists = """
-    SELECT 1
-    FROM dba_mchs.Tb_PersonalAsistencia WITH (NOLOCK)
-    WHERE IdPersonal = %s
-      AND Asistencia = %s
-      AND Tipo = %s
-      AND CodigoVerificador = %s
+
+    def __init__(self, cfg: Sis2Config):
+        self.cfg = cfg
+        self.max_size = max(1, int(cfg.db_pool_size or 1))
+        self.max_idle_sec = float(cfg.db_pool_max_idle_sec or 0)
+        self._idle: list[tuple[Any, float]] = []  # (conexión, devuelta en monotonic)
+        self._open = 0  # prestadas + ociosas
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        deadline = time.monotonic() + float(self.cfg.timeout_sec or 10)
+        while True:
+            with self._cond:
+                cn = None
+                while self._idle:
+                    cn, returned_at = self._idle.pop()
+                    idle = time.monotonic() - returned_at
+                    if self.max_idle_sec and idle > self.max_idle_sec:
+                        self._discard(cn)
+                        cn = None
+                        continue
+                    break
+                if cn is None:
+                    if self._open < self.max_size:
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TransientError(f"SIS2(DB): pool agotado ({self.max_size} conexiones en uso)")
+                    self._cond.wait(remaining)
+                    continue
+
+            # Fuera del lock: el ping es un round trip
+            if idle <= _POOL_PING_AFTER_SEC or self._ping(cn):
+                return cn
+            with self._cond:
+                self._discard(cn)
+
+        # Hueco reservado: conectar fuera del lock
+        try:
+            return _db_connect(self.cfg)
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, cn, *, broken: bool = False) -> None:
+        if not broken:
+            try:
+                cn.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            if broken:
+                self._discard(cn)
+            else:
+                self._idle.append((cn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def _discard(self, cn) -> None:
+        # Llamar con el lock tomado
+        self._open -= 1
+        try:
+            cn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _ping(cn) -> bool:
+        try:
+            cur = cn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cn.rollback()
+            return True
+        except Exception:
+            return False
+
+
+_DB_POOLS: dict[tuple, _DbPool] = {}
+_DB_POOLS_LOCK = threading.Lock()
+
+
+def _db_pool(cfg: Sis2Config) -> _DbPool:
     """
+    Pool compartido por destino (servidor, BD, usuario, password): distintos
+    Sis2Config hacia la misma BD reutilizan las mismas conexiones.
+    """
+    key = (
+        (cfg.db_server or "").strip(),
+        str(cfg.db_database),
+        str(cfg.db_username),
+        _db_password(cfg),
+    )
+    with _DB_POOLS_LOCK:
+        pool = _DB_POOLS.get(key)
+        if pool is None:
+            pool = _DbPool(cfg)
+            _DB_POOLS[key] = pool
+        return pool
 
-    sql_insert = """
-    INSERT INTO dba_mchs.Tb_PersonalAsistencia (IdPersonal, Asistencia, Tipo, CodigoVerificador)
-    VALUES (%s, %s, %s, %s)
+
+def _is_transient_db_error(e: Exception) -> bool:
+    """
+    pymssql: OperationalError/InterfaceError = conexión caída, timeout, deadlock.
+    Por nombre de clase para no importar pymssql aquí (es opcional).
+    """
+    return type(e).__name__ in ("OperationalError", "InterfaceError")
+
+
+@contextmanager
+def _db_conn(cfg: Sis2Config):
+    """
+    Presta una conexión del pool. Con error de conexión (transitorio) o una
+    interrupción (KeyboardInterrupt, etc.) la conexión se descarta; con
+    cualquier otro error regresa al pool (con rollback, ver release).
+    """
+    pool = _db_pool(cfg)
+    try:
+        cn = pool.acquire()
+    except Exception as e:
+        if _is_transient_db_error(e):
+            raise TransientError(f"SIS2(DB): no se pudo conectar: {e}") from e
+        raise
+    broken = True
+    try:
+        yield cn
+        broken = False
+    except Exception as e:
+        broken = _is_transient_db_error(e) or isinstance(e, TransientError)
+        raise
+    finally:
+        # finally: ni un BaseException deja el hueco del pool tomado
+        pool.release(cn, broken=broken)
+
+
+def _db_breaker(cfg: Sis2Config):
+    return circuit_breaker("sis2", f"db:{(cfg.db_server or '').strip()}/{cfg.db_database}")
+
+
+# SQL Server: máx. 2100 parámetros por llamada y 1000 renglones por VALUES
+_MSSQL_MAX_PARAMS = 2100
+_MSSQL_MAX_VALUES_ROWS = 1000
+
+_SQL_ASIS_EXISTS = """
+SELECT 1
+FROM dba_mchs.Tb_PersonalAsistencia WITH (NOLOCK)
+WHERE IdPersonal = %s
+  AND Asistencia = %s
+  AND Tipo = %s
+  AND CodigoVerificador = %s
+"""
+
+_SQL_ASIS_INSERT = """
+INSERT INTO dba_mchs.Tb_PersonalAsistencia (IdPersonal, Asistencia, Tipo, CodigoVerificador)
+VALUES (%s, %s, %s, %s)
+"""
+
+
+def _values_chunk_rows(columns: int) -> int:
+    """
+    Renglones por INSERT multi-VALUES sin pasar el límite de parámetros.
+    """
+    return max(1, min(_MSSQL_MAX_VALUES_ROWS, (_MSSQL_MAX_PARAMS - 1) // columns))
+
+
+def _insert_values_chunked(cur, insert_sql: str, rows: list[tuple]) -> None:
+    """
+    INSERT multi-VALUES por chunks: insert_sql = "INSERT INTO t (a, b, ...) VALUES".
+    (pymssql.executemany es un round trip por renglón; esto es uno por chunk.)
+    """
+    if not rows:
+        return
+    columns = len(rows[0])
+    placeholder = "(" + ", ".join(["%s"] * columns) + ")"
+    step = _values_chunk_rows(columns)
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        cur.execute(
+            f"{insert_sql} {','.join([placeholder] * len(chunk))}",
+            tuple(v for row in chunk for v in row),
+        )
+
+
+def _insert_asistencia_per_row(cur, rows: list[tuple]) -> tuple[int, int]:
+    """
+    Estrategia "row" (legacy): SELECT + INSERT por checada (2 round trips c/u).
+    """
+    inserted = 0
+    skipped = 0
+    for row in rows:
+        cur.execute(_SQL_ASIS_EXISTS, row)
+        if cur.fetchone():
+            skipped += 1
+            continue
+        cur.execute(_SQL_ASIS_INSERT, row)
+        inserted += 1
+    return inserted, skipped
+
+
+def _insert_asistencia_bulk(cur, rows: list[tuple]) -> tuple[int, int]:
+    """
+    Estrategia "bulk": los renglones se cargan a una tabla temporal (INSERT
+    multi-VALUES en chunks) y se insertan con UNA sentencia set-based:
+    DISTINCT (duplicados dentro del lote) + NOT EXISTS (ya en SIS2).
+    Round trips ≈ len(rows)/500 + 3, en vez de 2 por checada.
+    """
+    # Mismos tipos que la tabla destino, sin adivinarlos
+    cur.execute("IF OBJECT_ID('tempdb..#sis2_asistencia') IS NOT NULL DROP TABLE #sis2_asistencia")
+    cur.execute("""
+    SELECT TOP (0) IdPersonal, Asistencia, Tipo, CodigoVerificador
+    INTO #sis2_asistencia
+    FROM dba_mchs.Tb_PersonalAsistencia
+    """)
+    try:
+        _insert_values_chunked(
+            cur, "INSERT INTO #sis2_asistencia (IdPersonal, Asistencia, Tipo, CodigoVerificador) VALUES", rows,
+        )
+
+        # UPDLOCK/HOLDLOCK: dos envíos simultáneos del mismo lote no duplican
+        cur.execute("""
+        INSERT INTO dba_mchs.Tb_PersonalAsistencia (IdPersonal, Asistencia, Tipo, CodigoVerificador)
+        SELECT DISTINCT s.IdPersonal, s.Asistencia, s.Tipo, s.CodigoVerificador
+        FROM #sis2_asistencia s
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM dba_mchs.Tb_PersonalAsistencia t WITH (UPDLOCK, HOLDLOCK)
+            WHERE t.IdPersonal = s.IdPersonal
+              AND t.Asistencia = s.Asistencia
+              AND t.Tipo = s.Tipo
+              AND t.CodigoVerificador = s.CodigoVerificador
+        )
+        """)
+        inserted = max(0, int(cur.rowcount or 0))
+    finally:
+        try:
+            cur.execute("DROP TABLE #sis2_asistencia")
+        except Exception:
+            # Transacción abortada: la tabla temporal muere con la conexión
+            pass
+    return inserted, len(rows) - inserted
+
+
+def _asistencia_key(id_personal, asistencia, tipo, codigo) -> tuple:
+    # Tipo puede venir como char con espacios; Asistencia con milisegundos en 0
+    return int(id_personal), asistencia, str(tipo or "").strip(), int(codigo or 0)
+
+
+def _insert_asistencia_prefetch(cur, rows: list[tuple]) -> tuple[int, int]:
+    """
+    Estrategia "prefetch" (servidores sin permiso de tablas temporales):
+    una consulta por rango [min_ts, max_ts] acotada a los IdPersonal del lote
+    (IN por chunks bajo el límite de parámetros) trae las llaves existentes,
+    el dedup se hace en memoria y solo se insertan las faltantes (multi-VALUES).
+
+    A diferencia de "bulk" no bloquea el rango: dos envíos simultáneos del
+    mismo lote podrían duplicar. Con la flota cada reloj envía solo lo suyo.
+    """
+    lo = min(row[1] for row in rows)
+    hi = max(row[1] for row in rows)
+    id_list = sorted({row[0] for row in rows})
+
+    # Solo los empleados del lote: la tabla tiene las checadas de todos
+    existing = set()
+    step = _MSSQL_MAX_PARAMS - 100
+    for start in range(0, len(id_list), step):
+        chunk = id_list[start:start + step]
+        cur.execute(
+            f"""
+            SELECT IdPersonal, Asistencia, Tipo, CodigoVerificador
+            FROM dba_mchs.Tb_PersonalAsistencia WITH (NOLOCK)
+            WHERE Asistencia BETWEEN %s AND %s
+              AND IdPersonal IN ({",".join(["%s"] * len(chunk))})
+            """,
+            (lo, hi, *chunk),
+        )
+        existing.update(_asistencia_key(*r) for r in (cur.fetchall() or []))
+
+    missing = []
+    for row in rows:
+        key = _asistencia_key(*row)
+        if key in existing:
+            continue
+        existing.add(key)  # duplicados dentro del lote
+        missing.append(row)
+
+    _insert_values_chunked(
+        cur, "INSERT INTO dba_mchs.Tb_PersonalAsistencia (IdPersonal, Asistencia, Tipo, CodigoVerificador) VALUES",
+        missing,
+    )
+    return len(missing), len(rows) - len(missing)
+
+
+_INSERT_STRATEGIES = {
+    "bulk": _insert_asistencia_bulk,
+    "prefetch": _insert_asistencia_prefetch,
+    "row": _insert_asistencia_per_row,
+}
+
+
+def _send_db(records: Iterable[Any], cfg: Sis2Config, _log: callable) -> dict:
     """
+    Inserción idempotente:
+      - NO duplicar (IdPersonal + Asistencia + Tipo + CodigoVerificador)
+      - cfg.db_insert_strategy: "bulk" (default, set-based), "prefetch"
+        (dedup en memoria, sin tablas temporales) o "row" (legacy)
+    """
+    strategy = (cfg.db_insert_strategy or "bulk").strip().lower()
+    insert_rows = _INSERT_STRATEGIES.get(strategy)
+    if insert_rows is None:
+        raise ValueError(f"SIS2(DB): insert_strategy inválido: {cfg.db_insert_strategy!r}. Usa: {', '.join(_INSERT_STRATEGIES)}.")
 
     rows = []
     for r in records:
@@ -157,40 +493,70 @@ def _send_db(records: list, cfg: Sis2Config, _log: callable) -> dict:
 
         rows.append((user_id, ts, str(punch), 0))
 
-    inserted = 0
-    skipped = 0
+    if not rows:
+        return {"ok": True, "mode": "db", "inserted": 0, "skipped": 0, "count": 0, "strategy": strategy}
+
+    def _attempt() -> tuple[int, int]:
+        _log(f"SIS2(DB): {cfg.db_server} / {cfg.db_database} ...")
+        with _db_conn(cfg) as cn:
+            try:
+                cur = cn.cursor()
+                inserted, skipped = insert_rows(cur, rows)
+                cn.commit()
+            except Exception as e:
+                try:
+                    cn.rollback()
+                except Exception:
+                    pass
+                if _is_transient_db_error(e):
+                    # El lote completo se hace rollback: el reintento lo repite entero
+                    raise TransientError(f"SIS2(DB): {e}") from e
+                raise
+        return inserted, skipped
+
+    # Idempotente (NOT EXISTS): reintentar no duplica
+    started = time.perf_counter()
+    inserted, skipped = call_with_retry("sink", _attempt, breaker=_db_breaker(cfg), log=_log)
+    elapsed = time.perf_counter() - started
+
+    _log(f"SIS2(DB): inserted={inserted}, skipped={skipped} ({strategy}, {elapsed:.2f}s)")
+    return {
+        "ok": True,
+        "mode": "db",
+        "inserted": inserted,
+        "skipped": skipped,
+        "count": len(rows),
+        "strategy": strategy,
+        "elapsed_sec": round(elapsed, 3),
+    }
 
-    _log(f"SIS2(DB): conectando a {cfg.db_server} / {cfg.db_database} ...")
-    cn = _db_connect(cfg)
-    _log("SIS2(DB): conexión abierta")
-    try:
-        cur = cn.cursor()
-        for row in rows:
-            cur.execute(sql_exists, row)
-            if cur.fetchone():
-                skipped += 1
-                continue
-            cur.execute(sql_insert, row)
-            inserted += 1
-        cn.commit()
-    except Exception:
-        try:
-            cn.rollback()
-        except Exception:
-            pass
-        raise
-    finally:
-        try:
-            cn.close()
-            _log("SIS2(DB): conexión cerrada")
-        except Exception:
-            pass
 
-    _log(f"SIS2(DB): inserted={inserted}, skipped={skipped}")
-    return {"ok": True, "mode": "db", "inserted": inserted, "skipped": skipped, "count": len(rows)}
+# ───────────────────────────────────────────────────────────────
+# HTTP: una requests.Session por destino (keep-alive entre lotes)
+# ───────────────────────────────────────────────────────────────
+_HTTP_SESSIONS: dict[str, Any] = {}
+_HTTP_SESSIONS_LOCK = threading.Lock()
 
 
-def send_attendance_to_sis2(records: list, cfg: Sis2Config, log: Optional[callable] = None) -> dict:
+def _http_session(base_url: str):
+    """
+    Session compartida por base_url: el handshake TCP/TLS se paga una vez y los
+    siguientes lotes (GUI, runners, flota) reutilizan la conexión.
+    """
+    key = (base_url or "").rstrip("/")
+    with _HTTP_SESSIONS_LOCK:
+        session = _HTTP_SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            _HTTP_SESSIONS[key] = session
+        return session
+
+
+def send_attendance_to_sis2(records: Iterable[Any], cfg: Sis2Config, log: Optional[callable] = None) -> dict:
+    """
+    Entrega asistencias a SIS2. `records` puede ser lista o generador
+    (p. ej. zk_client.iter_attendance): se recorre una sola vez.
+    """
     def _log(msg: str) -> None:
         if log:
             log(msg)
@@ -214,18 +580,32 @@ def send_attendance_to_sis2(records: list, cfg: Sis2Config, log: Optional[callab
             raise RuntimeError("SIS2 HTTP: falta sis2.base_url en config.ini")
 
         url = cfg.base_url.rstrip("/") + "/api/reloj/asistencia"
-        headers = {"Content-Type": "application/json"}
+        payload = {"records": [_to_jsonable(r) for r in records]}
+        n = len(payload["records"])
+
+        body = encode_json(payload, cfg.compression, min_bytes=cfg.compress_min_bytes)
+        headers = body.headers()
         if cfg.api_key:
             headers["Authorization"] = f"Bearer {cfg.api_key}"
+        session = _http_session(cfg.base_url)
 
-        payload = {"records": [_to_jsonable(r) for r in records]}
-
-        _log(f"SIS2(HTTP): POST {url} (records={len(records)}) ...")
-        r = requests.post(url, json=payload, headers=headers, timeout=cfg.timeout_sec)
+        def _post():
+            _log(f"SIS2(HTTP): POST {url} (records={n}, {body.encoding} {body.sent_bytes} bytes) ...")
+            try:
+                res = session.post(url, data=body.body, headers=headers, timeout=cfg.timeout_sec)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                raise TransientError(f"SIS2 HTTP: {e}") from e
+            if res.status_code in (429, 502, 503, 504):
+                raise TransientError(f"SIS2 HTTP error {res.status_code}: {res.text[:300]}")
+            return res
+
+        started = time.perf_counter()
+        r = call_with_retry("sink", _post, breaker=circuit_breaker("sis2", cfg.base_url.rstrip("/")), log=_log)
+        transfer = summarize([body], time.perf_counter() - started)
         if not (200 <= r.status_code < 300):
             raise RuntimeError(f"SIS2 HTTP error {r.status_code}: {r.text[:300]}")
-        _log(f"SIS2(HTTP): ok {r.status_code}")
-        return {"ok": True, "mode": "http", "count": len(records), "status": r.status_code}
+        _log(f"SIS2(HTTP): ok {r.status_code} (x{transfer['ratio']} en {transfer['upload_sec']:.2f}s)")
+        return {"ok": True, "mode": "http", "count": n, "status": r.status_code, "transfer": transfer}
 
     if mode == "db":
         return _send_db(records, cfg, _log)
@@ -248,17 +628,10 @@ def send_probe_to_sis2_db(cfg: Sis2Config, log: Optional[callable] = None) -> di
 
     try:
         _log(f"SIS2(DB-PROBE): conectando a {cfg.db_server} / {cfg.db_database} ...")
-        cn = _db_connect(cfg)
-        try:
+        with _db_conn(cfg) as cn:
             cur = cn.cursor()
             cur.execute("SELECT 1")
             cur.fetchone()
-        finally:
-            try:
-                cn.close()
-                _log("SIS2(DB-PROBE): conexión cerrada")
-            except Exception:
-                pass
 
         _log("SIS2(DB-PROBE): OK")
         return {"ok": True, "mode": "db"}
@@ -397,42 +770,34 @@ def _send_users_db(users: list, cfg: Sis2Config, _log: callable, *, do_updates:
     WHERE ClaveChecador = %s
     """
 
-    _log(f"SIS2(DB): conectando a {cfg.db_server} / {cfg.db_database} ...")
-    cn = _db_connect(cfg)
-    _log("SIS2(DB): conexión abierta")
-
-    try:
-        cur = cn.cursor()
+    _log(f"SIS2(DB): {cfg.db_server} / {cfg.db_database} ...")
+    with _db_conn(cfg) as cn:
+        try:
+            cur = cn.cursor()
 
-        claves = [r[0] for r in rows]
-        existing_map = _fetch_existing_by_clave(cur, claves)
+            claves = [r[0] for r in rows]
+            existing_map = _fetch_existing_by_clave(cur, claves)
 
-        for (clave, nombre, privilegio, numero_tarjeta, estatus) in rows:
-            if clave in existing_map:
-                if do_updates:
-                    cur.execute(sql_update, (nombre, privilegio, numero_tarjeta, estatus, clave))
-                    updated += 1
-                else:
-                    skipped += 1
-                continue
+            for (clave, nombre, privilegio, numero_tarjeta, estatus) in rows:
+                if clave in existing_map:
+                    if do_updates:
+                        cur.execute(sql_update, (nombre, privilegio, numero_tarjeta, estatus, clave))
+                        updated += 1
+                    else:
+                        skipped += 1
+                    continue
 
-            cur.execute(sql_insert, (nombre, privilegio, numero_tarjeta, estatus, clave))
-            inserted += 1
+                cur.execute(sql_insert, (nombre, privilegio, numero_tarjeta, estatus, clave))
+                inserted += 1
 
-        cn.commit()
+            cn.commit()
 
-    except Exception:
-        try:
-            cn.rollback()
-        except Exception:
-            pass
-        raise
-    finally:
-        try:
-            cn.close()
-            _log("SIS2(DB): conexión cerrada")
         except Exception:
-            pass
+            try:
+                cn.rollback()
+            except Exception:
+                pass
+            raise
 
     _log(f"SIS2(DB): users inserted={inserted}, updated={updated}, skipped={skipped}, total={len(rows)}")
     return {
@@ -459,11 +824,76 @@ def _full_name(nombre: str | None, ap_p: str | None, ap_m: str | None) -> str:
     return " ".join(parts)[:300]  # Tb_Personal.Nombre varchar(300)
 
 
-def fetch_pending_personal_from_sis2_db(cfg: Sis2Config, *, limit: int = 500, log: Optional[callable] = None) -> list[dict]:
+def _pending_personal_row(r) -> Optional[dict]:
     """
-    Lee pendientes desde dba_mchs.Tb_Personal:
-      Estatus='A' AND ISNULL(SincronizadoEnDispositivo,0)=0
-    Retorna lista de dicts con campos necesarios para crear/actualizar en el checador.
+    Renglón de Tb_Personal (tuple pymssql) → dict para el checador; None si no trae IdPersonal.
+    """
+    try:
+        idp = int(r[0])
+    except Exception:
+        return None
+
+    nombre = str(r[1] or "")
+    ap_p = str(r[2] or "")
+    ap_m = str(r[3] or "")
+    estatus = str(r[4] or "A").strip().upper()
+
+    clave = str(r[5] or "").strip()  # PIN (varchar(4))
+    try:
+        privilegio = int(r[6] or 0)
+    except Exception:
+        privilegio = 0
+
+    try:
+        tarjeta = int(r[7] or 0)
+    except Exception:
+        tarjeta = 0
+
+    return {
+        "IdPersonal": idp,
+        "full_name": _full_name(nombre, ap_p, ap_m),
+        "Privilegio": privilegio,
+        "NumeroTarjeta": tarjeta,
+        "ClaveChecador": clave,
+        "Estatus": estatus,
+    }
+
+
+_SQL_PENDING_PERSONAL = """
+SELECT TOP ({limit})
+    IdPersonal,
+    Nombre,
+    ApellidoP,
+    ApellidoM,
+    Estatus,
+    ClaveChecador,
+    Privilegio,
+    NumeroTarjeta,
+    FechaAlta
+FROM dba_mchs.Tb_Personal WITH (NOLOCK)
+WHERE Estatus = 'A'
+  AND (SincronizadoEnDispositivo = 0 OR SincronizadoEnDispositivo IS NULL)
+  AND {keyset}
+ORDER BY FechaAlta ASC, IdPersonal ASC
+"""
+
+
+def iter_pending_personal_from_sis2_db(
+    cfg: Sis2Config,
+    *,
+    page_size: int = 500,
+    log: Optional[callable] = None,
+) -> Iterator[list[dict]]:
+    """
+    Pendientes de dba_mchs.Tb_Personal (Estatus='A', SincronizadoEnDispositivo 0/NULL)
+    en páginas de `page_size`, con paginación keyset sobre (FechaAlta, IdPersonal):
+    cada página arranca después de la última llave vista (sin OFFSET ni ISNULL
+    en el ORDER BY, así el índice sirve). Es estable aunque se vayan marcando
+    sincronizados durante el recorrido.
+
+    FechaAlta NULL va primero (como en el ORDER BY de SQL Server): se recorren
+    esos por IdPersonal y luego los que sí tienen fecha.
+    La conexión se presta por página (no queda tomada entre yields).
     """
     def _log(msg: str) -> None:
         if log:
@@ -471,75 +901,72 @@ def fetch_pending_personal_from_sis2_db(cfg: Sis2Config, *, limit: int = 500, lo
 
     if not cfg.enabled:
         _log("SIS2: disabled (cfg.enabled=false).")
-        return []
+        return
 
     if (cfg.mode or "").strip().lower() != "db":
         raise RuntimeError("SIS2(personal): mode debe ser 'db'.")
 
-    cn = _db_connect(cfg)
-    _log("SIS2(DB): conexión abierta (fetch personal pendientes)")
-    try:
-        cur = cn.cursor()
-        sql = f"""
-        SELECT TOP ({int(limit)})
-            IdPersonal,
-            Nombre,
-            ApellidoP,
-            ApellidoM,
-            Estatus,
-            ClaveChecador,
-            Privilegio,
-            NumeroTarjeta
-        FROM dba_mchs.Tb_Personal WITH (NOLOCK)
-        WHERE Estatus = 'A'
-          AND ISNULL(SincronizadoEnDispositivo, 0) = 0
-        ORDER BY ISNULL(FechaAlta, '1900-01-01') ASC, IdPersonal ASC
-        """
-        cur.execute(sql)
-        rows = cur.fetchall() or []
-
-        out: list[dict] = []
-        for r in rows:
-            # pymssql: row es tuple
-            try:
-                idp = int(r[0])
-            except Exception:
-                continue
-
-            nombre = str(r[1] or "")
-            ap_p = str(r[2] or "")
-            ap_m = str(r[3] or "")
-            estatus = str(r[4] or "A").strip().upper()
-
-            clave = str(r[5] or "").strip()  # PIN (varchar(4))
-            try:
-                privilegio = int(r[6] or 0)
-            except Exception:
-                privilegio = 0
-
-            try:
-                tarjeta = int(r[7] or 0)
-            except Exception:
-                tarjeta = 0
-
-            out.append({
-                "IdPersonal": idp,
-                "full_name": _full_name(nombre, ap_p, ap_m),
-                "Privilegio": privilegio,
-                "NumeroTarjeta": tarjeta,
-                "ClaveChecador": clave,
-                "Estatus": estatus,
-            })
+    page_size = max(1, int(page_size or 1))
+    null_phase = True
+    last_fecha = None
+    last_id = 0
+    pages = 0
+    total = 0
+
+    while True:
+        if null_phase:
+            keyset = "FechaAlta IS NULL AND IdPersonal > %s"
+            params: tuple = (last_id,)
+        elif last_fecha is None:
+            keyset = "FechaAlta IS NOT NULL"
+            params = ()
+        else:
+            keyset = "(FechaAlta > %s OR (FechaAlta = %s AND IdPersonal > %s))"
+            params = (last_fecha, last_fecha, last_id)
+
+        with _db_conn(cfg) as cn:
+            cur = cn.cursor()
+            sql = _SQL_PENDING_PERSONAL.format(limit=page_size, keyset=keyset)
+            if params:
+                cur.execute(sql, params)
+            else:
+                cur.execute(sql)
+            rows = cur.fetchall() or []
+
+        if rows:
+            last_id = int(rows[-1][0])
+            last_fecha = rows[-1][8]
+            page = [p for p in (_pending_personal_row(r) for r in rows) if p is not None]
+            if page:
+                pages += 1
+                total += len(page)
+                _log(f"SIS2(DB): pendientes personal página {pages}: {len(page)} (acumulado {total})")
+                yield page
+
+        if len(rows) < page_size:
+            if not null_phase:
+                break
+            # Terminaron los de FechaAlta NULL: siguen los que tienen fecha
+            null_phase = False
+            last_fecha = None
+            last_id = 0
+
+    _log(f"SIS2(DB): pendientes personal={total}")
 
-        _log(f"SIS2(DB): pendientes personal={len(out)}")
-        return out
 
-    finally:
-        try:
-            cn.close()
-            _log("SIS2(DB): conexión cerrada (fetch personal pendientes)")
-        except Exception:
-            pass
+def fetch_pending_personal_from_sis2_db(cfg: Sis2Config, *, limit: int = 500, log: Optional[callable] = None) -> list[dict]:
+    """
+    Lee pendientes desde dba_mchs.Tb_Personal:
+      Estatus='A' AND ISNULL(SincronizadoEnDispositivo,0)=0
+    Retorna lista de dicts con campos necesarios para crear/actualizar en el checador.
+    (Solo la primera página; para recorrer todos usa iter_pending_personal_from_sis2_db.)
+    """
+    out: list[dict] = []
+    for page in iter_pending_personal_from_sis2_db(cfg, page_size=limit, log=log):
+        out.extend(page)
+        if len(out) >= limit:
+            break
+    return out[:limit]
 
 
 def mark_personal_synced_in_sis2_db(cfg: Sis2Config, idpersonal: int, *, log: Optional[callable] = None) -> bool:
@@ -556,30 +983,79 @@ def mark_personal_synced_in_sis2_db(cfg: Sis2Config, idpersonal: int, *, log: Op
     if (cfg.mode or "").strip().lower() != "db":
         raise RuntimeError("SIS2(personal): mode debe ser 'db'.")
 
-    cn = _db_connect(cfg)
-    _log("SIS2(DB): conexión abierta (mark synced)")
     try:
-        cur = cn.cursor()
-        cur.execute(
-            """
-            UPDATE dba_mchs.Tb_Personal
-            SET SincronizadoEnDispositivo = 1
-            WHERE IdPersonal = %s
-            """,
-            (int(idpersonal),)
-        )
-        cn.commit()
+        with _db_conn(cfg) as cn:
+            try:
+                cur = cn.cursor()
+                cur.execute(
+                    """
+                    UPDATE dba_mchs.Tb_Personal
+                    SET SincronizadoEnDispositivo = 1
+                    WHERE IdPersonal = %s
+                    """,
+                    (int(idpersonal),)
+                )
+                cn.commit()
+            except Exception:
+                try:
+                    cn.rollback()
+                except Exception:
+                    pass
+                raise
         return True
     except Exception as e:
-        try:
-            cn.rollback()
-        except Exception:
-            pass
         _log(f"SIS2(DB): mark synced ERROR IdPersonal={idpersonal}: {e}")
         return False
-    finally:
-        try:
-            cn.close()
-            _log("SIS2(DB): conexión cerrada (mark synced)")
-        except Exception:
-            pass
+
+
+def mark_personal_synced_bulk(cfg: Sis2Config, ids: Iterable[int], *, log: Optional[callable] = None) -> int:
+    """
+    Marca SincronizadoEnDispositivo=1 para muchos IdPersonal en UNA transacción
+    (UPDATE ... IN (...) por chunks bajo el límite de 2100 parámetros).
+    Regresa cuántos renglones se marcaron; si falla, rollback y RuntimeError
+    (ninguno queda marcado: el siguiente ciclo los vuelve a aplicar).
+    """
+    def _log(msg: str) -> None:
+        if log:
+            log(msg)
+
+    if not cfg.enabled:
+        return 0
+
+    if (cfg.mode or "").strip().lower() != "db":
+        raise RuntimeError("SIS2(personal): mode debe ser 'db'.")
+
+    id_list = sorted({int(i) for i in ids})
+    if not id_list:
+        return 0
+
+    step = _MSSQL_MAX_PARAMS - 100
+    marked = 0
+    try:
+        with _db_conn(cfg) as cn:
+            try:
+                cur = cn.cursor()
+                for start in range(0, len(id_list), step):
+                    chunk = id_list[start:start + step]
+                    cur.execute(
+                        f"""
+                        UPDATE dba_mchs.Tb_Personal
+                        SET SincronizadoEnDispositivo = 1
+                        WHERE IdPersonal IN ({",".join(["%s"] * len(chunk))})
+                        """,
+                        tuple(chunk),
+                    )
+                    marked += max(0, int(cur.rowcount or 0))
+                cn.commit()
+            except Exception:
+                try:
+                    cn.rollback()
+                except Exception:
+                    pass
+                raise
+    except Exception as e:
+        _log(f"SIS2(DB): mark synced (bulk, {len(id_list)}) ERROR: {e}")
+        raise RuntimeError(f"SIS2(DB): no se pudo marcar personal sincronizado: {e}") from e
+
+    _log(f"SIS2(DB): marcados SincronizadoEnDispositivo=1: {marked}/{len(id_list)}")
+    return marked
@@ -1,16 +1,25 @@
 # sis3_reloj/sis3_sink.py
 from __future__ import annotations
 
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Iterable
 from datetime import datetime
 
+from .compression import DEFAULT_MIN_BYTES, EncodedBody, encode_json, summarize
+from .retry import TransientError, call_with_retry, circuit_breaker
+
 try:
     import requests
     from requests import Response
+    from requests.adapters import HTTPAdapter
 except Exception:
     requests = None
     Response = Any
+    HTTPAdapter = None
 
 
 @dataclass(frozen=True)
@@ -18,6 +27,20 @@ class Sis3Config:
     base_url: str
     api_key: str
     timeout_sec: int = 20
+    # Conexiones HTTP reutilizables hacia la API (keep-alive)
+    pool_size: int = 4
+    keepalive: bool = True
+    # Envío por chunks (0 = sin límite) y POST simultáneos
+    chunk_records: int = 2000
+    chunk_max_kb: int = 512
+    max_in_flight: int = 2
+    # Content-Encoding del request: "none" | "gzip" | "zstd" (ver compression.py)
+    compression: str = "none"
+    compress_min_bytes: int = DEFAULT_MIN_BYTES
+
+
+# Respuestas que vale la pena reintentar (sobrecarga / caída momentánea del backend)
+_TRANSIENT_STATUS = frozenset({429, 502, 503, 504})
 
 
 def _ensure_requests() -> None:
@@ -55,29 +78,186 @@ def _safe_json(res: Response) -> dict:
         raise RuntimeError(f"Respuesta no-JSON (HTTP {res.status_code}): {txt}")
 
 
-def _post_json(
-    url: str,
-    *,
-    headers: dict,
-    payload: dict,
-    timeout_sec: int,
-    log: Optional[Callable[[str], None]] = None,
-) -> Response:
-    if log:
-        log(f"SIS3(HTTP): POST {url}")
+# ───────────────────────────────────────────────────────────────
+# Cliente HTTP con keep-alive (un pool de conexiones por API)
+# ───────────────────────────────────────────────────────────────
+class Sis3Client:
+    """
+    requests.Session compartida hacia la API de SIS3: DNS/TCP/TLS se pagan una
+    vez y las siguientes llamadas (probe, lotes, cola del drain) reutilizan la
+    conexión. pool_size = conexiones simultáneas que se conservan abiertas.
+
+    Normalmente no se crea a mano: sis3_client(cfg) regresa la compartida.
+    """
+
+    def __init__(self, cfg: Sis3Config):
+        _ensure_requests()
+        self.cfg = cfg
+        self.base_url = (cfg.base_url or "").rstrip("/")
+        self.session = requests.Session()
+        # El pool cubre al menos los chunks en vuelo (si no, requests descarta conexiones)
+        pool = max(1, int(cfg.pool_size or 1), int(cfg.max_in_flight or 1))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(_headers(cfg))
+        if not cfg.keepalive:
+            self.session.headers["Connection"] = "close"
+        self.requests_sent = 0
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def encode(self, payload: dict) -> EncodedBody:
+        return encode_json(payload, self.cfg.compression, min_bytes=self.cfg.compress_min_bytes)
+
+    def post_json(
+        self,
+        path: str,
+        payload: dict,
+        *,
+        log: Optional[Callable[[str], None]] = None,
+    ) -> Response:
+        return self.post_encoded(path, self.encode(payload), log=log)
+
+    def post_encoded(
+        self,
+        path: str,
+        body: EncodedBody,
+        *,
+        log: Optional[Callable[[str], None]] = None,
+    ) -> Response:
+        url = self.url(path)
+        if log:
+            if body.encoding == "identity":
+                log(f"SIS3(HTTP): POST {url}")
+            else:
+                log(f"SIS3(HTTP): POST {url} ({body.encoding} {body.raw_bytes} → {body.sent_bytes} bytes)")
+
+        timeout_sec = int(self.cfg.timeout_sec)
+        try:
+            res = self.session.post(url, data=body.body, headers=body.headers(), timeout=timeout_sec)
+        except requests.exceptions.Timeout:
+            raise TransientError(f"SIS3 timeout ({timeout_sec}s) al llamar {url}")
+        except requests.exceptions.ConnectionError as e:
+            raise TransientError(f"SIS3 connection error al llamar {url}: {e}")
+        except Exception as e:
+            raise RuntimeError(f"SIS3 error HTTP al llamar {url}: {e}")
+        self.requests_sent += 1
+        return res
+
+    def close(self) -> None:
+        try:
+            self.session.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "Sis3Client":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+_CLIENTS: dict[Sis3Config, Sis3Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def sis3_client(cfg: Sis3Config) -> Sis3Client:
+    """
+    Cliente compartido por configuración (Sis3Config es hashable): la GUI,
+    los runners y la flota reutilizan el mismo pool de conexiones.
+    """
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(cfg)
+        if client is None:
+            client = Sis3Client(cfg)
+            _CLIENTS[cfg] = client
+        return client
+
+
+ATTENDANCE_PATH = "/api/checador/asistencias"
 
-    try:
-        return requests.post(url, json=payload, headers=headers, timeout=int(timeout_sec))
-    except requests.exceptions.Timeout:
-        raise RuntimeError(f"SIS3 timeout ({timeout_sec}s) al llamar {url}")
-    except requests.exceptions.ConnectionError as e:
-        raise RuntimeError(f"SIS3 connection error al llamar {url}: {e}")
-    except Exception as e:
-        raise RuntimeError(f"SIS3 error HTTP al llamar {url}: {e}")
+
+def _record_row(r: Any) -> tuple[Any, dict]:
+    """
+    (timestamp original, record para el payload).
+    """
+    ts = getattr(r, "timestamp", None)
+    return ts, {
+        "user_id": str(getattr(r, "user_id", "")),
+        "timestamp": ts.isoformat(timespec="seconds") if hasattr(ts, "isoformat") else str(ts or ""),
+        "status": getattr(r, "status", None),
+        "punch": getattr(r, "punch", None),
+    }
+
+
+def _split_chunks(rows: list[tuple[Any, dict]], max_records: int, max_bytes: int) -> list[list[tuple[Any, dict]]]:
+    """
+    Parte los renglones (ya ordenados por timestamp) en chunks de a lo más
+    max_records registros / ~max_bytes de JSON. Un chunk nunca corta un grupo
+    de checadas con el mismo timestamp: así el checkpoint por chunk
+    (since = último timestamp confirmado) no deja fuera a las del chunk siguiente.
+    """
+    max_records = int(max_records) if max_records else (len(rows) or 1)
+    max_bytes = int(max_bytes or 0)
+    chunks: list[list[tuple[Any, dict]]] = []
+    current: list[tuple[Any, dict]] = []
+    size = 0
+    for row in rows:
+        row_bytes = len(json.dumps(row[1], separators=(",", ":"))) + 1
+        full = len(current) >= max_records or (max_bytes and size + row_bytes > max_bytes)
+        if current and full and row[1]["timestamp"] != current[-1][1]["timestamp"]:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(row)
+        size += row_bytes
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Contadores por chunk que sí tiene sentido sumar
+_SUMMED_FIELDS = frozenset({"received", "inserted", "skipped"})
+
+
+def _merge_responses(responses: list[dict], *, summed: frozenset = _SUMMED_FIELDS) -> dict:
+    """
+    Junta las respuestas JSON de los chunks (en orden) en una sola, sin perder
+    campos del servidor: received/inserted/skipped se suman, listas se
+    concatenan, dicts se combinan (sin sumar nada adentro) y cualquier otro
+    valor (ids, status, versión...) queda con el del último chunk.
+    Con un solo chunk regresa esa respuesta tal cual.
+    """
+    merged: dict = {}
+    for j in responses:
+        for key, value in j.items():
+            prev = merged.get(key)
+            if isinstance(value, dict):
+                merged[key] = (
+                    _merge_responses([prev, value], summed=frozenset()) if isinstance(prev, dict) else dict(value)
+                )
+            elif isinstance(value, list):
+                merged[key] = prev + value if isinstance(prev, list) else list(value)
+            elif key in summed and key in merged:
+                merged[key] = int(prev or 0) + int(value or 0)
+            else:
+                merged[key] = value
+    return merged
+
+
+def _human_summary(inserted: int, skipped: int) -> str:
+    if inserted == 0 and skipped > 0:
+        return "SIS3 ya tenía estas checadas; no se duplicó nada."
+    if inserted > 0 and skipped > 0:
+        return "Se insertaron checadas nuevas y otras ya existían (deduplicación)."
+    if inserted > 0:
+        return "Checadas nuevas registradas en SIS3."
+    return "Sin cambios."
 
 
 def send_attendance_to_sis3(
-    records: list,
+    records: Iterable[Any],
     cfg: Sis3Config,
     *,
     device_ip: str,
@@ -85,7 +265,27 @@ def send_attendance_to_sis3(
     file_tag: str,
     mode: str = "incremental",
     log: Optional[Callable[[str], None]] = None,
+    client: Optional[Sis3Client] = None,
+    on_progress: Optional[Callable[[int, Any], None]] = None,
 ) -> dict:
+    """
+    `records` puede ser lista o generador (p. ej. zk_client.iter_attendance):
+    se recorre una sola vez al armar el payload.
+    client: pool HTTP a usar (default: el compartido de sis3_client(cfg)).
+
+    Envío por chunks (cfg.chunk_records / cfg.chunk_max_kb), ordenados por
+    timestamp, con hasta cfg.max_in_flight POST en paralelo; cada chunk se
+    reintenta por separado. on_progress(confirmados, max_ts) se llama cada vez
+    que avanza el prefijo CONTIGUO de chunks confirmados: el caller puede mover
+    su checkpoint ahí, y si algo falla solo se re-envía la cola no confirmada.
+    Si un chunk falla (agotados los reintentos) se lanza RuntimeError después
+    de esperar a los chunks en vuelo.
+
+    Regresa las respuestas del servidor combinadas (_merge_responses: se
+    conservan campos como duplicados/errores) más chunks, human y transfer.
+    Sin records no se hace ningún POST (el API rechaza records vacíos) y se
+    regresa ok=True con received/inserted/skipped en 0.
+    """
     def _log(msg: str) -> None:
         if log:
             log(msg)
@@ -97,76 +297,143 @@ def send_attendance_to_sis3(
     if not (cfg.api_key or "").strip():
         raise RuntimeError("SIS3: falta api_key")
 
-    url = cfg.base_url.rstrip("/") + "/api/checador/asistencias"
-    headers = _headers(cfg)
+    client = client or sis3_client(cfg)
+    breaker = circuit_breaker("sis3", cfg.base_url.rstrip("/"))
 
-    # Tu API solo valida batch.file_tag y records[*], pero no le molesta recibir campos extra.
-    payload = {
-        "device": {"ip": device_ip, "port": int(device_port)},
-        "batch": {
-            "created_at": _now_iso(),
-            "source": "sis3_reloj",
-            "mode": mode,
-            "file_tag": file_tag,
-        },
-        "records": [
-            {
-                "user_id": str(getattr(r, "user_id", "")),
-                "timestamp": (
-                    getattr(r, "timestamp", None).isoformat(timespec="seconds")
-                    if hasattr(getattr(r, "timestamp", None), "isoformat")
-                    else str(getattr(r, "timestamp", "") or "")
-                ),
-                "status": getattr(r, "status", None),
-                "punch": getattr(r, "punch", None),
-            }
-            for r in records
-        ],
-    }
+    # Orden por timestamp: el prefijo confirmado es un rango de tiempo cerrado
+    rows = sorted((_record_row(r) for r in records), key=lambda row: row[1]["timestamp"])
+    chunks = _split_chunks(rows, cfg.chunk_records, int(cfg.chunk_max_kb or 0) * 1024)
+    created_at = _now_iso()
 
-    _log(f"SIS3(HTTP): Enviando asistencias (records={len(records)}) ...")
-    res = _post_json(url, headers=headers, payload=payload, timeout_sec=cfg.timeout_sec, log=log)
+    def _payload(index: int, chunk: list[tuple[Any, dict]]) -> dict:
+        # Tu API solo valida batch.file_tag y records[*], pero no le molesta recibir campos extra.
+        return {
+            "device": {"ip": device_ip, "port": int(device_port)},
+            "batch": {
+                "created_at": created_at,
+                "source": "sis3_reloj",
+                "mode": mode,
+                "file_tag": file_tag,
+                "chunk": {"index": index + 1, "count": len(chunks)},
+            },
+            "records": [row[1] for row in chunk],
+        }
 
-    if not (200 <= res.status_code < 300):
-        # intenta JSON, si no, texto
-        try:
-            j_err = _safe_json(res)
-            raise RuntimeError(f"SIS3 HTTP {res.status_code}: {str(j_err)[:800]}")
-        except Exception:
-            txt = (res.text or "")[:800]
-            raise RuntimeError(f"SIS3 HTTP {res.status_code}: {txt}")
+    bodies: list[EncodedBody] = []
 
-    j = _safe_json(res)
+    def _post_chunk(index: int) -> dict:
+        # Se serializa/comprime una vez; los reintentos re-envían los mismos bytes
+        body = client.encode(_payload(index, chunks[index]))
+        bodies.append(body)
 
-    if not j.get("ok"):
-        raise RuntimeError(f"SIS3 respondió ok=false: {str(j)[:800]}")
+        def _send() -> Response:
+            res = client.post_encoded(ATTENDANCE_PATH, body, log=log)
+            if res.status_code in _TRANSIENT_STATUS:
+                raise TransientError(f"SIS3 HTTP {res.status_code}: {(res.text or '')[:300]}")
+            return res
 
-    inserted = int(j.get("inserted") or 0)
-    skipped = int(j.get("skipped") or 0)
+        # Reintentar es seguro: SIS3 deduplica (skipped) lo que ya tenía
+        res = call_with_retry("sink", _send, breaker=breaker, log=_log)
 
-    _log(f"SIS3(HTTP): ok received={j.get('received')} inserted={inserted} skipped={skipped}")
+        if not (200 <= res.status_code < 300):
+            # intenta JSON, si no, texto
+            try:
+                j_err = _safe_json(res)
+                raise RuntimeError(f"SIS3 HTTP {res.status_code}: {str(j_err)[:800]}")
+            except Exception:
+                txt = (res.text or "")[:800]
+                raise RuntimeError(f"SIS3 HTTP {res.status_code}: {txt}")
+
+        j = _safe_json(res)
+        if not j.get("ok"):
+            raise RuntimeError(f"SIS3 respondió ok=false: {str(j)[:800]}")
+        return j
+
+    _log(f"SIS3(HTTP): Enviando asistencias (records={len(rows)}, chunks={len(chunks)}) ...")
+
+    acked: dict[int, dict] = {}
+    done = 0  # chunks contiguos confirmados desde el inicio
+    done_records = 0
+    error: Optional[Exception] = None
+    in_flight = max(1, int(cfg.max_in_flight or 1))
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="sis3-chunk") as pool:
+        pending: dict = {}
+        next_index = 0
+        while next_index < len(chunks) or pending:
+            while error is None and next_index < len(chunks) and len(pending) < in_flight:
+                pending[pool.submit(_post_chunk, next_index)] = next_index
+                next_index += 1
+            if not pending:
+                break
+
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                index = pending.pop(fut)
+                try:
+                    acked[index] = fut.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                    _log(f"SIS3(HTTP): chunk {index + 1}/{len(chunks)} falló: {e}")
+
+            advanced = False
+            while done in acked:
+                done_records += len(chunks[done])
+                done += 1
+                advanced = True
+            if advanced and on_progress:
+                on_progress(done_records, chunks[done - 1][-1][0])
+
+    transfer = summarize(bodies, time.perf_counter() - started)
+    result = _merge_responses([acked[i] for i in sorted(acked)])
+    inserted = int(result.get("inserted") or 0)
+    skipped = int(result.get("skipped") or 0)
+    received = int(result.get("received") or 0)
+
+    if error is not None:
+        raise RuntimeError(
+            f"{error} (confirmadas {done_records}/{len(rows)} checadas en {done}/{len(chunks)} chunks; "
+            f"se re-envía solo la cola)"
+        )
+
+    _log(f"SIS3(HTTP): ok received={received} inserted={inserted} skipped={skipped} chunks={len(chunks)}")
+    if transfer["encoding"] != "identity":
+        _log(
+            f"SIS3(HTTP): {transfer['encoding']} {transfer['raw_bytes'] / 1024:.1f} KB → "
+            f"{transfer['sent_bytes'] / 1024:.1f} KB (x{transfer['ratio']}) en {transfer['upload_sec']:.2f}s"
+        )
 
     # Log humano (operación)
+    human = _human_summary(inserted, skipped)
     if inserted == 0 and skipped > 0:
-        human = "SIS3 ya tenía estas checadas; no se duplicó nada."
         _log("SIS3(HTTP): Nota → SIS3 ya tenía estas checadas; no se duplicó nada.")
     elif inserted > 0 and skipped > 0:
-        human = "Se insertaron checadas nuevas y otras ya existían (deduplicación)."
         _log("SIS3(HTTP): Nota → Se insertaron nuevas checadas y otras ya existían (deduplicación).")
-    elif inserted > 0 and skipped == 0:
-        human = "Checadas nuevas registradas en SIS3."
+    elif inserted > 0:
         _log("SIS3(HTTP): OK → Checadas nuevas registradas en SIS3.")
     else:
-        human = "Sin cambios."
         _log("SIS3(HTTP): OK → Sin cambios (0 nuevas, 0 repetidas).")
 
-    j["inserted"] = inserted
-    j["skipped"] = skipped
-    j["human"] = human
-    return j
+    result.update({
+        "ok": True,
+        "received": received,
+        "inserted": inserted,
+        "skipped": skipped,
+        "chunks": len(chunks),
+        "human": human,
+        "transfer": transfer,
+    })
+    return result
 
 
-def probe_sis3(cfg: Sis3Config, *, log: Optional[Callable[[str], None]] = None) -> dict:
+def probe_sis3(
+    cfg: Sis3Config,
+    *,
+    log: Optional[Callable[[str], None]] = None,
+    client: Optional[Sis3Client] = None,
+) -> dict:
     """
     Probe SIN ENSUCIAR BD, compatible con tu API actual (solo POST y records min:1).
 
@@ -196,8 +463,8 @@ def probe_sis3(cfg: Sis3Config, *, log: Optional[Callable[[str], None]] = None)
     if not (cfg.api_key or "").strip():
         raise RuntimeError("SIS3: falta api_key")
 
-    url = cfg.base_url.rstrip("/") + "/api/checador/asistencias"
-    headers = _headers(cfg)
+    client = client or sis3_client(cfg)
+    url = client.url(ATTENDANCE_PATH)
 
     # Payload que dispara 422 (records min:1) sin insertar nada.
     payload = {
@@ -206,7 +473,7 @@ def probe_sis3(cfg: Sis3Config, *, log: Optional[Callable[[str], None]] = None)
     }
 
     _log(f"SIS3(PROBE): POST {url} (payload inválido para forzar 422, sin insertar) ...")
-    res = _post_json(url, headers=headers, payload=payload, timeout_sec=cfg.timeout_sec, log=log)
+    res = client.post_json(ATTENDANCE_PATH, payload, log=log)
 
     if res.status_code == 422:
         # Esto confirma: auth OK + controller alcanzable.
@@ -4,6 +4,7 @@ from __future__ import annotations
 import json
 import os
 import sys
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -13,6 +14,9 @@ from typing import Optional, Any, Dict
 APP_NAME = "sis3-reloj"
 STATE_SCHEMA_VERSION = 1
 
+# Serializa los read-modify-write del unificado (runners/hilos concurrentes)
+_STATE_LOCK = threading.RLock()
+
 
 # ───────────────────────────────────────────────────────────────
 # Modelo (view por kind)
@@ -134,9 +138,10 @@ def _default_unified() -> Dict[str, Any]:
     return {
         "version": STATE_SCHEMA_VERSION,
         "targets": {
-            "sis2": {"last_ok_ts": None},
-            "sis3": {"last_ok_ts": None},
+            "sis2": {"last_ok_ts": None, "devices": {}},
+            "sis3": {"last_ok_ts": None, "devices": {}},
         },
+        "transport": {},
         "saved_at": datetime.now().isoformat(timespec="seconds"),
     }
 
@@ -150,11 +155,23 @@ def _ensure_unified_shape(j: Dict[str, Any]) -> Dict[str, Any]:
         if k not in j["targets"] or not isinstance(j["targets"].get(k), dict):
             j["targets"][k] = {}
         j["targets"][k].setdefault("last_ok_ts", None)
+        if not isinstance(j["targets"][k].get("devices"), dict):
+            j["targets"][k]["devices"] = {}
+    if not isinstance(j.get("transport"), dict):
+        j["transport"] = {}
     j.setdefault("version", STATE_SCHEMA_VERSION)
     j["saved_at"] = datetime.now().isoformat(timespec="seconds")
     return j
 
 
+def _load_unified(unified_path: Path) -> Dict[str, Any]:
+    try:
+        uj = _read_json(unified_path) if unified_path.exists() else _default_unified()
+    except Exception:
+        uj = _default_unified()
+    return _ensure_unified_shape(uj)
+
+
 # ───────────────────────────────────────────────────────────────
 # API compatible: load_state(path) / save_state(path, state)
 # ───────────────────────────────────────────────────────────────
@@ -208,16 +225,12 @@ def save_state(path: Path, state: State) -> None:
 
     unified_path = get_unified_state_path()
 
-    # Lee unificado existente si está, si no crea default
-    try:
-        uj = _read_json(unified_path) if unified_path.exists() else _default_unified()
-    except Exception:
-        uj = _default_unified()
-
-    uj = _ensure_unified_shape(uj)
-    uj["targets"][kind]["last_ok_ts"] = _dt_to_str(state.last_ok_ts)
-    uj["saved_at"] = datetime.now().isoformat(timespec="seconds")
-    _atomic_write_json(unified_path, uj)
+    with _STATE_LOCK:
+        # Lee unificado existente si está, si no crea default
+        uj = _load_unified(unified_path)
+        uj["targets"][kind]["last_ok_ts"] = _dt_to_str(state.last_ok_ts)
+        uj["saved_at"] = datetime.now().isoformat(timespec="seconds")
+        _atomic_write_json(unified_path, uj)
 
     # Escribe view/puntero para compatibilidad y logs
     _write_view_file(path, kind, state.last_ok_ts, unified_path)
@@ -238,3 +251,101 @@ def _write_view_file(view_path: Path, kind: str, last_ok_ts: Optional[datetime],
         "saved_at": datetime.now().isoformat(timespec="seconds"),
     }
     _atomic_write_json(view_path, payload)
+
+
+# ───────────────────────────────────────────────────────────────
+# Estado por dispositivo (dentro del unificado, por target)
+#   targets.<kind>.devices["ip:port"] = {record_count, ...}
+# ───────────────────────────────────────────────────────────────
+def device_key(ip: str, port: int) -> str:
+    return f"{str(ip).strip()}:{int(port)}"
+
+
+def _check_kind(kind: str) -> str:
+    k = (kind or "").strip().lower()
+    if k not in ("sis2", "sis3"):
+        raise ValueError(f"kind inválido para state: {kind!r}. Usa 'sis2' o 'sis3'.")
+    return k
+
+
+def load_device_state(kind: str, key: str) -> Dict[str, Any]:
+    """
+    Estado de un dispositivo para un target. Vacío si no existe (o si el unificado está corrupto).
+    """
+    k = _check_kind(kind)
+    with _STATE_LOCK:
+        uj = _load_unified(get_unified_state_path())
+    d = uj["targets"][k]["devices"].get(key)
+    return dict(d) if isinstance(d, dict) else {}
+
+
+def device_last_ok_ts(device_state: Dict[str, Any]) -> Optional[datetime]:
+    return _parse_dt(device_state.get("last_ok_ts"))
+
+
+def update_device_state(kind: str, key: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Actualiza (merge) el estado de un dispositivo y lo persiste de forma atómica.
+    datetimes se guardan como ISO (segundos).
+    """
+    k = _check_kind(kind)
+    unified_path = get_unified_state_path()
+    with _STATE_LOCK:
+        uj = _load_unified(unified_path)
+        devices = uj["targets"][k]["devices"]
+        d = devices.get(key) if isinstance(devices.get(key), dict) else {}
+        for name, value in fields.items():
+            d[name] = _dt_to_str(value) if isinstance(value, datetime) else value
+        d["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        devices[key] = d
+        _atomic_write_json(unified_path, uj)
+    return dict(d)
+
+
+def reset_device_log_state(key: str) -> None:
+    """
+    El reloj se limpió: record_count y cursor de TODOS los targets dejan de
+    describir el log (el contador vuelve a 0). Sin esto, un target que no
+    limpió conserva su contador viejo y, si el nuevo log llega a ese mismo
+    número, se salta como "sin checadas nuevas". last_ok_ts se conserva.
+    """
+    unified_path = get_unified_state_path()
+    with _STATE_LOCK:
+        uj = _load_unified(unified_path)
+        now = datetime.now().isoformat(timespec="seconds")
+        for k in ("sis2", "sis3"):
+            devices = uj["targets"][k]["devices"]
+            d = devices.get(key) if isinstance(devices.get(key), dict) else {}
+            d["record_count"] = 0
+            d["cursor"] = None
+            d["updated_at"] = now
+            devices[key] = d
+        _atomic_write_json(unified_path, uj)
+
+
+# ───────────────────────────────────────────────────────────────
+# Perfil de transporte por reloj (no depende del target)
+#   transport["ip:port"] = {force_udp, timeout, chunk_size, kb_per_sec, ...}
+# ───────────────────────────────────────────────────────────────
+def load_transport_profile(key: str) -> Dict[str, Any]:
+    """
+    Perfil guardado por probe_transport. Vacío si no se ha medido.
+    """
+    with _STATE_LOCK:
+        uj = _load_unified(get_unified_state_path())
+    d = uj["transport"].get(key)
+    return dict(d) if isinstance(d, dict) else {}
+
+
+def save_transport_profile(key: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reemplaza el perfil de transporte de un reloj (escritura atómica).
+    """
+    unified_path = get_unified_state_path()
+    with _STATE_LOCK:
+        uj = _load_unified(unified_path)
+        d = dict(profile)
+        d["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        uj["transport"][key] = d
+        _atomic_write_json(unified_path, uj)
+    return dict(d)
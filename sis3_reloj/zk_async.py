@@ -0,0 +1,362 @@
+# sis3_reloj/zk_async.py
+"""
+Cliente asyncio del protocolo ZK (TCP), solo el subconjunto que usa este proyecto:
+connect/auth, disable/enable, read_sizes, lecturas por buffer (ATTLOG / usuarios),
+get_users, set_user, delete_user, clear_attendance, refresh_data.
+
+Mismo formato de paquetes que pyzk (zk.base.ZK), pero leyendo frames completos
+(top TCP + header) con asyncio.StreamReader: un event loop puede manejar cientos
+de relojes sin un hilo por equipo.
+
+Alto nivel (índice de usuarios, cursor, lotes): zk_client.AsyncDeviceSession.
+Por ahora es solo transporte: los runners y fleet.py siguen usando pyzk con
+un hilo por reloj.
+"""
+from __future__ import annotations
+
+import asyncio
+from struct import pack, unpack
+from typing import Optional
+
+from zk import const
+from zk.base import make_commkey
+from zk.exception import ZKErrorConnection, ZKErrorResponse, ZKNetworkError
+from zk.user import User
+
+
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+
+_MAX_CHUNK_TCP = 0xFFC0
+_OK_CODES = (const.CMD_ACK_OK, const.CMD_PREPARE_DATA, const.CMD_DATA)
+
+
+# ───────────────────────────────────────────────────────────────
+# Paquetes (idéntico a pyzk)
+# ───────────────────────────────────────────────────────────────
+def _checksum(buf: bytes) -> int:
+    """
+    Checksum del paquete (zkemsdk.c), sobre header (con checksum=0) + datos.
+    """
+    checksum = 0
+    n = len(buf)
+    i = 0
+    while n > 1:
+        checksum += buf[i] | (buf[i + 1] << 8)
+        if checksum > const.USHRT_MAX:
+            checksum -= const.USHRT_MAX
+        i += 2
+        n -= 2
+    if n:
+        checksum += buf[-1]
+    while checksum > const.USHRT_MAX:
+        checksum -= const.USHRT_MAX
+    checksum = ~checksum
+    while checksum < 0:
+        checksum += const.USHRT_MAX
+    return checksum
+
+
+def build_packet(command: int, data: bytes, session_id: int, reply_id: int) -> bytes:
+    """
+    Paquete TCP completo (top + header + datos). reply_id ya incrementado.
+    """
+    chk = _checksum(pack("<4H", command, 0, session_id, reply_id) + data)
+    body = pack("<4H", command, chk, session_id, reply_id) + data
+    return pack("<HHI", const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2, len(body)) + body
+
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, int, int, bytes]:
+    """
+    Lee un frame TCP completo. Regresa (command, session_id, reply_id, data).
+    """
+    top = await reader.readexactly(8)
+    m1, m2, length = unpack("<HHI", top)
+    if m1 != const.MACHINE_PREPARE_DATA_1 or m2 != const.MACHINE_PREPARE_DATA_2 or length < 8:
+        raise ZKNetworkError("TCP packet invalid")
+    body = await reader.readexactly(length)
+    command, _chk, session_id, reply_id = unpack("<4H", body[:8])
+    return command, session_id, reply_id, body[8:]
+
+
+# ───────────────────────────────────────────────────────────────
+# Cliente
+# ───────────────────────────────────────────────────────────────
+class AsyncZK:
+    """
+    Conexión TCP a un reloj ZK. Los atributos de read_sizes (users, records,
+    cards, fingers, faces) se llenan igual que en pyzk.
+    """
+
+    def __init__(self, ip: str, port: int = 4370, *, password: int = 0, timeout: float = 5, encoding: str = "UTF-8"):
+        self.ip = ip
+        self.port = int(port)
+        self.password = int(password or 0)
+        self.timeout = float(timeout)
+        self.encoding = encoding
+
+        self.tcp = True
+        self.is_connect = False
+        self.user_packet_size = 72  # zk8 por TCP (pyzk: default con TCP)
+
+        self.users = self.records = self.cards = self.fingers = self.faces = 0
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._session_id = 0
+        self._reply_id = const.USHRT_MAX - 1
+        self._lock = asyncio.Lock()
+
+    # -------------------------
+    # Transporte
+    # -------------------------
+    async def _recv(self) -> tuple[int, bytes]:
+        command, _session, reply_id, data = await asyncio.wait_for(read_packet(self._reader), self.timeout)
+        self._reply_id = reply_id
+        return command, data
+
+    async def _send(self, command: int, data: bytes = b"") -> None:
+        if self._writer is None:
+            raise ZKErrorConnection("instance are not connected.")
+        reply_id = self._reply_id + 1
+        if reply_id >= const.USHRT_MAX:
+            reply_id -= const.USHRT_MAX
+        self._writer.write(build_packet(command, data, self._session_id, reply_id))
+        await asyncio.wait_for(self._writer.drain(), self.timeout)
+
+    async def _command(self, command: int, data: bytes = b"") -> tuple[int, bytes]:
+        if command not in (const.CMD_CONNECT, const.CMD_AUTH) and not self.is_connect:
+            raise ZKErrorConnection("instance are not connected.")
+        try:
+            await self._send(command, data)
+            return await self._recv()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError) as e:
+            raise ZKNetworkError(str(e) or type(e).__name__)
+
+    async def _ok(self, command: int, data: bytes = b"", *, error: str) -> bytes:
+        async with self._lock:
+            code, payload = await self._command(command, data)
+        if code not in _OK_CODES:
+            raise ZKErrorResponse(error)
+        return payload
+
+    # -------------------------
+    # Sesión
+    # -------------------------
+    async def connect(self) -> "AsyncZK":
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.port), self.timeout
+            )
+        except (asyncio.TimeoutError, OSError) as e:
+            raise ZKNetworkError(f"can't reach device ({self.ip}:{self.port}): {e}")
+
+        self._session_id = 0
+        self._reply_id = const.USHRT_MAX - 1
+        async with self._lock:
+            try:
+                await self._send(const.CMD_CONNECT)
+                command, session_id, reply_id, _data = await asyncio.wait_for(read_packet(self._reader), self.timeout)
+                self._session_id, self._reply_id = session_id, reply_id
+                if command == const.CMD_ACK_UNAUTH:
+                    command, _data = await self._command(
+                        const.CMD_AUTH, make_commkey(self.password, self._session_id)
+                    )
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as e:
+                await self._close_socket()
+                raise ZKNetworkError(str(e) or type(e).__name__)
+
+        if command not in _OK_CODES:
+            await self._close_socket()
+            if command == const.CMD_ACK_UNAUTH:
+                raise ZKErrorResponse("Unauthenticated")
+            raise ZKErrorResponse("Invalid response: Can't connect")
+
+        self.is_connect = True
+        return self
+
+    async def _close_socket(self) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def disconnect(self) -> bool:
+        try:
+            if self.is_connect:
+                await self._ok(const.CMD_EXIT, error="can't disconnect")
+        finally:
+            self.is_connect = False
+            await self._close_socket()
+        return True
+
+    # -------------------------
+    # Comandos simples
+    # -------------------------
+    async def disable_device(self) -> bool:
+        await self._ok(const.CMD_DISABLEDEVICE, error="Can't disable device")
+        return True
+
+    async def enable_device(self) -> bool:
+        await self._ok(const.CMD_ENABLEDEVICE, error="Can't enable device")
+        return True
+
+    async def refresh_data(self) -> bool:
+        await self._ok(const.CMD_REFRESHDATA, error="can't refresh data")
+        return True
+
+    async def free_data(self) -> bool:
+        await self._ok(const.CMD_FREE_DATA, error="can't free data")
+        return True
+
+    async def clear_attendance(self) -> bool:
+        await self._ok(const.CMD_CLEAR_ATTLOG, error="Can't clear response")
+        return True
+
+    async def read_sizes(self) -> bool:
+        data = await self._ok(const.CMD_GET_FREE_SIZES, error="can't read sizes")
+        if len(data) >= 80:
+            fields = unpack("20i", data[:80])
+            self.users = fields[4]
+            self.fingers = fields[6]
+            self.records = fields[8]
+            self.cards = fields[12]
+            data = data[80:]
+        if len(data) >= 12:
+            self.faces = unpack("3i", data[:12])[0]
+        return True
+
+    # -------------------------
+    # Lectura por buffer
+    # -------------------------
+    async def read_chunk(self, start: int, size: int) -> bytes:
+        """
+        Lee [start, start+size) del buffer preparado (1504). El reloj responde
+        DATA directo o PREPARE_DATA + frames DATA + ACK_OK.
+        """
+        async with self._lock:
+            code, data = await self._command(CMD_READ_BUFFER, pack("<ii", start, size))
+            if code == const.CMD_DATA:
+                return data
+            if code != const.CMD_PREPARE_DATA:
+                raise ZKErrorResponse(f"can't read chunk {start}:[{size}]")
+
+            chunks = []
+            try:
+                while True:
+                    code, data = await self._recv()
+                    if code == const.CMD_DATA:
+                        chunks.append(data)
+                    elif code == const.CMD_ACK_OK:
+                        break
+                    else:
+                        raise ZKErrorResponse(f"can't read chunk {start}:[{size}] (code {code})")
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as e:
+                raise ZKNetworkError(str(e) or type(e).__name__)
+            return b"".join(chunks)
+
+    async def prepare_buffer(self, command: int, fct: int = 0, ext: int = 0) -> tuple[int, bytes]:
+        """
+        Pide al reloj preparar un buffer (1503). Regresa (size, b"") o, si el reloj
+        manda los datos completos en la respuesta, (len(data), data).
+        """
+        async with self._lock:
+            code, data = await self._command(CMD_PREPARE_BUFFER, pack("<bhii", 1, command, fct, ext))
+        if code == const.CMD_DATA:
+            return len(data), data
+        if code not in _OK_CODES:
+            raise ZKErrorResponse("RWB Not supported")
+        return unpack("<I", data[1:5])[0], b""
+
+    async def read_buffer_range(self, size: int, start: int = 0) -> bytes:
+        """
+        Lee [start, size) de un buffer ya preparado y lo libera.
+        """
+        out = []
+        try:
+            while start < size:
+                n = min(_MAX_CHUNK_TCP, size - start)
+                out.append(await self.read_chunk(start, n))
+                start += n
+        finally:
+            try:
+                await self.free_data()
+            except Exception:
+                pass
+        return b"".join(out)
+
+    async def read_with_buffer(self, command: int, fct: int = 0, ext: int = 0) -> tuple[bytes, int]:
+        size, inline = await self.prepare_buffer(command, fct, ext)
+        if inline:
+            return inline, size
+        data = await self.read_buffer_range(size)
+        return data, len(data)
+
+    # -------------------------
+    # Usuarios
+    # -------------------------
+    async def get_users(self) -> list[User]:
+        await self.read_sizes()
+        if self.users == 0:
+            return []
+        data, size = await self.read_with_buffer(const.CMD_USERTEMP_RRQ, const.FCT_USER)
+        if size <= 4:
+            return []
+
+        total_size = unpack("<I", data[:4])[0]
+        packet = total_size // self.users if self.users else 72
+        self.user_packet_size = 28 if packet == 28 else 72
+        data = data[4:]
+        enc = self.encoding
+
+        users = []
+        if self.user_packet_size == 28:
+            while len(data) >= 28:
+                uid, privilege, password, name, card, group_id, _tz, user_id = unpack("<HB5s8sIxBhI", data[:28])
+                name = name.split(b"\x00")[0].decode(enc, errors="ignore").strip()
+                users.append(User(
+                    uid, name or f"NN-{user_id}", privilege,
+                    password.split(b"\x00")[0].decode(enc, errors="ignore"),
+                    str(group_id), str(user_id), card,
+                ))
+                data = data[28:]
+        else:
+            while len(data) >= 72:
+                uid, privilege, password, name, card, group_id, user_id = unpack("<HB8s24sIx7sx24s", data[:72])
+                user_id = user_id.split(b"\x00")[0].decode(enc, errors="ignore")
+                name = name.split(b"\x00")[0].decode(enc, errors="ignore").strip()
+                users.append(User(
+                    uid, name or f"NN-{user_id}", privilege,
+                    password.split(b"\x00")[0].decode(enc, errors="ignore"),
+                    group_id.split(b"\x00")[0].decode(enc, errors="ignore").strip(),
+                    user_id, card,
+                ))
+                data = data[72:]
+        return users
+
+    async def set_user(self, uid: int, name: str = "", privilege: int = 0, password: str = "",
+                       group_id: str = "", user_id: str = "", card: int = 0) -> None:
+        user_id = user_id or str(uid)
+        if privilege not in (const.USER_DEFAULT, const.USER_ADMIN):
+            privilege = const.USER_DEFAULT
+        enc = self.encoding
+        if self.user_packet_size == 28:
+            data = pack(
+                "HB5s8sIxBHI", uid, int(privilege), password.encode(enc, errors="ignore"),
+                name.encode(enc, errors="ignore"), int(card), int(group_id or 0), 0, int(user_id),
+            )
+        else:
+            data = pack(
+                "HB8s24s4sx7sx24s", uid, int(privilege), password.encode(enc, errors="ignore"),
+                name.encode(enc, errors="ignore").ljust(24, b"\x00")[:24], pack("<I", int(card))[:4],
+                str(group_id or "").encode(), str(user_id).encode(),
+            )
+        await self._ok(const.CMD_USER_WRQ, data, error="Can't set user")
+        await self.refresh_data()
+
+    async def delete_user(self, uid: int) -> None:
+        await self._ok(const.CMD_DELETE_USER, pack("<H", uid), error="Can't delete user")
+        await self.refresh_data()
@@ -0,0 +1,385 @@
+# sis3_reloj/zk_capture.py
+"""
+Captura y replay de sesiones con el reloj (a nivel conexión pyzk).
+
+- RecordingConn envuelve la conexión real y guarda cada llamada (método,
+  argumentos, resultado / excepción, tiempos y el estado que pyzk deja en la
+  conexión: contadores de read_sizes, buffer de respuesta, etc.).
+- ReplayBackend reproduce la captura por el mismo API de zk_client
+  (DeviceSession(..., replay=...)), a toda velocidad o con el timing original.
+
+Formato (.zkcap): magic + stream zlib de frames con un codificador binario
+propio (sin pickle: la captura se puede abrir con seguridad).
+
+  python -m sis3_reloj.zk_capture capture --ip 192.168.1.145 -o reloj.zkcap
+  python -m sis3_reloj.zk_capture info reloj.zkcap
+  python -m sis3_reloj.zk_capture replay reloj.zkcap [--timing original]
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+import zlib
+from pathlib import Path
+from struct import pack, unpack_from
+from typing import Any, Optional
+
+from zk import exception as zk_exception
+from zk.user import User
+
+from .pyzk_compat import INTERNAL_METHODS, SEND_COMMAND, STATE_AFTER_SEND
+
+
+MAGIC = b"SIS3CAP\x01"
+
+# Métodos de la conexión pyzk que usa zk_client (incluye los internos del cursor)
+RECORDED_METHODS = frozenset({
+    "read_sizes", "disable_device", "enable_device", "read_with_buffer",
+    "get_users", "set_user", "delete_user", "clear_attendance", "refresh_data",
+    "free_data", "disconnect",
+    *INTERNAL_METHODS,
+})
+
+# Estado que pyzk deja en la conexión después de ciertas llamadas
+_STATE_AFTER = {
+    "read_sizes": ("users", "records", "cards", "fingers", "faces"),
+    "get_users": ("user_packet_size",),
+    SEND_COMMAND: STATE_AFTER_SEND,
+}
+_STATE_ON_CONNECT = ("tcp", "user_packet_size")
+
+
+# ───────────────────────────────────────────────────────────────
+# Codificador binario (tipos que regresa pyzk)
+# ───────────────────────────────────────────────────────────────
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_BYTES, _T_LIST, _T_TUPLE, _T_DICT, _T_USER = range(11)
+
+
+def _enc(v: Any, out: bytearray) -> None:
+    if v is None:
+        out.append(_T_NONE)
+    elif v is True:
+        out.append(_T_TRUE)
+    elif v is False:
+        out.append(_T_FALSE)
+    elif isinstance(v, int):
+        out.append(_T_INT)
+        out += pack("<q", v)
+    elif isinstance(v, float):
+        out.append(_T_FLOAT)
+        out += pack("<d", v)
+    elif isinstance(v, str):
+        b = v.encode("utf-8")
+        out.append(_T_STR)
+        out += pack("<I", len(b)) + b
+    elif isinstance(v, (bytes, bytearray, memoryview)):
+        b = bytes(v)
+        out.append(_T_BYTES)
+        out += pack("<I", len(b)) + b
+    elif isinstance(v, (list, tuple)):
+        out.append(_T_LIST if isinstance(v, list) else _T_TUPLE)
+        out += pack("<I", len(v))
+        for x in v:
+            _enc(x, out)
+    elif isinstance(v, dict):
+        out.append(_T_DICT)
+        out += pack("<I", len(v))
+        for k, x in v.items():
+            _enc(k, out)
+            _enc(x, out)
+    elif isinstance(v, User):
+        out.append(_T_USER)
+        _enc((v.uid, v.name, v.privilege, v.password, v.group_id, v.user_id, v.card), out)
+    else:
+        raise TypeError(f"zk_capture: tipo no soportado: {type(v).__name__}")
+
+
+def _dec(buf: bytes, pos: int) -> tuple[Any, int]:
+    t = buf[pos]
+    pos += 1
+    if t == _T_NONE:
+        return None, pos
+    if t == _T_TRUE:
+        return True, pos
+    if t == _T_FALSE:
+        return False, pos
+    if t == _T_INT:
+        return unpack_from("<q", buf, pos)[0], pos + 8
+    if t == _T_FLOAT:
+        return unpack_from("<d", buf, pos)[0], pos + 8
+    if t in (_T_STR, _T_BYTES):
+        n = unpack_from("<I", buf, pos)[0]
+        pos += 4
+        raw = buf[pos:pos + n]
+        return (raw.decode("utf-8") if t == _T_STR else bytes(raw)), pos + n
+    if t in (_T_LIST, _T_TUPLE):
+        n = unpack_from("<I", buf, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(n):
+            x, pos = _dec(buf, pos)
+            items.append(x)
+        return (items if t == _T_LIST else tuple(items)), pos
+    if t == _T_DICT:
+        n = unpack_from("<I", buf, pos)[0]
+        pos += 4
+        d = {}
+        for _ in range(n):
+            k, pos = _dec(buf, pos)
+            d[k], pos = _dec(buf, pos)
+        return d, pos
+    if t == _T_USER:
+        fields, pos = _dec(buf, pos)
+        return User(*fields), pos
+    raise ValueError(f"zk_capture: tag desconocido {t} en offset {pos - 1}")
+
+
+# ───────────────────────────────────────────────────────────────
+# Archivo
+#   frame = (kind, name, t0, dt, args, kwargs, result, error, state)
+#   kind: "connect" | "call"
+# ───────────────────────────────────────────────────────────────
+class CaptureWriter:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("wb")
+        self._f.write(MAGIC)
+        self._z = zlib.compressobj(6)
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self.frames = 0
+
+    def now(self) -> float:
+        return time.monotonic() - self._t0
+
+    def write(self, frame: tuple) -> None:
+        body = bytearray()
+        _enc(frame, body)
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(self._z.compress(pack("<I", len(body)) + bytes(body)))
+            self.frames += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(self._z.flush())
+            self._f.close()
+            self._f = None
+
+
+def read_capture(path: Path) -> list[tuple]:
+    raw = Path(path).read_bytes()
+    if not raw.startswith(MAGIC):
+        raise RuntimeError(f"{path}: no es una captura .zkcap")
+    buf = zlib.decompress(raw[len(MAGIC):])
+    frames = []
+    pos = 0
+    while pos < len(buf):
+        n = unpack_from("<I", buf, pos)[0]
+        pos += 4
+        frame, _end = _dec(buf, pos)
+        frames.append(frame)
+        pos += n
+    return frames
+
+
+def _snapshot(conn, attrs) -> dict:
+    return {a: getattr(conn, a) for a in attrs if hasattr(conn, a)}
+
+
+def _rebuild_error(name: str, message: str) -> Exception:
+    cls = getattr(zk_exception, name, None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        return cls(message)
+    return RuntimeError(f"{name}: {message}")
+
+
+# ───────────────────────────────────────────────────────────────
+# Grabación
+# ───────────────────────────────────────────────────────────────
+class RecordingConn:
+    """
+    Proxy de una conexión pyzk: delega todo y graba las llamadas de RECORDED_METHODS.
+    """
+
+    def __init__(self, conn, writer: CaptureWriter):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_writer", writer)
+        writer.write(("connect", "", writer.now(), 0.0, (), {}, None, None, _snapshot(conn, _STATE_ON_CONNECT)))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._conn, name)
+        if name not in RECORDED_METHODS or not callable(attr):
+            return attr
+
+        def _call(*args, **kwargs):
+            w = self._writer
+            t0 = w.now()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                w.write(("call", name, t0, w.now() - t0, args, kwargs, None, (type(e).__name__, str(e)), {}))
+                raise
+            state = _snapshot(self._conn, _STATE_AFTER.get(name, ()))
+            w.write(("call", name, t0, w.now() - t0, args, kwargs, result, None, state))
+            return result
+
+        return _call
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self._conn, name, value)
+
+
+# ───────────────────────────────────────────────────────────────
+# Replay
+# ───────────────────────────────────────────────────────────────
+class ReplayBackend:
+    """
+    Fuente de conexiones reproducidas. timing="fast" (sin esperas) u
+    "original" (cada respuesta llega cuando llegó en la captura).
+    """
+
+    def __init__(self, path_or_frames, *, timing: str = "fast"):
+        if timing not in ("fast", "original"):
+            raise ValueError("timing debe ser 'fast' u 'original'")
+        self.frames = read_capture(path_or_frames) if isinstance(path_or_frames, (str, Path)) else list(path_or_frames)
+        self.timing = timing
+        self._pos = 0
+        self._t0: Optional[float] = None
+        self._cap_t0 = 0.0
+
+    def _next(self, kind: str, name: str = "") -> tuple:
+        if self._pos >= len(self.frames):
+            raise RuntimeError(f"Replay: la captura terminó (se pidió {name or kind})")
+        frame = self.frames[self._pos]
+        if frame[0] != kind or (kind == "call" and frame[1] != name):
+            raise RuntimeError(f"Replay: se esperaba {frame[1] or frame[0]}, llegó {name or kind} (frame {self._pos})")
+        self._pos += 1
+        return frame
+
+    def _wait_until(self, cap_t: float) -> None:
+        if self.timing != "original":
+            return
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+            self._cap_t0 = cap_t
+        delay = (cap_t - self._cap_t0) - (time.monotonic() - self._t0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def connect(self) -> "ReplayConn":
+        frame = self._next("connect")
+        self._wait_until(frame[2])
+        return ReplayConn(self, frame[8])
+
+    @property
+    def remaining(self) -> int:
+        return len(self.frames) - self._pos
+
+
+class ReplayConn:
+    def __init__(self, backend: ReplayBackend, state: dict):
+        object.__setattr__(self, "_backend", backend)
+        object.__setattr__(self, "_state", dict(state))
+
+    def __getattr__(self, name: str):
+        state = self._state
+        if name in state:
+            return state[name]
+        if name not in RECORDED_METHODS:
+            raise AttributeError(name)
+
+        def _call(*args, **kwargs):
+            backend = self._backend
+            _kind, _name, t0, dt, _args, _kwargs, result, error, new_state = backend._next("call", name)
+            backend._wait_until(t0 + dt)
+            state.update(new_state)
+            if error is not None:
+                raise _rebuild_error(*error)
+            return result
+
+        return _call
+
+    def __setattr__(self, name: str, value) -> None:
+        self._state[name] = value
+
+
+# ───────────────────────────────────────────────────────────────
+# CLI
+# ───────────────────────────────────────────────────────────────
+def _summary(frames: list[tuple]) -> str:
+    calls: dict[str, list] = {}
+    connects = 0
+    for kind, name, _t0, dt, _a, _k, result, error, _s in frames:
+        if kind == "connect":
+            connects += 1
+            continue
+        c = calls.setdefault(name, [0, 0.0, 0, 0])
+        c[0] += 1
+        c[1] += dt
+        if isinstance(result, tuple) and result and isinstance(result[0], bytes):
+            c[2] += len(result[0])
+        elif isinstance(result, bytes):
+            c[2] += len(result)
+        if error is not None:
+            c[3] += 1
+    span = frames[-1][2] + frames[-1][3] if frames else 0.0
+    lines = [f"frames={len(frames)} conexiones={connects} duración={span:.3f}s"]
+    for name, (n, total, nbytes, errors) in sorted(calls.items(), key=lambda kv: -kv[1][1]):
+        lines.append(f"  {name:<24} x{n:<5} {total:8.3f}s  {nbytes / 1024:10.1f} KB  errores={errors}")
+    return "\n".join(lines)
+
+
+def _run_reads(dev) -> None:
+    users = dev.read_users()
+    stats: dict = {}
+    batch = dev.read_attendance_batch(stats=stats)
+    print(f"usuarios={len(users)} checadas={len(batch)} total_log={stats.get('total', 0)}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    from .zk_client import DeviceSession
+
+    ap = argparse.ArgumentParser(prog="python -m sis3_reloj.zk_capture", description="Captura/replay de sesiones con el reloj.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("capture", help="lee usuarios + asistencias de un reloj y graba la sesión")
+    c.add_argument("--ip", required=True)
+    c.add_argument("--port", type=int, default=4370)
+    c.add_argument("--password", type=int, default=0)
+    c.add_argument("-o", "--output", required=True)
+
+    i = sub.add_parser("info", help="resumen de una captura")
+    i.add_argument("path")
+
+    r = sub.add_parser("replay", help="repite la lectura de 'capture' contra la captura")
+    r.add_argument("path")
+    r.add_argument("--timing", choices=("fast", "original"), default="fast")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "capture":
+        with DeviceSession(args.ip, args.port, args.password, capture=args.output) as dev:
+            _run_reads(dev)
+        print(f"Captura: {args.output}")
+        return 0
+
+    if args.cmd == "info":
+        print(_summary(read_capture(Path(args.path))))
+        return 0
+
+    backend = ReplayBackend(args.path, timing=args.timing)
+    started = time.monotonic()
+    with DeviceSession("replay", 0, 0, replay=backend) as dev:
+        _run_reads(dev)
+    print(f"Replay ({args.timing}): {time.monotonic() - started:.3f}s, frames sin usar={backend.remaining}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
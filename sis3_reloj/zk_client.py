@@ -1,10 +1,30 @@
 # sis3_reloj/zk_client.py
-from zk import ZK
-from typing import List, Optional
-from datetime import datetime
+from zk import ZK, const
+from zk.exception import ZKNetworkError
+from typing import Callable, Iterable, Iterator, List, Optional
+from datetime import datetime, timedelta
+from array import array
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from struct import pack, unpack, unpack_from
+import calendar
+import ipaddress
+import os
+import sys
+import threading
+import time
+
+from .pyzk_compat import PyzkInternals
+from .retry import TransientError, call_with_retry, circuit_breaker
+from .state_store import load_transport_profile
+from .zk_async import AsyncZK
+from .zk_capture import CaptureWriter, RecordingConn, ReplayBackend
 
 
 class UserRecord:
+    __slots__ = ("user_id", "name", "privilege", "card", "password", "enabled")
+
     def __init__(self, user_id, name, privilege, card, password, enabled):
         self.user_id = str(user_id)
         self.name = name or ""
@@ -25,8 +45,11 @@ class UserRecord:
 
 
 class AttendanceRecord:
+    # __slots__: sin __dict__ por instancia (logs de decenas de miles de checadas)
+    __slots__ = ("user_id", "status", "punch", "timestamp")
+
     def __init__(self, user_id, status, punch, timestamp):
-        self.user_id = str(user_id)
+        self.user_id = sys.intern(str(user_id))
         self.status = int(status) if status is not None else None
         self.punch = int(punch) if punch is not None else None
         self.timestamp = timestamp  # datetime
@@ -40,165 +63,1613 @@ class AttendanceRecord:
         }
 
 
-def _connect(ip: str, port: int, password: int):
+# ───────────────────────────────────────────────────────────────
+# Lote columnar de asistencias
+# ───────────────────────────────────────────────────────────────
+_EPOCH = datetime(1970, 1, 1)
+_NONE_SMALL = -1  # centinela para status/punch = None
+
+
+def _to_epoch(ts: datetime) -> int:
+    # timestamps del reloj son naive (hora local del equipo); se tratan como tal
+    return calendar.timegm(ts.timetuple())
+
+
+def _from_epoch(sec: int) -> datetime:
+    return _EPOCH + timedelta(seconds=sec)
+
+
+class AttendanceBatch:
+    """
+    Lote de asistencias en columnas (arrays tipados) en vez de un objeto por checada:
+      - user_id: código en array('I') + tabla de strings internados
+      - timestamp: segundos epoch en array('q')
+      - status / punch: array('h') (None => -1)
+
+    Iterar produce AttendanceRecord bajo demanda, así que los sinks existentes
+    lo consumen igual que una lista.
+    """
+
+    __slots__ = ("_user_ids", "_code_of", "_codes", "_ts", "_status", "_punch")
+
+    def __init__(self):
+        self._user_ids: list[str] = []
+        self._code_of: dict[str, int] = {}
+        self._codes = array("I")
+        self._ts = array("q")
+        self._status = array("h")
+        self._punch = array("h")
+
+    @classmethod
+    def from_records(cls, records: Iterable) -> "AttendanceBatch":
+        batch = cls()
+        for r in records:
+            batch.append(r)
+        return batch
+
+    # -------------------------
+    # Carga
+    # -------------------------
+    def _code(self, user_id) -> int:
+        uid = str(user_id)
+        code = self._code_of.get(uid)
+        if code is None:
+            code = len(self._user_ids)
+            self._user_ids.append(sys.intern(uid))
+            self._code_of[uid] = code
+        return code
+
+    def append_raw(self, user_id, status, punch, timestamp: datetime) -> None:
+        self._codes.append(self._code(user_id))
+        self._ts.append(_to_epoch(timestamp))
+        self._status.append(_NONE_SMALL if status is None else int(status))
+        self._punch.append(_NONE_SMALL if punch is None else int(punch))
+
+    def append(self, record) -> None:
+        ts = getattr(record, "timestamp", None)
+        if not isinstance(ts, datetime):
+            return
+        self.append_raw(getattr(record, "user_id", ""), getattr(record, "status", None), getattr(record, "punch", None), ts)
+
+    # -------------------------
+    # Acceso
+    # -------------------------
+    def __len__(self) -> int:
+        return len(self._ts)
+
+    def __bool__(self) -> bool:
+        return len(self._ts) > 0
+
+    def _record(self, i: int) -> AttendanceRecord:
+        status = self._status[i]
+        punch = self._punch[i]
+        return AttendanceRecord(
+            user_id=self._user_ids[self._codes[i]],
+            status=None if status == _NONE_SMALL else status,
+            punch=None if punch == _NONE_SMALL else punch,
+            timestamp=_from_epoch(self._ts[i]),
+        )
+
+    def __iter__(self) -> Iterator[AttendanceRecord]:
+        for i in range(len(self._ts)):
+            yield self._record(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._take(range(*key.indices(len(self._ts))))
+        if key < 0:
+            key += len(self._ts)
+        return self._record(key)
+
+    def _take(self, indices) -> "AttendanceBatch":
+        out = AttendanceBatch()
+        # Copia de la tabla de user_id (pocos empleados; los strings siguen
+        # internados): un append al derivado no toca la del padre
+        out._user_ids = list(self._user_ids)
+        out._code_of = dict(self._code_of)
+        out._codes = array("I", (self._codes[i] for i in indices))
+        out._ts = array("q", (self._ts[i] for i in indices))
+        out._status = array("h", (self._status[i] for i in indices))
+        out._punch = array("h", (self._punch[i] for i in indices))
+        return out
+
+    # -------------------------
+    # Operaciones rápidas
+    # -------------------------
+    def min_ts(self) -> Optional[datetime]:
+        return _from_epoch(min(self._ts)) if self._ts else None
+
+    def max_ts(self) -> Optional[datetime]:
+        return _from_epoch(max(self._ts)) if self._ts else None
+
+    def filter_after(self, since: Optional[datetime]) -> "AttendanceBatch":
+        """
+        Checkpoint incremental: solo timestamp > since (compara enteros, sin datetimes).
+        """
+        if since is None:
+            return self
+        cutoff = _to_epoch(since)
+        return self._take([i for i, t in enumerate(self._ts) if t > cutoff])
+
+    def to_dicts(self) -> list[dict]:
+        return [r.to_dict() for r in self]
+
+
+def _is_loopback(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(str(ip).strip()).is_loopback
+    except ValueError:
+        return str(ip).strip().lower() == "localhost"
+
+
+def _connect(
+    ip: str,
+    port: int,
+    password: int,
+    *,
+    timeout: int = 5,
+    force_udp: bool = False,
+    ommit_ping: bool = False,
+):
+    # pyzk hace ping (ICMP) antes de conectar; en loopback (zk_simulator) no aporta nada
     zk = ZK(
         ip,
         port=port,
-        timeout=5,
+        timeout=timeout,
         password=password,
-        force_udp=False,
+        force_udp=bool(force_udp),
+        ommit_ping=bool(ommit_ping) or _is_loopback(ip),
     )
     conn = zk.connect()
     return conn
 
 
-def read_attendance(ip: str, port: int, password: int) -> List[AttendanceRecord]:
-    conn = None
-    try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
-
-        attendances = conn.get_attendance() or []
-        result: List[AttendanceRecord] = []
-        for att in attendances:
-            ts = getattr(att, "timestamp", None)
-            if not isinstance(ts, datetime):
-                continue
-            result.append(
-                AttendanceRecord(
-                    user_id=getattr(att, "user_id", ""),
-                    status=getattr(att, "status", None),
-                    punch=getattr(att, "punch", None),
-                    timestamp=ts,
-                )
+# ───────────────────────────────────────────────────────────────
+# Perfil de transporte por reloj (TCP/UDP, timeouts, tamaño de chunk)
+#   Lo mide y guarda probe_transport; aquí solo se aplica.
+# ───────────────────────────────────────────────────────────────
+# Peor caso por registro ATTLOG (formato de 40 bytes)
+_ATTLOG_MAX_RECORD_SIZE = 40
+# Throughput supuesto si el perfil no se ha medido (enlace lento)
+_DEFAULT_KB_PER_SEC = 20.0
+
+
+@dataclass(frozen=True)
+class TransportProfile:
+    """
+    force_udp / timeout: lo que se pasa a pyzk al conectar.
+    chunk_size: bytes por lectura de buffer (0 = el default de pyzk:
+      0xFFC0 en TCP, 16 KB en UDP). En enlaces con pérdida, chunks más
+      chicos en UDP suelen terminar antes (menos retransmisión por chunk).
+    kb_per_sec: throughput medido por probe_transport (0 = sin medir).
+    """
+    force_udp: bool = False
+    timeout: int = 5
+    chunk_size: int = 0
+    kb_per_sec: float = 0.0
+
+    @property
+    def name(self) -> str:
+        proto = "udp" if self.force_udp else "tcp"
+        return f"{proto}/{self.chunk_size // 1024}k" if self.chunk_size else proto
+
+    def transfer_timeout(self, records: int) -> float:
+        """
+        Timeout del socket durante la transferencia del log: crece con el
+        tamaño esperado (records x 40 bytes) al throughput medido, con margen x3.
+        Nunca menor que timeout.
+        """
+        kbps = self.kb_per_sec if self.kb_per_sec > 0 else _DEFAULT_KB_PER_SEC
+        expected_kb = max(0, int(records)) * _ATTLOG_MAX_RECORD_SIZE / 1024
+        return max(float(self.timeout), self.timeout + 3.0 * expected_kb / kbps)
+
+    def to_dict(self) -> dict:
+        return {
+            "force_udp": bool(self.force_udp),
+            "timeout": int(self.timeout),
+            "chunk_size": int(self.chunk_size),
+            "kb_per_sec": round(float(self.kb_per_sec), 1),
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> Optional["TransportProfile"]:
+        if not isinstance(d, dict):
+            return None
+        try:
+            return cls(
+                force_udp=bool(d.get("force_udp", False)),
+                timeout=max(1, int(d.get("timeout") or 5)),
+                chunk_size=max(0, int(d.get("chunk_size") or 0)),
+                kb_per_sec=max(0.0, float(d.get("kb_per_sec") or 0.0)),
             )
+        except Exception:
+            return None
 
-        conn.enable_device()
-        conn.disconnect()
-        return result
 
+_TRANSPORT_PROFILES: dict[tuple[str, int], TransportProfile] = {}
+_TRANSPORT_LOCK = threading.Lock()
+
+
+def transport_profile(ip: str, port: int) -> TransportProfile:
+    """
+    Perfil vigente de un reloj: el registrado en memoria o, si no hay,
+    el guardado por probe_transport en el state (default: TCP, 5 s).
+    """
+    key = (str(ip), int(port))
+    with _TRANSPORT_LOCK:
+        cached = _TRANSPORT_PROFILES.get(key)
+    if cached is not None:
+        return cached
+    try:
+        profile = TransportProfile.from_dict(load_transport_profile(f"{ip}:{int(port)}"))
+    except Exception:
+        profile = None
+    profile = profile or TransportProfile()
+    with _TRANSPORT_LOCK:
+        _TRANSPORT_PROFILES[key] = profile
+    return profile
+
+
+def set_transport_profile(ip: str, port: int, profile: Optional[TransportProfile]) -> None:
+    """
+    Registra el perfil en memoria (las sesiones nuevas lo usan). None lo olvida
+    y la siguiente sesión lo vuelve a leer del state.
+    """
+    with _TRANSPORT_LOCK:
+        if profile is None:
+            _TRANSPORT_PROFILES.pop((str(ip), int(port)), None)
+        else:
+            _TRANSPORT_PROFILES[(str(ip), int(port))] = profile
+
+
+@contextmanager
+def _socket_timeout(conn, seconds: float, restore: float):
+    """
+    Cambia el timeout del socket de pyzk solo durante el bloque (transferencias
+    largas). Conexiones sin socket (replay) se dejan igual.
+    """
+    sock = PyzkInternals(conn).sock
+    if sock is None or seconds <= restore:
+        yield
+        return
+    sock.settimeout(seconds)
+    try:
+        yield
     finally:
-        if conn:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
+        try:
+            sock.settimeout(restore)
+        except Exception:
+            pass
+
+
+# Errores de red con el reloj que vale la pena reintentar (reconectando).
+# ZKErrorResponse / ZKErrorConnection (auth, respuesta inválida) no se reintentan.
+_ZK_TRANSIENT = (ZKNetworkError, OSError, TransientError)
+
 
+def _default_capture_path(ip: str, port: int) -> Optional[Path]:
+    # Captura bajo demanda sin tocar código: SIS3_RELOJ_CAPTURE_DIR=<carpeta>
+    base = (os.getenv("SIS3_RELOJ_CAPTURE_DIR") or "").strip()
+    if not base:
+        return None
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return Path(base) / f"{ip}_{port}-{stamp}.zkcap"
 
-def read_users(ip: str, port: int, password: int) -> list[UserRecord]:
+
+# uid interno del checador (slot de usuario): unsigned short en el protocolo
+_MAX_UID = 0xFFFF
+
+
+def _normalize_card(card) -> int:
+    if card in (None, ""):
+        return 0
+    try:
+        return int(card)
+    except Exception:
+        # Si llega como string no-numérico, lo dejamos en 0 para no romper
+        return 0
+
+
+# ───────────────────────────────────────────────────────────────
+# Decodificación del buffer crudo de asistencias (ATTLOG)
+#   - pyzk.get_attendance() arma la lista completa (y descarga usuarios);
+#     aquí decodificamos del buffer crudo bajo demanda.
+# ───────────────────────────────────────────────────────────────
+def _decode_zk_time(raw: bytes) -> datetime:
     """
-    Lee usuarios del checador.
+    Decodifica el timestamp del reloj (formato zkemsdk DecodeTime).
     """
-    conn = None
+    t = unpack("<I", raw)[0]
+    second = t % 60
+    t //= 60
+    minute = t % 60
+    t //= 60
+    hour = t % 24
+    t //= 24
+    day = t % 31 + 1
+    t //= 31
+    month = t % 12 + 1
+    t //= 12
+    return datetime(t + 2000, month, day, hour, minute, second)
+
+
+def _safe_decode_zk_time(raw: bytes) -> Optional[datetime]:
     try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
-
-        raw_users = conn.get_users() or []
-        users: list[UserRecord] = []
-
-        # DEBUG temporal: volcar el objeto crudo a un archivo
-        from pathlib import Path
-        debug_path = Path(__file__).resolve().parent.parent / "out" / "usuarios_raw.txt"
-        debug_path.parent.mkdir(parents=True, exist_ok=True)
-        with debug_path.open("w", encoding="utf-8") as fdbg:
-            for u in raw_users:
-                fdbg.write(repr(getattr(u, "__dict__", {})) + "\n")
-
-        for u in raw_users:
-            users.append(
-                UserRecord(
-                    user_id=getattr(u, "user_id", ""),
-                    name=getattr(u, "name", ""),
-                    privilege=getattr(u, "privilege", 0),
-                    card=getattr(u, "card", ""),
-                    password=getattr(u, "password", ""),
-                    enabled=getattr(u, "enabled", True),
-                )
-            )
+        return _decode_zk_time(raw)
+    except ValueError:
+        # Fecha inválida en memoria del reloj (p. ej. 31-feb); se descarta el registro
+        return None
+
+
+# Tamaños de registro ATTLOG que maneja pyzk (de mayor a menor)
+_ATTLOG_RECORD_SIZES = (40, 16, 8)
+
+
+def _attlog_stride(total_size: int, records: int) -> int:
+    """
+    Tamaño de registro a partir de los bytes del buffer. `records` viene de un
+    read_sizes() previo: si llegaron checadas antes del prepare, el buffer ya
+    trae más registros y total_size // records daría un tamaño inválido.
+    - exacto: total_size == records * k
+    - si no: el k conocido más grande que divide total_size con al menos
+      `records` registros (el log solo crece entre el read_sizes y la lectura).
+    """
+    if total_size <= 0:
+        return 0
+    for k in _ATTLOG_RECORD_SIZES:
+        if records > 0 and total_size == records * k:
+            return k
+    for k in _ATTLOG_RECORD_SIZES:
+        if total_size % k == 0 and total_size // k >= max(records, 1):
+            return k
+    return 0
+
+
+def _attlog_record_size(data: bytes, records: int) -> int:
+    if len(data) < 4:
+        return 0
+    return _attlog_stride(unpack("<I", data[:4])[0], records)
+
+
+def _iter_attlog(data: bytes, record_size: int, *, uid_to_user_id=None, start: int = 0) -> Iterator[tuple]:
+    """
+    Recorre el buffer ATTLOG (incluye los 4 bytes de tamaño al inicio) y
+    produce tuplas (user_id, status, punch, timestamp|None) sin materializar la lista.
+    Formatos soportados (igual que pyzk): 8, 16 y 40 bytes por registro.
+    """
+    if record_size <= 0:
+        return
+    end = len(data)
+    pos = 4 + start * record_size
+
+    if record_size == 8:
+        while pos + 8 <= end:
+            uid, status, ts_raw, punch = unpack_from("<HB4sB", data, pos)
+            pos += 8
+            user_id = (uid_to_user_id(uid) if uid_to_user_id else None) or str(uid)
+            yield user_id, status, punch, _safe_decode_zk_time(ts_raw)
+
+    elif record_size == 16:
+        while pos + 16 <= end:
+            user_id, ts_raw, status, punch, _reserved, _workcode = unpack_from("<I4sBB2sI", data, pos)
+            pos += 16
+            yield str(user_id), status, punch, _safe_decode_zk_time(ts_raw)
+
+    else:
+        while pos + 40 <= end:
+            _uid, user_id, status, ts_raw, punch, _space = unpack_from("<H24sB4sB8s", data, pos)
+            pos += record_size
+            user_id = user_id.split(b"\x00")[0].decode(errors="ignore")
+            yield user_id, status, punch, _safe_decode_zk_time(ts_raw)
+
+
+# ───────────────────────────────────────────────────────────────
+# Cursor por posición en el log (entradas ya procesadas)
+#   Attendance.uid de pyzk es el slot del usuario, NO un consecutivo;
+#   el consecutivo real es la posición de la entrada en el buffer ATTLOG.
+# ───────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class AttlogCursor:
+    """
+    seq = número de entradas del log ya procesadas.
+    anchor_* = entrada seq-1; si ya no coincide, el reloj se limpió
+    (y volvió a crecer) y el cursor no aplica.
+    """
+    seq: int
+    anchor_user_id: str = ""
+    anchor_ts: Optional[datetime] = None
+
+    def matches(self, user_id, ts: Optional[datetime]) -> bool:
+        return str(user_id) == self.anchor_user_id and ts == self.anchor_ts
 
-        conn.enable_device()
-        conn.disconnect()
-        return users
+    def to_dict(self) -> dict:
+        return {
+            "seq": int(self.seq),
+            "anchor_user_id": self.anchor_user_id,
+            "anchor_ts": self.anchor_ts.isoformat(timespec="seconds") if self.anchor_ts else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> Optional["AttlogCursor"]:
+        if not isinstance(d, dict):
+            return None
+        try:
+            seq = int(d.get("seq") or 0)
+            ts = d.get("anchor_ts")
+            ts = datetime.fromisoformat(ts) if ts else None
+        except Exception:
+            return None
+        if seq <= 0:
+            return None
+        return cls(seq=seq, anchor_user_id=str(d.get("anchor_user_id") or ""), anchor_ts=ts)
 
+
+_CMD_PREPARE_BUFFER = 1503
+
+
+def _slice_attlog(data: bytes, record_size: int, first: int) -> tuple[bytes, int, int]:
+    if record_size <= 0 or first <= 0:
+        return data, record_size, 0
+    tail = data[4 + first * record_size:]
+    return pack("<I", len(tail)) + tail, record_size, first
+
+
+def _read_attlog_from(conn, first: int, records: int, *, chunk_size: int = 0) -> tuple[bytes, int, int]:
+    """
+    Lee el buffer ATTLOG solo a partir de la entrada `first` (lecturas por
+    offset con el protocolo de buffer de pyzk: 1503 prepare + 1504 chunks).
+
+    Regresa (data, record_size, base): data con header de 4 bytes (como
+    read_with_buffer) y base = índice de la primera entrada contenida.
+    Si la versión de pyzk no expone los internos, transfiere completo y solo
+    se omite la decodificación del prefijo.
+    chunk_size: bytes por lectura (0 = default de pyzk según TCP/UDP).
+    """
+    zk = PyzkInternals(conn)
+    if not zk.available:
+        data, _size = conn.read_with_buffer(const.CMD_ATTLOG_RRQ)
+        return _slice_attlog(data, _attlog_record_size(data, records), first)
+
+    resp = zk.send_command(_CMD_PREPARE_BUFFER, pack("<bhii", 1, const.CMD_ATTLOG_RRQ, 0, 0), 1024)
+    if not resp.get("status"):
+        raise RuntimeError("El reloj no soporta lectura por buffer (ATTLOG).")
+
+    if resp.get("code") == const.CMD_DATA:
+        # Log chico: el reloj lo manda completo en la respuesta (mismo manejo que pyzk)
+        data = zk.last_data
+        if conn.tcp:
+            need = (zk.tcp_length - 8) - len(data)
+            if need > 0:
+                data = b"".join([data, zk.receive_raw(need)])
+        return _slice_attlog(data, _attlog_record_size(data, records), first)
+
+    size = unpack("<I", zk.last_data[1:5])[0]
+    record_size = _attlog_stride(size - 4, records)
+    max_chunk = 0xFFC0 if conn.tcp else 16 * 1024
+    if chunk_size > 0:
+        max_chunk = min(max_chunk, int(chunk_size))
+
+    chunks = []
+    try:
+        start = 4 + first * record_size if record_size else size
+        while start < size:
+            n = min(max_chunk, size - start)
+            chunks.append(zk.read_chunk(start, n))
+            start += n
     finally:
-        if conn:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
+        try:
+            conn.free_data()
+        except Exception:
+            pass
 
+    tail = b"".join(chunks)
+    return pack("<I", len(tail)) + tail, record_size, first if record_size else 0
 
-def update_user_name(ip: str, port: int, password: int, target_user_id: str, new_name: str) -> bool:
+
+def _open_attlog_rows(
+    data: bytes,
+    record_size: int,
+    uid_map: Optional[dict],
+    base: int,
+    cursor: Optional[AttlogCursor],
+) -> Optional[tuple[Iterator[tuple], int, Optional[tuple]]]:
     """
-    Actualiza solo el 'name' de un usuario.
+    Abre el recorrido del buffer validando el ancla del cursor.
+    Regresa (rows, skipped, last) o None si el ancla ya no coincide
+    (el reloj se limpió: hay que leer completo).
     """
-    conn = None
+    rows = _iter_attlog(data, record_size, uid_to_user_id=uid_map.get if uid_map else None)
+    if base <= 0:
+        return rows, 0, None
+    first = next(rows, None)
+    if first is None or cursor is None or not cursor.matches(first[0], first[3]):
+        return None
+    return rows, base + 1, first
+
+
+def _filter_attlog_rows(
+    rows: Iterator[tuple],
+    skipped: int,
+    last: Optional[tuple],
+    *,
+    since: Optional[datetime],
+    stats: Optional[dict],
+) -> Iterator[tuple]:
+    """
+    Filtro incremental en línea (timestamp > since) + stats:
+    total/yielded/filtered/cursor_skipped y el cursor siguiente ("cursor").
+    total = cursor_skipped + filtered + yielded (filtered: solo los descartados
+    aquí por fecha/sin timestamp, no el prefijo que se saltó el cursor).
+    """
+    total = skipped
+    yielded = 0
     try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
-
-        raw_users = conn.get_users() or []
-        target = None
-        for u in raw_users:
-            if str(getattr(u, "user_id", "")) == str(target_user_id):
-                target = u
-                break
+        for row in rows:
+            total += 1
+            last = row
+            ts = row[3]
+            if ts is None:
+                continue
+            if since is not None and not (ts > since):
+                continue
+            yielded += 1
+            yield row
+    finally:
+        if stats is not None:
+            stats.update({
+                "total": total,
+                "yielded": yielded,
+                "filtered": total - yielded - skipped,
+                "cursor_skipped": skipped,
+                "cursor": AttlogCursor(total, str(last[0]), last[3]) if (total and last) else None,
+            })
 
-        if not target:
-            return False
 
-        uid = getattr(target, "uid", None)
-        privilege = getattr(target, "privilege", 0)
-        pwd = getattr(target, "password", "")
-        group_id = getattr(target, "group_id", "")
-        card = getattr(target, "card", 0)
-        user_id = getattr(target, "user_id", "")
+# ───────────────────────────────────────────────────────────────
+# Cache local de la tabla de usuarios del dispositivo
+# ───────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class DeviceUser:
+    """
+    Entrada del índice local: lo necesario para re-escribir al usuario con
+    set_user(...) sin volver a descargar la tabla.
+    """
+    uid: int
+    user_id: str
+    name: str = ""
+    privilege: int = 0
+    password: str = ""
+    group_id: str = ""
+    card: int = 0
 
-        conn.set_user(
-            uid=uid,
-            name=new_name,
-            privilege=privilege,
-            password=pwd,
-            group_id=group_id,
-            user_id=user_id,
-            card=card,
+    @classmethod
+    def from_raw(cls, u) -> "DeviceUser":
+        return cls(
+            uid=int(getattr(u, "uid", 0) or 0),
+            user_id=str(getattr(u, "user_id", "")),
+            name=str(getattr(u, "name", "") or ""),
+            privilege=int(getattr(u, "privilege", 0) or 0),
+            password=str(getattr(u, "password", "") or ""),
+            group_id=str(getattr(u, "group_id", "") or ""),
+            card=_normalize_card(getattr(u, "card", 0)),
         )
 
-        conn.enable_device()
-        conn.disconnect()
-        return True
+    def to_user_record(self) -> UserRecord:
+        return UserRecord(
+            user_id=self.user_id,
+            name=self.name,
+            privilege=self.privilege,
+            card=self.card or "",
+            password=self.password,
+            enabled=True,
+        )
 
-    finally:
-        if conn:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
+    def set_user_args(self) -> dict:
+        return {
+            "uid": self.uid,
+            "name": self.name,
+            "privilege": self.privilege,
+            "password": self.password,
+            "group_id": self.group_id,
+            "user_id": self.user_id,
+            "card": self.card,
+        }
 
 
-def clear_attendance(ip: str, port: int, password: int) -> bool:
+# Máxima edad del índice aunque el fingerprint no cambie (ediciones hechas
+# en el teclado del reloj no alteran los contadores).
+USER_INDEX_MAX_AGE_SEC = 600.0
+
+
+class DeviceUserIndex:
     """
-    Borra logs de asistencia del dispositivo (equivalente a ClearGLog).
+    Tabla de usuarios del dispositivo indexada por user_id.
+
+    fingerprint = contadores de read_sizes() (users, cards, fingers, faces).
+    Si el fingerprint del equipo coincide y el índice no es muy viejo,
+    se reutiliza sin descargar la tabla completa.
+
+    La instancia vive en el cache del módulo y la comparten las sesiones de
+    varios hilos (flota/GUI): toda lectura/escritura va bajo _USER_INDEX_LOCK.
     """
-    conn = None
+
+    def __init__(self, users: Iterable[DeviceUser], fingerprint: tuple):
+        self.by_user_id: dict[str, DeviceUser] = {u.user_id: u for u in users}
+        self.fingerprint = fingerprint
+        self.fetched_at = time.monotonic()
+
+    def __len__(self) -> int:
+        with _USER_INDEX_LOCK:
+            return len(self.by_user_id)
+
+    def get(self, user_id) -> Optional[DeviceUser]:
+        with _USER_INDEX_LOCK:
+            return self.by_user_id.get(str(user_id))
+
+    def users(self) -> list[DeviceUser]:
+        """
+        Copia de las entradas (se puede recorrer mientras otro hilo escribe).
+        """
+        with _USER_INDEX_LOCK:
+            return list(self.by_user_id.values())
+
+    def next_uid(self) -> int:
+        with _USER_INDEX_LOCK:
+            return max((u.uid for u in self.by_user_id.values()), default=0) + 1
+
+    def is_fresh(self, fingerprint: tuple) -> bool:
+        with _USER_INDEX_LOCK:
+            if fingerprint != self.fingerprint:
+                return False
+            return (time.monotonic() - self.fetched_at) <= USER_INDEX_MAX_AGE_SEC
+
+    def set_fingerprint(self, fingerprint: tuple) -> None:
+        with _USER_INDEX_LOCK:
+            self.fingerprint = fingerprint
+
+    def put(self, user: DeviceUser) -> None:
+        with _USER_INDEX_LOCK:
+            self.by_user_id[user.user_id] = user
+
+    def remove(self, user_id) -> Optional[DeviceUser]:
+        with _USER_INDEX_LOCK:
+            return self.by_user_id.pop(str(user_id), None)
+
+
+_USER_INDEX_CACHE: dict[tuple[str, int], DeviceUserIndex] = {}
+_USER_INDEX_LOCK = threading.Lock()
+
+
+def _sizes_fingerprint(conn) -> tuple:
+    return tuple(int(getattr(conn, k, 0) or 0) for k in ("users", "cards", "fingers", "faces"))
+
+
+def _plan_upsert(index: "DeviceUserIndex", rec: dict, next_uid: int) -> tuple[Optional[DeviceUser], dict]:
+    """
+    Resuelve qué escribir para un record de upsert_users (uid existente o nuevo).
+    Regresa (entry, resultado base); entry=None => el resultado ya trae el error.
+    """
+    user_id = str(rec.get("user_id") or "").strip()
+    if not user_id:
+        return None, {"user_id": user_id, "ok": False, "error": "missing_user_id"}
+
+    target = index.get(user_id)
+    if target is not None:
+        action, uid, group_id = "updated", target.uid, target.group_id
+    else:
+        action, uid, group_id = "created", next_uid, ""
+        if uid > _MAX_UID:
+            return None, {"user_id": user_id, "ok": False, "action": action, "error": "device_uid_exhausted"}
+
+    # Normalizaciones
     try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
+        privilege = int(rec.get("privilege") or 0)
+    except Exception:
+        privilege = 0
 
-        # Método típico en librería zk
-        conn.clear_attendance()
+    entry = DeviceUser(
+        uid=uid,
+        user_id=user_id,
+        name=str(rec.get("name") or ""),
+        privilege=privilege,
+        password=str(rec.get("user_password") or ""),
+        group_id=group_id,
+        card=_normalize_card(rec.get("card")),
+    )
+    return entry, {"user_id": user_id, "action": action, "uid": uid}
 
-        conn.enable_device()
-        conn.disconnect()
-        return True
 
+def invalidate_user_index(ip: str, port: int) -> None:
+    """
+    Olvida el índice local de usuarios de un dispositivo (fuerza re-descarga).
+    """
+    with _USER_INDEX_LOCK:
+        _USER_INDEX_CACHE.pop((str(ip), int(port)), None)
+
+
+# ───────────────────────────────────────────────────────────────
+# Métricas por fase (connect / disable / transfer / decode / enable ...)
+# ───────────────────────────────────────────────────────────────
+PHASES = ("connect", "disable", "transfer", "decode", "users", "clear", "enable")
+
+
+@dataclass(frozen=True)
+class PhaseSpan:
+    device: str  # ip:port
+    phase: str
+    elapsed_sec: float
+    nbytes: int = 0
+    records: int = 0
+    ok: bool = True
+
+
+MetricsCallback = Callable[[PhaseSpan], None]
+
+_METRICS_CALLBACK: Optional[MetricsCallback] = None
+
+
+def set_metrics_callback(callback: Optional[MetricsCallback]) -> None:
+    """
+    Callback global que recibe cada PhaseSpan de todas las sesiones
+    (además del metrics= de cada sesión). None lo quita.
+    """
+    global _METRICS_CALLBACK
+    _METRICS_CALLBACK = callback
+
+
+def _emit_span(span: PhaseSpan, spans: list, callback: Optional[MetricsCallback]) -> None:
+    spans.append(span)
+    for cb in (callback, _METRICS_CALLBACK):
+        if cb is None:
+            continue
+        try:
+            cb(span)
+        except Exception:
+            # Las métricas nunca deben tumbar una sincronización
+            pass
+
+
+def _emit_locked(session, started: float) -> None:
+    span = PhaseSpan(f"{session.ip}:{session.port}", "locked", time.perf_counter() - started)
+    _emit_span(span, session.spans, session.metrics)
+
+
+@contextmanager
+def _phase_span(session, phase: str):
+    """
+    Mide una fase de una sesión (sync o async); el bloque puede llenar
+    info["nbytes"] / info["records"].
+    """
+    info = {"nbytes": 0, "records": 0}
+    ok = False
+    started = time.perf_counter()
+    try:
+        yield info
+        ok = True
+    finally:
+        span = PhaseSpan(
+            f"{session.ip}:{session.port}", phase, time.perf_counter() - started,
+            int(info["nbytes"]), int(info["records"]), ok,
+        )
+        _emit_span(span, session.spans, session.metrics)
+
+
+def _timed_decode(session, rows: Iterator[tuple], stats: dict) -> Iterator[tuple]:
+    """
+    Re-emite `rows` sumando solo el tiempo que pasa DENTRO del generador de
+    decodificación; lo que tarda el consumidor entre registros (sink, red)
+    no cuenta como "decode". El span se emite al agotar o cerrar el generador.
+    """
+    elapsed = 0.0
+    ok = False
+    try:
+        while True:
+            started = time.perf_counter()
+            row = next(rows, None)
+            elapsed += time.perf_counter() - started
+            if row is None:
+                break
+            yield row
+        ok = True
     finally:
-        if conn:
+        rows.close()  # cierra el filtro → stats completos
+        records = int(stats.get("total", 0)) - int(stats.get("cursor_skipped", 0))
+        span = PhaseSpan(f"{session.ip}:{session.port}", "decode", elapsed, 0, records, ok)
+        _emit_span(span, session.spans, session.metrics)
+
+
+def summarize_spans(spans: Iterable[PhaseSpan]) -> dict:
+    """
+    Agrega spans por fase. Throughput = registros/bytes transferidos entre
+    el tiempo total de las fases (lo que tardó el reloj de punta a punta).
+    """
+    phases: dict = {}
+    locked = 0.0
+    for sp in spans:
+        if sp.phase == "locked":
+            # Ventana completa con el reloj deshabilitado (traslapa otras fases)
+            locked += sp.elapsed_sec
+            continue
+        p = phases.setdefault(sp.phase, {"sec": 0.0, "bytes": 0, "records": 0, "count": 0})
+        p["sec"] += sp.elapsed_sec
+        p["bytes"] += sp.nbytes
+        p["records"] += sp.records
+        p["count"] += 1
+
+    total = sum(p["sec"] for p in phases.values())
+    transfer = phases.get("transfer", {})
+    nbytes = int(transfer.get("bytes", 0))
+    records = int(transfer.get("records", 0))
+    return {
+        "phases": {k: dict(v, sec=round(v["sec"], 4)) for k, v in phases.items()},
+        "total_sec": round(total, 4),
+        "locked_sec": round(locked, 4),
+        "bytes": nbytes,
+        "records": records,
+        "records_per_sec": round(records / total, 1) if total > 0 else 0.0,
+        "kb_per_sec": round(nbytes / 1024 / total, 1) if total > 0 else 0.0,
+    }
+
+
+def format_timing(timing: dict) -> str:
+    parts = []
+    phases = timing.get("phases") or {}
+    for name in PHASES:
+        p = phases.get(name)
+        if not p:
+            continue
+        extra = f" ({p['bytes'] / 1024:.1f} KB, {p['records']} reg)" if p.get("bytes") else ""
+        parts.append(f"{name} {p['sec']:.2f}s{extra}")
+    if timing.get("locked_sec"):
+        parts.append(f"reloj bloqueado {timing['locked_sec']:.2f}s")
+    return (
+        " | ".join(parts)
+        + f" → {timing.get('records_per_sec', 0):.0f} reg/s, {timing.get('kb_per_sec', 0):.1f} KB/s"
+    )
+
+
+# ───────────────────────────────────────────────────────────────
+# Sesión persistente con el dispositivo
+# ───────────────────────────────────────────────────────────────
+class DeviceSession:
+    """
+    Sesión reutilizable con el checador: un solo connect/handshake para
+    muchas operaciones.
+
+    Política de conexión:
+      - keepalive_sec: si la conexión lleva más de N segundos sin uso, se
+        verifica con un comando barato (read_sizes) antes de reutilizarla.
+      - idle_timeout_sec: si lleva más de N segundos sin uso, se cierra y se
+        abre una nueva (el MB160 suele tirar sesiones TCP ociosas).
+
+    Uso (la conexión se abre en la primera operación):
+        with DeviceSession(ip, port, password) as dev:
+            records = dev.read_attendance()
+            dev.clear_attendance()
+
+    Captura / replay (ver zk_capture):
+      - capture=ruta (o env SIS3_RELOJ_CAPTURE_DIR): graba la sesión en un .zkcap.
+      - replay=ReplayBackend(...): no toca la red; responde desde la captura.
+
+    Métricas: cada fase (connect, disable, transfer, decode, enable, ...) deja
+    un PhaseSpan en self.spans y se manda a metrics= / set_metrics_callback.
+
+    Transporte: transport= (o el perfil guardado por probe_transport) decide
+    TCP/UDP, timeout y chunk; timeout= explícito tiene prioridad. La
+    transferencia del log usa un timeout proporcional a su tamaño.
+
+    Reintentos (retry=True, ver retry.py): errores de red en connect / read /
+    clear / set_user se reintentan con backoff, reconectando; el circuit
+    breaker del reloj hace fallar rápido mientras el equipo está caído.
+
+    NO es thread-safe: una sesión por hilo.
+    """
+
+    def __init__(
+        self,
+        ip: str,
+        port: int,
+        password: int,
+        *,
+        timeout: Optional[int] = None,
+        transport: Optional[TransportProfile] = None,
+        keepalive_sec: float = 30.0,
+        idle_timeout_sec: float = 120.0,
+        ommit_ping: bool = False,
+        capture: Optional[str | Path] = None,
+        replay: Optional[ReplayBackend] = None,
+        metrics: Optional[MetricsCallback] = None,
+        retry: bool = True,
+    ):
+        self.ip = ip
+        self.port = int(port)
+        self.password = password
+        # Replay no toca la red: nada que reintentar
+        self.retry = bool(retry) and replay is None
+        self.breaker = circuit_breaker("reloj", f"{ip}:{int(port)}") if self.retry else None
+        self._retry_active = False
+        if transport is None:
+            transport = TransportProfile() if replay is not None else transport_profile(ip, port)
+        if timeout is not None:
+            transport = replace(transport, timeout=int(timeout))
+        self.transport = transport
+        self.timeout = transport.timeout
+        self.ommit_ping = bool(ommit_ping)
+        self.replay = replay
+        self.capture_path = Path(capture) if capture else (None if replay else _default_capture_path(ip, port))
+        self._capture: Optional[CaptureWriter] = None
+        self.metrics = metrics
+        self.spans: list[PhaseSpan] = []
+        self.keepalive_sec = float(keepalive_sec)
+        self.idle_timeout_sec = float(idle_timeout_sec)
+
+        self._conn = None
+        self._last_used = 0.0
+        self._disable_depth = 0
+        self.connects = 0  # cuántos handshakes se hicieron (diagnóstico)
+
+    # -------------------------
+    # Ciclo de vida
+    # -------------------------
+    def __enter__(self) -> "DeviceSession":
+        # Conexión perezosa: se abre en la primera operación, así los errores
+        # de red salen desde la operación (y los pipelines los reportan por etapa).
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def open(self) -> "DeviceSession":
+        if self._conn is None:
+            if self.retry:
+                # Dentro de _retrying el breaker ya lo lleva la operación externa
+                breaker = None if self._retry_active else self.breaker
+                call_with_retry("connect", self._open_once, retry_on=_ZK_TRANSIENT, breaker=breaker)
+            else:
+                self._open_once()
+        return self
+
+    def _open_once(self) -> None:
+        if self._conn is None:
+            with self._span("connect"):
+                if self.replay is not None:
+                    self._conn = self.replay.connect()
+                else:
+                    conn = _connect(
+                        self.ip, self.port, self.password,
+                        timeout=self.timeout,
+                        force_udp=self.transport.force_udp,
+                        ommit_ping=self.ommit_ping,
+                    )
+                    if self.capture_path is not None:
+                        if self._capture is None:
+                            self._capture = CaptureWriter(self.capture_path)
+                        conn = RecordingConn(conn, self._capture)
+                    self._conn = conn
+            self._disable_depth = 0
+            self.connects += 1
+            self._touch()
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        self._disable_depth = 0
+        if conn is not None:
             try:
                 conn.disconnect()
             except Exception:
                 pass
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
+        if self.replay is not None or self.capture_path is not None:
+            with _USER_INDEX_LOCK:
+                _USER_INDEX_CACHE.pop(self._cache_key(), None)
+
+    def _touch(self) -> None:
+        self._last_used = time.monotonic()
+
+    def _retrying(self, op: str, fn):
+        """
+        Corre fn() con la política `op` (retry.py) y el breaker del reloj.
+        Un error de red invalida la conexión: se cierra y el siguiente intento
+        reconecta. Dentro de una ventana deshabilitada ya abierta no se
+        reintenta (la operación externa es la que reintenta completa).
+        """
+        if not self.retry or self._disable_depth > 0 or self._retry_active:
+            return fn()
+
+        def _attempt():
+            try:
+                return fn()
+            except _ZK_TRANSIENT:
+                self.close()
+                raise
+
+        self._retry_active = True
+        try:
+            return call_with_retry(op, _attempt, retry_on=_ZK_TRANSIENT, breaker=self.breaker)
+        finally:
+            self._retry_active = False
+
+    # -------------------------
+    # Métricas
+    # -------------------------
+    def _span(self, phase: str):
+        return _phase_span(self, phase)
+
+    def timing_since(self, mark: int = 0) -> dict:
+        """
+        Resumen por fase de los spans desde `mark` (= len(self.spans) al inicio
+        de una operación). Ver summarize_spans.
+        """
+        return summarize_spans(self.spans[mark:])
+
+    def _get_conn(self):
+        """
+        Regresa una conexión lista para usar, aplicando la política keep-alive/idle.
+        """
+        if self._conn is not None and self._disable_depth == 0:
+            idle = time.monotonic() - self._last_used
+            if idle > self.idle_timeout_sec:
+                self.close()
+            elif idle > self.keepalive_sec:
+                try:
+                    self._conn.read_sizes()
+                except Exception:
+                    self.close()
+
+        if self._conn is None:
+            self.open()
+
+        self._touch()
+        return self._conn
+
+    @contextmanager
+    def disabled(self):
+        """
+        Ventana con el dispositivo deshabilitado (nadie puede checar).
+        Es anidable: solo la ventana externa hace disable/enable.
+        Dentro solo va I/O con el reloj; decodificar y entregar van afuera.
+        """
+        conn = self._get_conn()
+        outer = self._disable_depth == 0
+        locked_at = time.perf_counter()
+        if outer:
+            with self._span("disable"):
+                conn.disable_device()
+        self._disable_depth += 1
+        try:
+            yield conn
+        finally:
+            self._disable_depth -= 1
+            if self._disable_depth == 0 and self._conn is not None:
+                try:
+                    with self._span("enable"):
+                        self._conn.enable_device()
+                except Exception:
+                    # Si no se pudo re-habilitar, la sesión ya no es confiable
+                    self.close()
+            if outer:
+                _emit_locked(self, locked_at)
+            self._touch()
+
+    # -------------------------
+    # Operaciones
+    # -------------------------
+    def read_attendance(self) -> List[AttendanceRecord]:
+        return list(self.iter_attendance())
+
+    def record_count(self) -> int:
+        """
+        Número de checadas en el log del reloj (read_sizes, sin deshabilitar
+        ni transferir el buffer). Sirve para saltar descargas sin cambios.
+        """
+        def _count() -> int:
+            conn = self._get_conn()
+            conn.read_sizes()
+            self._touch()
+            return int(getattr(conn, "records", 0) or 0)
+
+        return self._retrying("read", _count)
+
+    def _fetch_attlog(self, cursor: Optional[AttlogCursor] = None) -> tuple[bytes, int, Optional[dict], int]:
+        """
+        Descarga el buffer crudo de asistencias dentro de la ventana deshabilitada.
+        Con cursor válido solo transfiere desde la entrada ancla (seq-1) en adelante.
+        Regresa (data, record_size, uid->user_id | None, base).
+        """
+        def _transfer() -> tuple[bytes, int, int]:
+            with self.disabled() as conn:
+                with self._span("transfer") as info:
+                    conn.read_sizes()
+                    records = int(getattr(conn, "records", 0) or 0)
+                    if records <= 0:
+                        return b"", 0, 0
+
+                    first = cursor.seq - 1 if (cursor is not None and 0 < cursor.seq <= records) else 0
+                    with _socket_timeout(conn, self.transport.transfer_timeout(records - first), self.timeout):
+                        if first or self.transport.chunk_size:
+                            data, record_size, base = _read_attlog_from(
+                                conn, first, records, chunk_size=self.transport.chunk_size,
+                            )
+                        else:
+                            data, _size = conn.read_with_buffer(const.CMD_ATTLOG_RRQ)
+                            record_size, base = _attlog_record_size(data, records), 0
+                    info["nbytes"] = len(data)
+                    info["records"] = records - base
+            return data, record_size, base
+
+        data, record_size, base = self._retrying("read", _transfer)
+        if not data:
+            return b"", 0, None, 0
+
+        # Formato viejo (8 bytes) trae uid interno, no user_id. La tabla de
+        # usuarios se lee ya con el reloj habilitado (no bloquea checadas).
+        uid_map = None
+        if record_size == 8:
+            index = self.user_index()
+            uid_map = {u.uid: u.user_id for u in index.users()}
+
+        return data, record_size, uid_map, base
+
+    def _scan_attlog(
+        self,
+        *,
+        since: Optional[datetime],
+        cursor: Optional[AttlogCursor],
+        stats: Optional[dict],
+    ) -> Iterator[tuple]:
+        """
+        Tuplas (user_id, status, punch, ts) posteriores al cursor y a `since`.
+
+        - Cursor válido: se salta el prefijo ya procesado sin decodificarlo.
+        - Cursor inválido (reloj limpiado): lectura completa + filtro por timestamp.
+        """
+        opened = _open_attlog_rows(*self._fetch_attlog(cursor), cursor)
+        if opened is None:
+            opened = _open_attlog_rows(*self._fetch_attlog(None), None)
+        rows, skipped, last = opened
+        stats = stats if stats is not None else {}
+        yield from _timed_decode(self, _filter_attlog_rows(rows, skipped, last, since=since, stats=stats), stats)
+
+    def read_attendance_batch(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        cursor: Optional[AttlogCursor] = None,
+        stats: Optional[dict] = None,
+    ) -> AttendanceBatch:
+        """
+        Igual que iter_attendance pero directo a un AttendanceBatch columnar
+        (sin crear un objeto por checada).
+        """
+        batch = AttendanceBatch()
+        for user_id, status, punch, ts in self._scan_attlog(since=since, cursor=cursor, stats=stats):
+            batch.append_raw(user_id, status, punch, ts)
+        return batch
+
+    def iter_attendance(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        cursor: Optional[AttlogCursor] = None,
+        stats: Optional[dict] = None,
+    ) -> Iterator[AttendanceRecord]:
+        """
+        Generador de asistencias normalizadas.
+
+        - El reloj se deshabilita solo durante la transferencia del buffer crudo;
+          la decodificación ocurre después, registro por registro.
+        - since: filtro incremental en línea (solo timestamp > since).
+        - cursor: posición ya procesada en el log (ver AttlogCursor).
+        - stats (opcional): se llena con total/yielded/filtered al terminar.
+        """
+        for user_id, status, punch, ts in self._scan_attlog(since=since, cursor=cursor, stats=stats):
+            yield AttendanceRecord(user_id=user_id, status=status, punch=punch, timestamp=ts)
+
+    # -------------------------
+    # Índice de usuarios (cache)
+    # -------------------------
+    def _cache_key(self) -> tuple[str, int]:
+        # Con captura/replay el índice es local a la sesión: si no, un cache de
+        # otra sesión se saltaría el get_users y la captura no se podría repetir.
+        if self.replay is not None or self.capture_path is not None:
+            return (f"session:{id(self)}", int(self.port))
+        return (str(self.ip), int(self.port))
+
+    def user_index(self, conn=None, *, refresh: bool = False) -> DeviceUserIndex:
+        """
+        Índice de usuarios del dispositivo. Solo descarga la tabla completa si
+        cambió el fingerprint (read_sizes), si el índice es viejo o si refresh=True.
+        """
+        conn = conn or self._get_conn()
+        conn.read_sizes()
+        fp = _sizes_fingerprint(conn)
+
+        with _USER_INDEX_LOCK:
+            cached = _USER_INDEX_CACHE.get(self._cache_key())
+        if cached is not None and not refresh and cached.is_fresh(fp):
+            return cached
+
+        with self._span("users") as info:
+            raw_users = conn.get_users() or []
+            info["records"] = len(raw_users)
+        index = DeviceUserIndex((DeviceUser.from_raw(u) for u in raw_users), fp)
+        with _USER_INDEX_LOCK:
+            _USER_INDEX_CACHE[self._cache_key()] = index
+        return index
+
+    def _after_user_writes(self, conn, index: DeviceUserIndex) -> None:
+        """
+        Tras escribir (write-through al índice), re-lee los contadores para que
+        el fingerprint refleje nuestras propias escrituras y no invalide el cache.
+        """
+        try:
+            conn.read_sizes()
+            index.set_fingerprint(_sizes_fingerprint(conn))
+        except Exception:
+            invalidate_user_index(self.ip, self.port)
+
+    def get_user(self, user_id: str) -> Optional[DeviceUser]:
+        """
+        Busca un usuario por user_id (hit de diccionario si el índice está vigente).
+        """
+        return self.user_index().get(user_id)
+
+    def read_users(self, *, refresh: bool = False) -> list[UserRecord]:
+        """
+        Lee usuarios del checador.
+        """
+        def _read() -> DeviceUserIndex:
+            with self.disabled() as conn:
+                return self.user_index(conn, refresh=refresh)
+
+        index = self._retrying("read", _read)
+        return [u.to_user_record() for u in index.users()]
+
+    def update_user_name(self, target_user_id: str, new_name: str) -> bool:
+        """
+        Actualiza solo el 'name' de un usuario.
+        """
+        def _update() -> bool:
+            with self.disabled() as conn:
+                index = self.user_index(conn)
+                target = index.get(target_user_id)
+                if not target:
+                    return False
+
+                entry = replace(target, name=str(new_name or ""))
+                conn.set_user(**entry.set_user_args())
+                index.put(entry)
+                self._after_user_writes(conn, index)
+            return True
+
+        return self._retrying("set_user", _update)
+
+    def clear_attendance(self, *, expected_count: Optional[int] = None) -> bool:
+        """
+        Borra logs de asistencia del dispositivo (equivalente a ClearGLog).
+
+        expected_count (read-verify-clear): dentro de la misma ventana
+        deshabilitada se re-lee el contador; si no coincide con lo leído
+        (alguien checó desde entonces) NO se limpia y regresa False.
+        Reintentar es seguro: cada intento vuelve a verificar el contador.
+        Si un intento ya mandó CLEAR_ATTLOG y se perdió la respuesta, el
+        reloj pudo haberse limpiado: en el reintento, contador en 0 = éxito.
+        """
+        clear_sent = False
+
+        def _clear() -> bool:
+            nonlocal clear_sent
+            with self.disabled() as conn, self._span("clear"):
+                if expected_count is not None:
+                    conn.read_sizes()
+                    records = int(getattr(conn, "records", 0) or 0)
+                    if clear_sent and records == 0:
+                        return True
+                    if records != int(expected_count):
+                        return False
+                # Método típico en librería zk
+                clear_sent = True
+                conn.clear_attendance()
+            return True
+
+        return self._retrying("clear", _clear)
+
+    def drain_attendance(
+        self,
+        sink_callback: Callable[[AttendanceBatch], bool],
+        *,
+        since: Optional[datetime] = None,
+        cursor: Optional[AttlogCursor] = None,
+        expected_count: Optional[int] = None,
+        max_rounds: int = 3,
+    ) -> dict:
+        """
+        Lee → entrega → limpia, en esta misma sesión, sin borrar nada que no se leyó.
+
+        - sink_callback(batch) -> True si el destino confirmó la entrega.
+        - Antes de limpiar se verifica el contador (clear_attendance(expected_count)).
+          Si llegaron checadas, se lee SOLO la cola (cursor, lectura por offset),
+          se entrega y se vuelve a intentar; nunca se re-descarga el log completo.
+        - expected_count + cursor: lo leído hasta ahí ya se entregó (el pipeline
+          hizo la primera ronda); se empieza directo en verificar/limpiar.
+        - max_rounds: lecturas de cola antes de rendirse (reloj muy activo);
+          entonces no se limpia y se regresa cleared=False con el cursor.
+
+        Regresa {"ok", "cleared", "delivered", "rounds", "total", "cursor", "max_ts"}
+        o {"ok": False, "stage": "read"|"sink"|"clear", "error", ...}.
+        """
+        total = expected_count
+        delivered = 0
+        rounds = 0
+        max_ts: Optional[datetime] = None
+        need_read = total is None
+
+        def _result(**extra) -> dict:
+            return {
+                "delivered": delivered,
+                "rounds": rounds,
+                "total": total,
+                "cursor": cursor,
+                "max_ts": max_ts,
+                **extra,
+            }
+
+        while True:
+            if need_read:
+                stats: dict = {}
+                try:
+                    batch = self.read_attendance_batch(since=since, cursor=cursor, stats=stats)
+                except Exception as e:
+                    return _result(ok=False, stage="read", error=str(e))
+                rounds += 1
+                if len(batch):
+                    try:
+                        confirmed = bool(sink_callback(batch))
+                    except Exception as e:
+                        return _result(ok=False, stage="sink", error=str(e))
+                    if not confirmed:
+                        return _result(ok=False, stage="sink", error="sink_not_confirmed")
+                    delivered += len(batch)
+                    batch_ts = batch.max_ts()
+                    if batch_ts and (max_ts is None or batch_ts > max_ts):
+                        max_ts = batch_ts
+                # Solo después de entregar: si algo falla, cursor/total siguen
+                # apuntando a lo último confirmado
+                cursor = stats.get("cursor")
+                total = int(stats.get("total", 0))
+
+            if not total:
+                return _result(ok=True, cleared=False)
+
+            try:
+                if self.clear_attendance(expected_count=total):
+                    cursor = None
+                    return _result(ok=True, cleared=True)
+            except Exception as e:
+                return _result(ok=False, stage="clear", error=str(e))
+
+            if rounds >= max_rounds:
+                return _result(ok=True, cleared=False)
+            need_read = True
+
+    def upsert_user(
+        self,
+        *,
+        user_id: str,
+        name: str,
+        privilege: int = 0,
+        user_password: str = "",
+        card: int | str = 0,
+        enabled: bool = True,
+    ) -> bool:
+        """
+        Crea o actualiza un usuario en el dispositivo.
+        Se basa en set_user(...) buscando si ya existe para reutilizar uid/group_id.
+        """
+        res = self.upsert_users([{
+            "user_id": user_id,
+            "name": name,
+            "privilege": privilege,
+            "user_password": user_password,
+            "card": card,
+            "enabled": enabled,
+        }])[0]
+        if not res.get("ok"):
+            raise RuntimeError(res.get("error") or "set_user falló")
+        return True
+
+    def upsert_users(self, records: Iterable[dict]) -> list[dict]:
+        """
+        Crea/actualiza muchos usuarios en una sola ventana deshabilitada.
+
+        - Descarga la tabla de usuarios UNA vez e indexa por user_id.
+        - Los uid nuevos se asignan localmente (max(uid) + 1, ...).
+        - Cada record es un dict con las llaves de upsert_user
+          (user_id, name, privilege, user_password, card, enabled).
+
+        Regresa un resultado por record, en el mismo orden:
+          {"user_id", "ok", "action": "created"|"updated", "uid", "error"?}
+        """
+        records = list(records)  # un reintento recorre el lote otra vez
+
+        def _upsert() -> list[dict]:
+            results: list[dict] = []
+
+            with self.disabled() as conn:
+                index = self.user_index(conn)
+                next_uid = index.next_uid()
+                wrote = False
+
+                for rec in records:
+                    entry, res = _plan_upsert(index, rec, next_uid)
+                    if entry is None:
+                        results.append(res)
+                        continue
+                    if res["action"] == "created":
+                        next_uid += 1
+
+                    wrote = True
+                    try:
+                        conn.set_user(**entry.set_user_args())
+                    except _ZK_TRANSIENT:
+                        # Se cayó la conexión: reintenta el lote completo (set_user es idempotente)
+                        raise
+                    except Exception as e:
+                        results.append({**res, "ok": False, "error": str(e)})
+                        continue
+
+                    # Nota: enabled no siempre se aplica por set_user en todas las variantes.
+                    # Si tu SDK soporta enable/disable por otro método, lo añadimos después.
+
+                    # Write-through: el índice refleja lo escrito (y sirve si el lote repite user_id)
+                    index.put(entry)
+                    results.append({**res, "ok": True})
+
+                if wrote:
+                    self._after_user_writes(conn, index)
+
+            return results
+
+        return self._retrying("set_user", _upsert)
+
+    def delete_user(self, *, user_id: str) -> bool:
+        """
+        Elimina un usuario en el dispositivo.
+        Intentamos por uid (más común). Si no se puede, intentamos por user_id.
+        """
+        return bool(self.delete_users([user_id])[0].get("ok"))
+
+    def delete_users(self, user_ids: Iterable[str]) -> list[dict]:
+        """
+        Elimina muchos usuarios con una sola descarga de la tabla y una sola
+        ventana deshabilitada. Idempotente: si ya no existe, cuenta como OK.
+
+        Regresa un resultado por id: {"user_id", "ok", "action": "deleted"|"missing", "uid"?, "error"?}
+        """
+        user_ids = list(user_ids)  # un reintento recorre el lote otra vez
+
+        def _delete() -> list[dict]:
+            results: list[dict] = []
+
+            with self.disabled() as conn:
+                index = self.user_index(conn)
+                wrote = False
+
+                for raw_id in user_ids:
+                    user_id = str(raw_id or "").strip()
+                    target = index.get(user_id)
+                    if target is None:
+                        # Ya no existe; lo consideramos OK (idempotente)
+                        results.append({"user_id": user_id, "ok": True, "action": "missing"})
+                        continue
+
+                    uid = target.uid
+                    wrote = True
+
+                    # Algunas versiones:
+                    # - delete_user(uid=...)
+                    # - delete_user(user_id=...)
+                    deleted = False
+                    error = None
+                    try:
+                        if uid is not None:
+                            conn.delete_user(uid=uid)
+                            deleted = True
+                    except _ZK_TRANSIENT:
+                        raise
+                    except Exception as e:
+                        error = str(e)
+
+                    if not deleted:
+                        try:
+                            conn.delete_user(user_id=user_id)
+                            deleted = True
+                        except _ZK_TRANSIENT:
+                            raise
+                        except Exception as e:
+                            error = str(e)
+
+                    res = {"user_id": user_id, "ok": deleted, "action": "deleted", "uid": uid}
+                    if deleted:
+                        index.remove(user_id)
+                    else:
+                        res["error"] = error or "delete_user falló"
+                    results.append(res)
+
+                if wrote:
+                    self._after_user_writes(conn, index)
+
+            return results
+
+        return self._retrying("set_user", _delete)
+
+
+@contextmanager
+def session_scope(ip: str, port: int, password: int, session: Optional[DeviceSession] = None):
+    """
+    Reutiliza `session` si viene; si no, abre una sesión propia y la cierra al salir.
+    Permite que los pipelines compartan conexión cuando el runner la provee.
+    """
+    if session is not None:
+        yield session
+        return
+    with DeviceSession(ip, port, password) as dev:
+        yield dev
+
+
+# ───────────────────────────────────────────────────────────────
+# API compatible (una conexión por llamada)
+# ───────────────────────────────────────────────────────────────
+def read_attendance(ip: str, port: int, password: int) -> List[AttendanceRecord]:
+    with DeviceSession(ip, port, password) as dev:
+        return dev.read_attendance()
+
+
+def iter_attendance(
+    ip: str,
+    port: int,
+    password: int,
+    *,
+    since: Optional[datetime] = None,
+    cursor: Optional[AttlogCursor] = None,
+    stats: Optional[dict] = None,
+) -> Iterator[AttendanceRecord]:
+    """
+    Versión streaming de read_attendance (ver DeviceSession.iter_attendance).
+    La conexión se cierra al agotar (o cerrar) el generador.
+    """
+    with DeviceSession(ip, port, password) as dev:
+        yield from dev.iter_attendance(since=since, cursor=cursor, stats=stats)
+
+
+def read_users(ip: str, port: int, password: int, *, refresh: bool = False) -> list[UserRecord]:
+    """
+    Lee usuarios del checador.
+    """
+    with DeviceSession(ip, port, password) as dev:
+        return dev.read_users(refresh=refresh)
+
+
+def update_user_name(ip: str, port: int, password: int, target_user_id: str, new_name: str) -> bool:
+    """
+    Actualiza solo el 'name' de un usuario.
+    """
+    with DeviceSession(ip, port, password) as dev:
+        return dev.update_user_name(target_user_id, new_name)
+
+
+def clear_attendance(ip: str, port: int, password: int) -> bool:
+    """
+    Borra logs de asistencia del dispositivo (equivalente a ClearGLog).
+    """
+    with DeviceSession(ip, port, password) as dev:
+        return dev.clear_attendance()
 
 
 def upsert_user(
@@ -217,59 +1688,24 @@ def upsert_user(
     Crea o actualiza un usuario en el dispositivo.
     Se basa en set_user(...) buscando si ya existe para reutilizar uid/group_id.
     """
-    conn = None
-    try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
-
-        raw_users = conn.get_users() or []
-        target = None
-        for u in raw_users:
-            if str(getattr(u, "user_id", "")) == str(user_id):
-                target = u
-                break
-
-        uid: Optional[int] = getattr(target, "uid", None) if target else None
-        group_id = getattr(target, "group_id", "") if target else ""
-
-        # Normalizaciones
-        try:
-            privilege = int(privilege)
-        except Exception:
-            privilege = 0
-
-        if card in (None, ""):
-            card_val = 0
-        else:
-            try:
-                card_val = int(card)
-            except Exception:
-                # Si llega como string no-numérico, lo dejamos en 0 para no romper
-                card_val = 0
-
-        conn.set_user(
-            uid=uid,
-            name=str(name or ""),
+    with DeviceSession(ip, port, password) as dev:
+        return dev.upsert_user(
+            user_id=user_id,
+            name=name,
             privilege=privilege,
-            password=str(user_password or ""),
-            group_id=group_id,
-            user_id=str(user_id),
-            card=card_val,
+            user_password=user_password,
+            card=card,
+            enabled=enabled,
         )
 
-        # Nota: enabled no siempre se aplica por set_user en todas las variantes.
-        # Si tu SDK soporta enable/disable por otro método, lo añadimos después.
-
-        conn.enable_device()
-        conn.disconnect()
-        return True
 
-    finally:
-        if conn:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
+def upsert_users(ip: str, port: int, password: int, records: Iterable[dict]) -> list[dict]:
+    """
+    Crea/actualiza un lote de usuarios con una sola descarga de la tabla.
+    Ver DeviceSession.upsert_users.
+    """
+    with DeviceSession(ip, port, password) as dev:
+        return dev.upsert_users(records)
 
 
 def delete_user(ip: str, port: int, password: int, *, user_id: str) -> bool:
@@ -277,51 +1713,353 @@ def delete_user(ip: str, port: int, password: int, *, user_id: str) -> bool:
     Elimina un usuario en el dispositivo.
     Intentamos por uid (más común). Si no se puede, intentamos por user_id.
     """
-    conn = None
-    try:
-        conn = _connect(ip, port, password)
-        conn.disable_device()
-
-        raw_users = conn.get_users() or []
-        target = None
-        for u in raw_users:
-            if str(getattr(u, "user_id", "")) == str(user_id):
-                target = u
-                break
+    with DeviceSession(ip, port, password) as dev:
+        return dev.delete_user(user_id=user_id)
 
-        if not target:
-            # Ya no existe; lo consideramos OK (idempotente)
-            conn.enable_device()
-            conn.disconnect()
-            return True
 
-        uid = getattr(target, "uid", None)
+def delete_users(ip: str, port: int, password: int, user_ids: Iterable[str]) -> list[dict]:
+    """
+    Elimina un lote de usuarios con una sola descarga de la tabla.
+    Ver DeviceSession.delete_users.
+    """
+    with DeviceSession(ip, port, password) as dev:
+        return dev.delete_users(user_ids)
+
+
+# ───────────────────────────────────────────────────────────────
+# Variante asyncio (zk_async): mismo índice, decodificadores y resultados
+#   Pensada para barrer muchos relojes desde un solo event loop
+#   (asyncio.gather / Semaphore) sin un hilo por equipo.
+# ───────────────────────────────────────────────────────────────
+class AsyncDeviceSession:
+    """
+    Sesión asyncio sobre zk_async.AsyncZK: SOLO transporte / operaciones
+    básicas del reloj. No es un reemplazo completo de DeviceSession:
+
+      - tiene: record_count, read_attendance[_batch] (since/cursor),
+        clear_attendance(expected_count), read_users, upsert_users, delete_users.
+      - NO tiene: iter_attendance, drain_attendance, update_user_name,
+        upsert_user/delete_user/get_user, reintentos ni breaker.
+      - Ni los runners de la GUI ni fleet.py la usan todavía (siguen con un
+        hilo por reloj y DeviceSession); es la base para un driver asyncio.
+
+        async with AsyncDeviceSession(ip, port, password) as dev:
+            batch = await dev.read_attendance_batch(since=ts)
+            await dev.clear_attendance()
 
-        # Algunas versiones:
-        # - delete_user(uid=...)
-        # - delete_user(user_id=...)
-        deleted = False
+    Conecta de forma perezosa y reconecta si la conexión se cayó.
+    Métricas por fase igual que DeviceSession (spans / metrics=).
+    Del perfil de transporte usa timeout y kb_per_sec (siempre TCP).
+    """
+
+    def __init__(
+        self,
+        ip: str,
+        port: int,
+        password: int,
+        *,
+        timeout: Optional[int] = None,
+        transport: Optional[TransportProfile] = None,
+        metrics: Optional[MetricsCallback] = None,
+    ):
+        self.ip = ip
+        self.port = int(port)
+        self.password = password
+        transport = transport or transport_profile(ip, port)
+        if timeout is not None:
+            transport = replace(transport, timeout=int(timeout))
+        self.transport = transport
+        self.timeout = transport.timeout
+        self.metrics = metrics
+        self.spans: list[PhaseSpan] = []
+
+        self._conn: Optional[AsyncZK] = None
+        self._disable_depth = 0
+        self.connects = 0
+
+    async def __aenter__(self) -> "AsyncDeviceSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    async def open(self) -> "AsyncDeviceSession":
+        if self._conn is None:
+            with self._span("connect"):
+                conn = AsyncZK(self.ip, self.port, password=self.password, timeout=self.timeout)
+                await conn.connect()
+            self._conn = conn
+            self.connects += 1
+        return self
+
+    def _span(self, phase: str):
+        return _phase_span(self, phase)
+
+    def timing_since(self, mark: int = 0) -> dict:
+        return summarize_spans(self.spans[mark:])
+
+    async def close(self) -> None:
+        conn, self._conn = self._conn, None
+        self._disable_depth = 0
+        if conn is None:
+            return
         try:
-            if uid is not None:
-                conn.delete_user(uid=uid)
-                deleted = True
+            await conn.disconnect()
         except Exception:
-            deleted = False
+            pass
 
-        if not deleted:
-            try:
-                conn.delete_user(user_id=str(user_id))
-                deleted = True
-            except Exception:
-                deleted = False
+    async def _get_conn(self) -> AsyncZK:
+        if self._conn is not None and not self._conn.is_connect:
+            await self.close()
+        await self.open()
+        return self._conn
 
-        conn.enable_device()
-        conn.disconnect()
-        return deleted
+    @asynccontextmanager
+    async def disabled(self):
+        """
+        Igual que DeviceSession.disabled(): anidable, siempre re-habilita.
+        """
+        conn = await self._get_conn()
+        outer = self._disable_depth == 0
+        locked_at = time.perf_counter()
+        if outer:
+            with self._span("disable"):
+                await conn.disable_device()
+        self._disable_depth += 1
+        try:
+            yield conn
+        finally:
+            self._disable_depth -= 1
+            if outer:
+                try:
+                    with self._span("enable"):
+                        await conn.enable_device()
+                except Exception:
+                    await self.close()
+                _emit_locked(self, locked_at)
 
-    finally:
-        if conn:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
+    # -------------------------
+    # Asistencias
+    # -------------------------
+    async def record_count(self) -> int:
+        conn = await self._get_conn()
+        await conn.read_sizes()
+        return int(conn.records or 0)
+
+    async def _fetch_attlog(self, cursor: Optional[AttlogCursor] = None) -> tuple[bytes, int, Optional[dict], int]:
+        async with self.disabled() as conn:
+            with self._span("transfer") as info:
+                await conn.read_sizes()
+                records = int(conn.records or 0)
+                if records <= 0:
+                    return b"", 0, None, 0
+
+                first = cursor.seq - 1 if (cursor is not None and 0 < cursor.seq <= records) else 0
+                conn.timeout = self.transport.transfer_timeout(records - first)
+                try:
+                    size, inline = await conn.prepare_buffer(const.CMD_ATTLOG_RRQ)
+                    if inline:
+                        data, record_size, base = _slice_attlog(inline, _attlog_record_size(inline, records), first)
+                    else:
+                        record_size = (size - 4) // records
+                        start = 4 + first * record_size if (first > 0 and record_size) else 0
+                        data = await conn.read_buffer_range(size, start)
+                        base = first if start else 0
+                        if base:
+                            data = pack("<I", len(data)) + data
+                finally:
+                    conn.timeout = float(self.timeout)
+                info["nbytes"] = len(data)
+                info["records"] = records - base
+
+        uid_map = None
+        if record_size == 8:
+            index = await self.user_index()
+            uid_map = {u.uid: u.user_id for u in index.users()}
+
+        return data, record_size, uid_map, base
+
+    async def _scan_attlog(
+        self,
+        *,
+        since: Optional[datetime],
+        cursor: Optional[AttlogCursor],
+        stats: Optional[dict],
+    ) -> Iterator[tuple]:
+        opened = _open_attlog_rows(*await self._fetch_attlog(cursor), cursor)
+        if opened is None:
+            opened = _open_attlog_rows(*await self._fetch_attlog(None), None)
+        rows, skipped, last = opened
+        # La transferencia ya terminó; la decodificación es CPU pura (generador síncrono)
+        return _filter_attlog_rows(rows, skipped, last, since=since, stats=stats)
+
+    async def read_attendance_batch(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        cursor: Optional[AttlogCursor] = None,
+        stats: Optional[dict] = None,
+    ) -> AttendanceBatch:
+        stats = stats if stats is not None else {}
+        rows = await self._scan_attlog(since=since, cursor=cursor, stats=stats)
+        batch = AttendanceBatch()
+        with self._span("decode") as info:
+            for user_id, status, punch, ts in rows:
+                batch.append_raw(user_id, status, punch, ts)
+            info["records"] = int(stats.get("total", 0)) - int(stats.get("cursor_skipped", 0))
+        return batch
+
+    async def read_attendance(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        cursor: Optional[AttlogCursor] = None,
+        stats: Optional[dict] = None,
+    ) -> List[AttendanceRecord]:
+        stats = stats if stats is not None else {}
+        rows = await self._scan_attlog(since=since, cursor=cursor, stats=stats)
+        with self._span("decode") as info:
+            out = [AttendanceRecord(user_id=u, status=st, punch=p, timestamp=ts) for u, st, p, ts in rows]
+            info["records"] = int(stats.get("total", 0)) - int(stats.get("cursor_skipped", 0))
+        return out
+
+    async def clear_attendance(self, *, expected_count: Optional[int] = None) -> bool:
+        async with self.disabled() as conn:
+            with self._span("clear"):
+                if expected_count is not None:
+                    await conn.read_sizes()
+                    if int(conn.records or 0) != int(expected_count):
+                        return False
+                await conn.clear_attendance()
+        return True
+
+    # -------------------------
+    # Usuarios (comparte el cache de DeviceSession)
+    # -------------------------
+    async def user_index(self, conn: Optional[AsyncZK] = None, *, refresh: bool = False) -> DeviceUserIndex:
+        conn = conn or await self._get_conn()
+        await conn.read_sizes()
+        fp = _sizes_fingerprint(conn)
+
+        key = (str(self.ip), int(self.port))
+        with _USER_INDEX_LOCK:
+            cached = _USER_INDEX_CACHE.get(key)
+        if cached is not None and not refresh and cached.is_fresh(fp):
+            return cached
+
+        with self._span("users") as info:
+            raw_users = await conn.get_users()
+            info["records"] = len(raw_users)
+        index = DeviceUserIndex((DeviceUser.from_raw(u) for u in raw_users), fp)
+        with _USER_INDEX_LOCK:
+            _USER_INDEX_CACHE[key] = index
+        return index
+
+    async def _after_user_writes(self, conn: AsyncZK, index: DeviceUserIndex) -> None:
+        try:
+            await conn.read_sizes()
+            index.set_fingerprint(_sizes_fingerprint(conn))
+        except Exception:
+            invalidate_user_index(self.ip, self.port)
+
+    async def read_users(self, *, refresh: bool = False) -> list[UserRecord]:
+        async with self.disabled() as conn:
+            index = await self.user_index(conn, refresh=refresh)
+        return [u.to_user_record() for u in index.users()]
+
+    async def upsert_users(self, records: Iterable[dict]) -> list[dict]:
+        """
+        Igual que DeviceSession.upsert_users (mismos resultados por record).
+        """
+        results: list[dict] = []
+        async with self.disabled() as conn:
+            index = await self.user_index(conn)
+            next_uid = index.next_uid()
+            wrote = False
+
+            for rec in records:
+                entry, res = _plan_upsert(index, rec, next_uid)
+                if entry is None:
+                    results.append(res)
+                    continue
+                if res["action"] == "created":
+                    next_uid += 1
+
+                wrote = True
+                try:
+                    await conn.set_user(**entry.set_user_args())
+                except Exception as e:
+                    results.append({**res, "ok": False, "error": str(e)})
+                    continue
+                index.put(entry)
+                results.append({**res, "ok": True})
+
+            if wrote:
+                await self._after_user_writes(conn, index)
+        return results
+
+    async def delete_users(self, user_ids: Iterable[str]) -> list[dict]:
+        """
+        Igual que DeviceSession.delete_users (idempotente: "missing" cuenta como OK).
+        """
+        results: list[dict] = []
+        async with self.disabled() as conn:
+            index = await self.user_index(conn)
+            wrote = False
+
+            for raw_id in user_ids:
+                user_id = str(raw_id or "").strip()
+                target = index.get(user_id)
+                if target is None:
+                    results.append({"user_id": user_id, "ok": True, "action": "missing"})
+                    continue
+
+                wrote = True
+                try:
+                    await conn.delete_user(target.uid)
+                except Exception as e:
+                    results.append({"user_id": user_id, "ok": False, "action": "deleted", "uid": target.uid, "error": str(e)})
+                    continue
+                index.remove(user_id)
+                results.append({"user_id": user_id, "ok": True, "action": "deleted", "uid": target.uid})
+
+            if wrote:
+                await self._after_user_writes(conn, index)
+        return results
+
+
+async def read_attendance_async(
+    ip: str,
+    port: int,
+    password: int,
+    *,
+    since: Optional[datetime] = None,
+    cursor: Optional[AttlogCursor] = None,
+    stats: Optional[dict] = None,
+) -> List[AttendanceRecord]:
+    async with AsyncDeviceSession(ip, port, password) as dev:
+        return await dev.read_attendance(since=since, cursor=cursor, stats=stats)
+
+
+async def read_users_async(ip: str, port: int, password: int, *, refresh: bool = False) -> list[UserRecord]:
+    async with AsyncDeviceSession(ip, port, password) as dev:
+        return await dev.read_users(refresh=refresh)
+
+
+async def clear_attendance_async(ip: str, port: int, password: int) -> bool:
+    async with AsyncDeviceSession(ip, port, password) as dev:
+        return await dev.clear_attendance()
+
+
+async def upsert_users_async(ip: str, port: int, password: int, records: Iterable[dict]) -> list[dict]:
+    async with AsyncDeviceSession(ip, port, password) as dev:
+        return await dev.upsert_users(records)
+
+
+async def delete_users_async(ip: str, port: int, password: int, user_ids: Iterable[str]) -> list[dict]:
+    async with AsyncDeviceSession(ip, port, password) as dev:
+        return await dev.delete_users(user_ids)
@@ -0,0 +1,361 @@
+# sis3_reloj/zk_simulator.py
+"""
+Simulador local de un reloj ZKTeco (TCP) para pruebas y benchmarks sin equipo físico.
+
+Implementa el subconjunto del protocolo que usan pyzk y zk_async:
+connect/auth, exit, disable/enable, read_sizes, buffer (1503/1504/free),
+usuarios (USERTEMP_RRQ, USER_WRQ, DELETE_USER), ATTLOG_RRQ, CLEAR_ATTLOG, REFRESHDATA.
+
+  python -m sis3_reloj.zk_simulator --port 4370 --users 300 --records 50000 \\
+      --latency-ms 5 --loss 0.01 --bandwidth-kbps 800
+
+Fallas inyectables:
+  - latency_ms: retardo por respuesta (RTT de la red/equipo).
+  - loss: probabilidad de "perder" un segmento; en TCP se ve como retransmisión,
+    o sea un retardo extra de rto_ms (no se corrompe el stream).
+  - drop: probabilidad de cortar la conexión al recibir un comando.
+  - bandwidth_kbps / chunk_delay_ms: transferencia lenta de chunks del buffer.
+
+Nota: pyzk hace ping (ICMP) antes de conectar salvo ommit_ping=True.
+zk_client lo omite solo para loopback, así que la GUI y los pipelines
+funcionan tal cual con ip = 127.0.0.1 en config.ini.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from struct import pack, unpack
+from typing import Optional
+
+from zk import const
+from zk.base import make_commkey
+
+from .zk_async import CMD_PREPARE_BUFFER, CMD_READ_BUFFER, build_packet, read_packet
+
+
+# ───────────────────────────────────────────────────────────────
+# Estado del equipo simulado
+# ───────────────────────────────────────────────────────────────
+@dataclass
+class SimUser:
+    uid: int
+    user_id: str
+    name: str = ""
+    privilege: int = 0
+    password: str = ""
+    group_id: str = ""
+    card: int = 0
+
+    def pack(self) -> bytes:
+        return pack(
+            "<HB8s24sIx7sx24s",
+            self.uid, self.privilege, self.password.encode()[:8], self.name.encode()[:24],
+            self.card, self.group_id.encode()[:7], self.user_id.encode()[:24],
+        )
+
+
+def _encode_zk_time(t: datetime) -> int:
+    return (
+        ((t.year % 100) * 12 * 31 + ((t.month - 1) * 31) + t.day - 1) * (24 * 60 * 60)
+        + (t.hour * 60 + t.minute) * 60 + t.second
+    )
+
+
+@dataclass
+class SimDevice:
+    """
+    Memoria del reloj: usuarios por uid y log de checadas (formato 40 bytes).
+    Thread-safe (lo usan el server y los tests/benchmarks desde otros hilos).
+    """
+    password: int = 0
+    users: dict = field(default_factory=dict)  # uid -> SimUser
+    attlog: list = field(default_factory=list)  # bytes de 40 por registro
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_user(self, user: SimUser) -> None:
+        with self.lock:
+            self.users[user.uid] = user
+
+    def add_punch(self, user_id: str, ts: datetime, *, status: int = 1, punch: int = 0) -> None:
+        uid = next((u.uid for u in self.users.values() if u.user_id == user_id), 0)
+        rec = pack("<H24sB4sB8s", uid, user_id.encode()[:24], status, pack("<I", _encode_zk_time(ts)), punch, b"")
+        with self.lock:
+            self.attlog.append(rec)
+
+    def seed(self, *, users: int, records: int, start: Optional[datetime] = None, seed: int = 1) -> None:
+        rnd = random.Random(seed)
+        for i in range(1, users + 1):
+            self.add_user(SimUser(uid=i, user_id=str(i), name=f"Empleado {i}"))
+        t = start or datetime(2025, 1, 6, 7, 0, 0)
+        for _ in range(records):
+            t += timedelta(seconds=rnd.randint(5, 120))
+            self.add_punch(str(rnd.randint(1, max(1, users))), t, punch=rnd.choice((0, 1)))
+
+    def sizes_payload(self) -> bytes:
+        with self.lock:
+            fields = [0] * 20
+            fields[4] = len(self.users)
+            fields[8] = len(self.attlog)
+            fields[15] = 3000      # users_cap
+            fields[16] = 100000    # rec_cap
+            fields[18] = 3000 - len(self.users)
+            fields[19] = 100000 - len(self.attlog)
+        return pack("20i", *fields) + pack("3i", 0, 0, 0)
+
+    def buffer_for(self, command: int, fct: int) -> bytes:
+        with self.lock:
+            if command == const.CMD_ATTLOG_RRQ:
+                body = b"".join(self.attlog)
+            elif command == const.CMD_USERTEMP_RRQ and fct == const.FCT_USER:
+                body = b"".join(u.pack() for u in sorted(self.users.values(), key=lambda u: u.uid))
+            else:
+                body = b""
+        return pack("<I", len(body)) + body
+
+
+# ───────────────────────────────────────────────────────────────
+# Servidor
+# ───────────────────────────────────────────────────────────────
+@dataclass
+class SimOptions:
+    latency_ms: float = 0.0
+    loss: float = 0.0
+    rto_ms: float = 200.0
+    drop: float = 0.0
+    bandwidth_kbps: float = 0.0   # 0 = sin límite
+    chunk_delay_ms: float = 0.0
+    seed: Optional[int] = None
+
+
+class ZKSimulator:
+    """
+    Servidor asyncio. Cada conexión tiene su propia sesión y buffer preparado.
+
+        sim = ZKSimulator(device, options)
+        port = sim.start_in_thread()    # o: await sim.serve(host, port)
+        ...
+        sim.stop()
+    """
+
+    def __init__(self, device: SimDevice, options: Optional[SimOptions] = None):
+        self.device = device
+        self.options = options or SimOptions()
+        self._rnd = random.Random(self.options.seed)
+        self._next_session = 1
+        self.stats = {"connections": 0, "commands": 0, "bytes_out": 0, "drops": 0, "losses": 0}
+
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Ciclo de vida
+    # -------------------------
+    async def serve(self, host: str = "127.0.0.1", port: int = 4370) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Arranca en un hilo daemon (útil para benchmarks con el cliente síncrono).
+        Regresa el puerto real (port=0 => puerto libre).
+        """
+        ready = threading.Event()
+        box: dict = {}
+
+        def _run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            box["port"] = self._loop.run_until_complete(self.serve(host, port))
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name="zk-simulator", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return box["port"]
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+
+        async def _close():
+            if self._server is not None:
+                self._server.close()
+                await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop = None
+
+    # -------------------------
+    # Red simulada
+    # -------------------------
+    async def _delay(self) -> None:
+        d = self.options.latency_ms
+        if self.options.loss and self._rnd.random() < self.options.loss:
+            self.stats["losses"] += 1
+            d += self.options.rto_ms
+        if d > 0:
+            await asyncio.sleep(d / 1000.0)
+
+    async def _send(self, writer, command: int, data: bytes, session_id: int, reply_id: int) -> None:
+        pkt = build_packet(command, data, session_id, reply_id)
+        bw = self.options.bandwidth_kbps
+        if bw > 0 and command == const.CMD_DATA and len(pkt) > 1024:
+            # Transferencia lenta: segmentos de 1 KB al ritmo configurado
+            step = 1024
+            for i in range(0, len(pkt), step):
+                writer.write(pkt[i:i + step])
+                await writer.drain()
+                await asyncio.sleep(step * 8 / (bw * 1000.0))
+        else:
+            writer.write(pkt)
+            await writer.drain()
+        self.stats["bytes_out"] += len(pkt)
+
+    # -------------------------
+    # Protocolo
+    # -------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        session_id = 0
+        authed = False
+        buffer = b""
+        dev = self.device
+        try:
+            while True:
+                try:
+                    command, _sess, reply_id, data = await read_packet(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return  # el cliente cerró (pyzk abre/cierra un socket para test_tcp)
+
+                self.stats["commands"] += 1
+                if self.options.drop and self._rnd.random() < self.options.drop:
+                    self.stats["drops"] += 1
+                    return
+
+                await self._delay()
+
+                def reply(code: int, payload: bytes = b""):
+                    return self._send(writer, code, payload, session_id, reply_id)
+
+                if command == const.CMD_CONNECT:
+                    session_id = self._next_session
+                    self._next_session = (self._next_session % 0xFFFE) + 1
+                    authed = not dev.password
+                    await reply(const.CMD_ACK_OK if authed else const.CMD_ACK_UNAUTH)
+                    continue
+
+                if command == const.CMD_AUTH:
+                    authed = data == make_commkey(dev.password, session_id)
+                    await reply(const.CMD_ACK_OK if authed else const.CMD_ACK_UNAUTH)
+                    continue
+
+                if not authed:
+                    await reply(const.CMD_ACK_UNAUTH)
+                    continue
+
+                if command == const.CMD_EXIT:
+                    await reply(const.CMD_ACK_OK)
+                    return
+
+                if command in (const.CMD_DISABLEDEVICE, const.CMD_ENABLEDEVICE, const.CMD_REFRESHDATA):
+                    await reply(const.CMD_ACK_OK)
+
+                elif command == const.CMD_GET_FREE_SIZES:
+                    await reply(const.CMD_ACK_OK, dev.sizes_payload())
+
+                elif command == CMD_PREPARE_BUFFER:
+                    _one, cmd, fct, _ext = unpack("<bhii", data[:11])
+                    buffer = dev.buffer_for(cmd, fct)
+                    await reply(const.CMD_ACK_OK, b"\x00" + pack("<I", len(buffer)) + b"\x00" * 4)
+
+                elif command == CMD_READ_BUFFER:
+                    start, size = unpack("<ii", data[:8])
+                    chunk = buffer[start:start + size]
+                    await reply(const.CMD_PREPARE_DATA, pack("<II", len(chunk), 0))
+                    if self.options.chunk_delay_ms:
+                        await asyncio.sleep(self.options.chunk_delay_ms / 1000.0)
+                    await reply(const.CMD_DATA, chunk)
+                    await reply(const.CMD_ACK_OK)
+
+                elif command == const.CMD_FREE_DATA:
+                    buffer = b""
+                    await reply(const.CMD_ACK_OK)
+
+                elif command == const.CMD_CLEAR_ATTLOG:
+                    with dev.lock:
+                        dev.attlog.clear()
+                    await reply(const.CMD_ACK_OK)
+
+                elif command == const.CMD_USER_WRQ:
+                    if len(data) >= 72:
+                        uid, priv, pwd, name, card, group_id, user_id = unpack("<HB8s24sIx7sx24s", data[:72])
+                        dec = lambda b: b.split(b"\x00")[0].decode(errors="ignore")
+                        dev.add_user(SimUser(uid, dec(user_id), dec(name), priv, dec(pwd), dec(group_id), card))
+                        await reply(const.CMD_ACK_OK)
+                    else:
+                        await reply(const.CMD_ACK_ERROR)
+
+                elif command == const.CMD_DELETE_USER:
+                    uid = unpack("<H", data[:2])[0]
+                    with dev.lock:
+                        dev.users.pop(uid, None)
+                    await reply(const.CMD_ACK_OK)
+
+                else:
+                    await reply(const.CMD_ACK_ERROR)
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+
+# ───────────────────────────────────────────────────────────────
+# CLI
+# ───────────────────────────────────────────────────────────────
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m sis3_reloj.zk_simulator", description="Reloj ZKTeco simulado (TCP).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=4370)
+    ap.add_argument("--password", type=int, default=0, help="comm key (0 = sin auth)")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--records", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--loss", type=float, default=0.0, help="probabilidad de segmento perdido (retardo RTO)")
+    ap.add_argument("--rto-ms", type=float, default=200.0)
+    ap.add_argument("--drop", type=float, default=0.0, help="probabilidad de cortar la conexión por comando")
+    ap.add_argument("--bandwidth-kbps", type=float, default=0.0)
+    ap.add_argument("--chunk-delay-ms", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    device = SimDevice(password=args.password)
+    device.seed(users=args.users, records=args.records, seed=args.seed)
+    sim = ZKSimulator(device, SimOptions(
+        latency_ms=args.latency_ms, loss=args.loss, rto_ms=args.rto_ms, drop=args.drop,
+        bandwidth_kbps=args.bandwidth_kbps, chunk_delay_ms=args.chunk_delay_ms, seed=args.seed,
+    ))
+
+    async def _run():
+        port = await sim.serve(args.host, args.port)
+        print(f"Simulador ZK escuchando en {args.host}:{port} (users={args.users}, records={args.records}). Ctrl+C para salir.")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
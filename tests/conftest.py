@@ -0,0 +1,90 @@
+# tests/conftest.py
+"""
+Fixtures compartidas: reloj simulado (zk_simulator), state aislado en tmp
+y sinks SIS2/SIS3 falsos que solo registran lo que reciben.
+"""
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sis3_reloj import gui_tab_sis2, gui_tab_sis3  # noqa: E402
+from sis3_reloj.zk_client import invalidate_user_index  # noqa: E402
+from sis3_reloj.zk_simulator import SimDevice, SimUser, ZKSimulator  # noqa: E402
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+    return tmp_path
+
+
+@pytest.fixture
+def sim():
+    device = SimDevice()
+    for i in range(1, 4):
+        device.add_user(SimUser(uid=i, user_id=str(i), name=f"Empleado {i}"))
+    server = ZKSimulator(device)
+    port = server.start_in_thread()
+    yield SimpleNamespace(device=device, port=port)
+    server.stop()
+    invalidate_user_index("127.0.0.1", port)  # el puerto se puede reutilizar
+
+
+class PunchClock:
+    """
+    Agrega checadas con timestamps siempre crecientes.
+    """
+
+    def __init__(self, device: SimDevice):
+        self.device = device
+        self.ts = datetime(2025, 3, 3, 8, 0, 0)
+
+    def punch(self, n: int) -> None:
+        for i in range(n):
+            self.ts += timedelta(minutes=1)
+            self.device.add_punch(str(i % 3 + 1), self.ts)
+
+
+@pytest.fixture
+def punches(sim):
+    return PunchClock(sim.device)
+
+
+@pytest.fixture
+def cfg(state_dir):
+    # Transición: SIS2 conectado (SIS3 no limpia, SIS2 sí)
+    return SimpleNamespace(
+        output_dir=str(state_dir / "out"),
+        sis2_disconnected=False,
+        sis2_enabled=True,
+        sis2_mode="http",
+        sis3_base_url="http://sis3.invalid",
+        sis3_api_key="test",
+        fleet_max_workers=2,
+    )
+
+
+@pytest.fixture
+def sinks(monkeypatch):
+    """
+    Reemplaza los envíos a SIS2/SIS3; regresa {"sis2": [...], "sis3": [...]}
+    con (user_id, timestamp) de cada checada recibida.
+    """
+    received: dict = {"sis2": [], "sis3": []}
+
+    def _sink(kind):
+        def _send(records, *_args, **_kwargs):
+            received[kind].extend((r.user_id, r.timestamp) for r in records)
+            return {"ok": True, "received": len(records)}
+        return _send
+
+    monkeypatch.setattr(gui_tab_sis2, "send_attendance_to_sis2", _sink("sis2"))
+    monkeypatch.setattr(gui_tab_sis3, "send_attendance_to_sis3", _sink("sis3"))
+    return received
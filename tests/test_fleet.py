@@ -0,0 +1,18 @@
+# tests/test_fleet.py
+from sis3_reloj.config import DeviceConfig
+from sis3_reloj.fleet import run_fleet
+
+
+def test_auto_target_delivers_every_punch_to_sis3(sim, punches, cfg, sinks):
+    device = DeviceConfig(name="sim", ip="127.0.0.1", port=sim.port)
+
+    for _ in range(3):
+        punches.punch(2)
+        [result] = run_fleet(cfg, target="auto", devices=[device])
+        assert result.ok, result.status_text()
+        assert list(result.results) == ["sis3", "sis2"]
+        assert result.results["sis2"].get("cleared")
+
+    assert len(sim.device.attlog) == 0
+    assert len(sinks["sis2"]) == 6
+    assert sorted(sinks["sis3"]) == sorted(sinks["sis2"])
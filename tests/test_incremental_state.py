@@ -0,0 +1,44 @@
+# tests/test_incremental_state.py
+from sis3_reloj.gui_tab_sis2 import _attendance_incremental_pipeline_in_session
+from sis3_reloj.gui_tab_sis3 import _attendance_incremental_pipeline_sis3_in_session
+from sis3_reloj.state_store import device_key, load_device_state
+from sis3_reloj.zk_client import DeviceSession
+
+
+def _cycle(port, cfg) -> dict:
+    log = lambda m: None
+    with DeviceSession("127.0.0.1", port, 0) as dev:
+        return {
+            "sis3": _attendance_incremental_pipeline_sis3_in_session(dev, cfg, log),
+            "sis2": _attendance_incremental_pipeline_in_session(dev, cfg, log),
+        }
+
+
+def test_clear_resets_record_count_for_every_target(sim, punches, cfg, sinks):
+    # Mismo número de checadas por ciclo: tras la limpieza de SIS2 el contador
+    # del reloj vuelve a valer lo mismo que SIS3 guardó en el ciclo anterior.
+    for _ in range(3):
+        punches.punch(2)
+        res = _cycle(sim.port, cfg)
+        assert res["sis3"]["ok"] and res["sis3"].get("no_clear")
+        assert res["sis2"].get("cleared")
+
+    assert len(sinks["sis2"]) == 6
+    assert len(sinks["sis3"]) == 6
+
+    dkey = device_key("127.0.0.1", sim.port)
+    for kind in ("sis2", "sis3"):
+        d = load_device_state(kind, dkey)
+        assert d["record_count"] == 0
+        assert d["cursor"] is None
+        assert d["last_ok_ts"] == punches.ts.isoformat()
+
+
+def test_skip_when_log_did_not_grow(sim, punches, cfg, sinks):
+    punches.punch(2)
+    _cycle(sim.port, cfg)
+
+    res = _cycle(sim.port, cfg)
+    assert res["sis3"]["reason"] == "no_new_records"
+    assert res["sis2"]["reason"] == "no_new_records"
+    assert len(sinks["sis3"]) == 2
@@ -0,0 +1,302 @@
+# tests/test_sis2_db.py
+"""
+Rutas SQL de sis2_sink contra conexiones/cursores falsos (sin SQL Server).
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from sis3_reloj import sis2_sink
+from sis3_reloj.retry import TransientError
+from sis3_reloj.sis2_sink import Sis2Config, _DbPool, _db_conn
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        assert len(params) <= sis2_sink._MSSQL_MAX_PARAMS
+        sql = " ".join(sql.split())
+        self.conn.executed.append((sql, tuple(params)))
+        self._rows = list(self.conn.results.pop(0)) if self.conn.results else []
+        self.rowcount = self.conn.rowcount(sql, params)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    def __init__(self, results=None):
+        self.results = list(results or [])  # filas por cada execute, en orden
+        self.executed = []
+        self.rollbacks = 0
+        self.commits = 0
+        self.closed = False
+
+    def rowcount(self, sql, params):
+        return len(params) if sql.startswith("UPDATE") else 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed = True
+
+
+def _cfg(**kw) -> Sis2Config:
+    base = dict(
+        enabled=True, mode="db", drop_dir=Path("."), base_url="", api_key="", timeout_sec=1,
+        db_server="sql.test", db_username="u", db_password="p",
+    )
+    base.update(kw)
+    return Sis2Config(**base)
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    made = []
+
+    def _connect(cfg):
+        cn = FakeConn()
+        made.append(cn)
+        return cn
+
+    monkeypatch.setattr(sis2_sink, "_db_connect", _connect)
+    monkeypatch.setattr(sis2_sink, "_DB_POOLS", {})
+    return made
+
+
+# ───────────────────────────────────────────────────────────────
+# Pool
+# ───────────────────────────────────────────────────────────────
+def test_pool_blocks_at_max_size_until_release(connects):
+    pool = _DbPool(_cfg(db_pool_size=1, timeout_sec=5))
+    first = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.2)
+    assert got == []  # esperando
+
+    pool.release(first)
+    waiter.join(timeout=2)
+    assert got == [first]
+    assert len(connects) == 1
+
+
+def test_pool_exhausted_times_out(connects):
+    pool = _DbPool(_cfg(db_pool_size=1, timeout_sec=1))
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(TransientError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.9
+
+
+def test_pool_drops_idle_connections(connects):
+    pool = _DbPool(_cfg(db_pool_size=2, db_pool_max_idle_sec=60))
+    old = pool.acquire()
+    pool.release(old)
+    pool._idle = [(cn, returned_at - 61) for cn, returned_at in pool._idle]
+
+    fresh = pool.acquire()
+    assert fresh is not old
+    assert old.closed
+    assert pool._open == 1
+
+
+def test_release_rolls_back_open_transaction(connects):
+    with _db_conn(_cfg()) as cn:
+        cn.cursor().execute("SELECT 1")
+    assert cn.rollbacks == 1
+    assert not cn.closed
+
+
+def test_base_exception_frees_pool_slot(connects):
+    cfg = _cfg(db_pool_size=1)
+    with pytest.raises(KeyboardInterrupt):
+        with _db_conn(cfg):
+            raise KeyboardInterrupt
+    assert connects[0].closed
+
+    with _db_conn(cfg) as cn:  # no se queda esperando el hueco
+        assert cn is connects[1]
+
+
+# ───────────────────────────────────────────────────────────────
+# Inserción de asistencia
+# ───────────────────────────────────────────────────────────────
+T0 = datetime(2025, 3, 3, 8, 0, 0)
+
+
+def _asis_rows(n, *, ids=None):
+    return [((ids or (lambda i: i + 1))(i), T0 + timedelta(seconds=i), "0", 0) for i in range(n)]
+
+
+def test_values_chunks_stay_under_param_limit():
+    cn = FakeConn()
+    sis2_sink._insert_values_chunked(cn.cursor(), "INSERT INTO t (a, b, c, d) VALUES", _asis_rows(1200))
+
+    sizes = [len(params) // 4 for _, params in cn.executed]
+    assert sizes == [524, 524, 152]  # (2100 - 1) // 4 columnas
+    assert all(sql.count("(%s, %s, %s, %s)") == n for (sql, _), n in zip(cn.executed, sizes))
+
+
+def test_values_chunks_cap_at_1000_rows():
+    cn = FakeConn()
+    sis2_sink._insert_values_chunked(cn.cursor(), "INSERT INTO t (a) VALUES", [(i,) for i in range(2500)])
+    assert [len(params) for _, params in cn.executed] == [1000, 1000, 500]
+
+
+class BulkConn(FakeConn):
+    inserted = 0
+
+    def rowcount(self, sql, params):
+        return self.inserted if "SELECT DISTINCT" in sql else 0
+
+
+def test_bulk_stages_then_inserts_set_based():
+    cn = BulkConn()
+    cn.inserted = 1190
+    inserted, skipped = sis2_sink._insert_asistencia_bulk(cn.cursor(), _asis_rows(1200))
+
+    assert (inserted, skipped) == (1190, 10)
+    sqls = [sql for sql, _ in cn.executed]
+    assert sqls[0].startswith("IF OBJECT_ID('tempdb..#sis2_asistencia')")
+    assert "INTO #sis2_asistencia" in sqls[1]
+    assert [s.startswith("INSERT INTO #sis2_asistencia") for s in sqls[2:5]] == [True] * 3
+    assert "NOT EXISTS" in sqls[5] and "UPDLOCK, HOLDLOCK" in sqls[5]
+    assert sqls[6] == "DROP TABLE #sis2_asistencia"
+
+
+def test_prefetch_queries_batch_ids_in_chunks():
+    rows = _asis_rows(4500)
+    cn = FakeConn(results=[[], [], []])
+    inserted, skipped = sis2_sink._insert_asistencia_prefetch(cn.cursor(), rows)
+
+    selects = [(sql, params) for sql, params in cn.executed if sql.startswith("SELECT")]
+    assert [len(params) - 2 for _, params in selects] == [2000, 2000, 500]
+    assert all("IdPersonal IN (" in sql for sql, _ in selects)
+    assert sorted(i for _, params in selects for i in params[2:]) == list(range(1, 4501))
+    assert (inserted, skipped) == (4500, 0)
+
+
+def test_prefetch_dedups_padded_char_tipo():
+    rows = _asis_rows(3) + [_asis_rows(3)[1]]  # duplicado dentro del lote
+    # SQL Server regresa Tipo char(n) con espacios a la derecha
+    existing = [(1, T0, "0  ", 0)]
+    cn = FakeConn(results=[existing])
+    inserted, skipped = sis2_sink._insert_asistencia_prefetch(cn.cursor(), rows)
+
+    assert (inserted, skipped) == (2, 2)
+    [(sql, params)] = [e for e in cn.executed if e[0].startswith("INSERT")]
+    assert params == (2, T0 + timedelta(seconds=1), "0", 0, 3, T0 + timedelta(seconds=2), "0", 0)
+
+
+# ───────────────────────────────────────────────────────────────
+# Personal (SIS2 → reloj)
+# ───────────────────────────────────────────────────────────────
+def test_mark_synced_bulk_one_transaction(connects):
+    marked = sis2_sink.mark_personal_synced_bulk(_cfg(), list(range(4500)) + [7, 7])
+
+    [cn] = connects
+    updates = [params for sql, params in cn.executed if sql.startswith("UPDATE")]
+    assert [len(p) for p in updates] == [2000, 2000, 500]
+    assert marked == 4500
+    assert cn.commits == 1
+
+
+class PersonalConn(FakeConn):
+    """
+    Tb_Personal en memoria: evalúa el keyset de _SQL_PENDING_PERSONAL.
+    """
+
+    def __init__(self, table):
+        super().__init__()
+        self.table = table  # (IdPersonal, FechaAlta)
+
+    def cursor(self):
+        conn = self
+
+        class _Cur(FakeCursor):
+            def execute(self, sql, params=()):
+                super().execute(sql, params)
+                sql = conn.executed[-1][0]
+                limit = int(re.search(r"TOP \((\d+)\)", sql).group(1))
+                if "FechaAlta IS NULL AND IdPersonal > %s" in sql:
+                    keep = [r for r in conn.table if r[1] is None and r[0] > params[0]]
+                elif "FechaAlta IS NOT NULL" in sql:
+                    keep = [r for r in conn.table if r[1] is not None]
+                else:
+                    fecha, _, last_id = params
+                    keep = [
+                        r for r in conn.table
+                        if r[1] is not None and (r[1] > fecha or (r[1] == fecha and r[0] > last_id))
+                    ]
+                keep.sort(key=lambda r: (r[1] is not None, r[1] or T0, r[0]))
+                self._rows = [(i, f"N{i}", "", "", "A", "", 0, 0, f) for i, f in keep[:limit]]
+
+        return _Cur(self)
+
+
+@pytest.fixture
+def personal(monkeypatch):
+    box = {}
+    monkeypatch.setattr(sis2_sink, "_db_connect", lambda cfg: box["conn"])
+    monkeypatch.setattr(sis2_sink, "_DB_POOLS", {})
+
+    def _setup(table):
+        box["conn"] = PersonalConn(table)
+        return box["conn"]
+
+    return _setup
+
+
+def _pages(page_size):
+    return [[p["IdPersonal"] for p in page] for page in sis2_sink.iter_pending_personal_from_sis2_db(_cfg(), page_size=page_size)]
+
+
+def test_keyset_null_phase_then_dated_phase(personal):
+    day = datetime(2024, 5, 1)
+    # 5 sin FechaAlta (página completa justo al final de la fase NULL) y
+    # 7 con fecha, con empates de FechaAlta que cruzan el borde de página
+    table = [(i, None) for i in (40, 3, 17, 8, 21)]
+    table += [(30, day), (2, day), (9, day), (50, day + timedelta(days=1)), (1, day + timedelta(days=1)),
+              (5, day + timedelta(days=2)), (6, day + timedelta(days=2))]
+    cn = personal(table)
+
+    pages = _pages(5)
+
+    assert pages == [[3, 8, 17, 21, 40], [2, 9, 30, 1, 50], [5, 6]]
+    sqls = [sql for sql, _ in cn.executed]
+    assert sum("FechaAlta IS NULL AND IdPersonal > %s" in s for s in sqls) == 2  # la 2a vacía → cambia de fase
+    assert sum("FechaAlta IS NOT NULL" in s for s in sqls) == 1
+    assert cn.executed[-1][1] == (day + timedelta(days=1), day + timedelta(days=1), 50)
+
+
+def test_keyset_full_last_page_ends_with_empty_query(personal):
+    day = datetime(2024, 5, 1)
+    cn = personal([(i, day + timedelta(hours=i % 3)) for i in range(1, 11)])
+
+    pages = _pages(5)
+
+    assert sorted(i for page in pages for i in page) == list(range(1, 11))
+    assert [len(p) for p in pages] == [5, 5]
+    # NULL (vacía) + 2 páginas con fecha + 1 vacía que confirma el final
+    assert len(cn.executed) == 4
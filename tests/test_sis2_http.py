@@ -0,0 +1,83 @@
+# tests/test_sis2_http.py
+"""
+SIS2 en modo http (servidor local) y validación de [sis2]/[sis3] compression.
+"""
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from sis3_reloj import config, sis2_sink
+from sis3_reloj.gui_tab_sis2 import _attendance_incremental_pipeline_in_session
+from sis3_reloj.gui_tab_sis3 import _attendance_incremental_pipeline_sis3_in_session
+from sis3_reloj.sis2_sink import Sis2Config, send_attendance_to_sis2
+from sis3_reloj.zk_client import AttendanceRecord, DeviceSession
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    peers: list = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.peers.append(self.client_address)
+        reply = json.dumps({"ok": True, "received": len(body["records"])}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sis2_http(monkeypatch):
+    _Handler.peers = []
+    monkeypatch.setattr(sis2_sink, "_HTTP_SESSIONS", {})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield Sis2Config(
+        enabled=True, mode="http", drop_dir=Path("."),
+        base_url=f"http://127.0.0.1:{server.server_port}", api_key="k", timeout_sec=5,
+    )
+    server.shutdown()
+
+
+def test_http_batches_reuse_one_connection(sis2_http):
+    rec = AttendanceRecord(user_id="1", status=1, punch=0, timestamp=datetime(2025, 3, 3, 8, 0))
+    for _ in range(3):
+        assert send_attendance_to_sis2([rec], sis2_http)["ok"] is True
+
+    assert len(_Handler.peers) == 3
+    assert len(set(_Handler.peers)) == 1  # mismo socket cliente
+
+
+def test_load_config_rejects_unknown_compression(tmp_path, monkeypatch):
+    ini = tmp_path / "config.ini"
+    ini.write_text("[reloj]\nip = 10.0.0.1\n\n[sis3]\ncompression = gzpi\n", encoding="utf-8")
+    monkeypatch.setattr(config, "CONFIG_PATH", ini)
+
+    with pytest.raises(ValueError, match=r"\[sis3\].*gzpi"):
+        config.load_config()
+
+    ini.write_text("[reloj]\nip = 10.0.0.1\n\n[sis2]\ncompression = GZIP\n", encoding="utf-8")
+    assert config.load_config().sis2_compression == "gzip"
+
+
+@pytest.mark.parametrize("kind", ["sis2", "sis3"])
+def test_invalid_compression_fails_before_device_read(kind, sim, punches, cfg, sinks):
+    punches.punch(3)
+    setattr(cfg, f"{kind}_compression", "gzpi")
+    run = _attendance_incremental_pipeline_in_session if kind == "sis2" else _attendance_incremental_pipeline_sis3_in_session
+
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        res = run(dev, cfg, lambda m: None)
+        assert not dev.is_open  # ni siquiera conectó
+
+    assert res["ok"] is False and res["stage"] == "config"
+    assert sinks[kind] == []
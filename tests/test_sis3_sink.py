@@ -0,0 +1,94 @@
+# tests/test_sis3_sink.py
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sis3_reloj.sis3_sink import Sis3Client, Sis3Config, send_attendance_to_sis3
+from sis3_reloj.zk_client import AttendanceRecord
+
+
+class _Handler(BaseHTTPRequestHandler):
+    posts: list = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.posts.append(body)
+        records = body["records"]
+        reply = json.dumps({
+            "ok": True,
+            "received": len(records),
+            "inserted": len(records) - 1,
+            "skipped": 1,
+            "duplicates": [records[0]["user_id"]],
+            "errors": [],
+            "batch_id": 100 + body["batch"]["chunk"]["index"],
+            "status": 201,
+            "meta": {"version": 3, "warnings": [body["batch"]["chunk"]["index"]]},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sis3():
+    _Handler.posts = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = Sis3Config(
+        base_url=f"http://127.0.0.1:{server.server_port}",
+        api_key="test",
+        chunk_records=3,
+        max_in_flight=1,
+    )
+    client = Sis3Client(cfg)
+    yield cfg, client
+    client.close()
+    server.shutdown()
+
+
+def _records(n):
+    t = datetime(2025, 3, 3, 8, 0, 0)
+    return [
+        AttendanceRecord(user_id=str(i), status=1, punch=0, timestamp=t + timedelta(minutes=i))
+        for i in range(n)
+    ]
+
+
+def _send(records, sis3):
+    cfg, client = sis3
+    return send_attendance_to_sis3(
+        records, cfg, device_ip="127.0.0.1", device_port=4370, file_tag="t", client=client
+    )
+
+
+def test_chunk_responses_are_merged(sis3):
+    res = _send(_records(7), sis3)
+
+    assert len(_Handler.posts) == 3
+    assert res["ok"] is True
+    assert res["chunks"] == 3
+    assert (res["received"], res["inserted"], res["skipped"]) == (7, 4, 3)
+    # campos propios del servidor
+    assert res["duplicates"] == ["0", "3", "6"]
+    assert res["errors"] == []
+    # escalares no contadores: el del último chunk (no la suma)
+    assert res["batch_id"] == 103
+    assert res["status"] == 201
+    assert res["meta"] == {"version": 3, "warnings": [1, 2, 3]}
+
+
+def test_empty_input_does_not_post(sis3):
+    res = _send([], sis3)
+
+    assert _Handler.posts == []
+    assert res["ok"] is True
+    assert (res["received"], res["inserted"], res["skipped"], res["chunks"]) == (0, 0, 0, 0)
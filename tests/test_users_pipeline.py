@@ -0,0 +1,66 @@
+# tests/test_users_pipeline.py
+import socket
+
+import pytest
+
+from sis3_reloj import gui_tab_sis2
+from sis3_reloj.retry import RetryPolicy, set_retry_policy
+from sis3_reloj.zk_client import DeviceSession
+
+
+@pytest.fixture
+def users_cfg(cfg):
+    cfg.sis2_mode = "db"
+    cfg.sis2_db_password = "test"
+    return cfg
+
+
+@pytest.fixture
+def pending(monkeypatch):
+    box = {"pages": [], "reads": 0, "marked": []}
+
+    def _iter(cfg, **kw):
+        for page in box["pages"]:
+            box["reads"] += 1
+            yield page
+
+    def _mark(cfg, ids, **kw):
+        box["marked"].extend(ids)
+        return len(ids)
+
+    monkeypatch.setattr(gui_tab_sis2, "iter_pending_personal_from_sis2_db", _iter)
+    monkeypatch.setattr(gui_tab_sis2, "mark_personal_synced_bulk", _mark)
+    return box
+
+
+def _person(idp):
+    return {"IdPersonal": idp, "full_name": f"Persona {idp}", "Privilegio": 0, "ClaveChecador": "", "Estatus": "A"}
+
+
+def test_pages_applied_and_marked(sim, users_cfg, pending):
+    pending["pages"] = [[_person(10), _person(11)], [_person(12)]]
+
+    res = gui_tab_sis2._users_bd_to_device_pipeline("127.0.0.1", sim.port, 0, users_cfg, lambda m: None)
+
+    assert res["ok"] and (res["applied"], res["failed"], res["marked"]) == (3, 0, 3)
+    assert sorted(pending["marked"]) == [10, 11, 12]
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        assert {"10", "11", "12"} <= {u.user_id for u in dev.read_users(refresh=True)}
+
+
+def test_unreachable_clock_reports_device_stage(users_cfg, pending):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # nadie escucha aquí
+    pending["pages"] = [[_person(10)]]
+
+    set_retry_policy("connect", RetryPolicy(attempts=1))
+    try:
+        res = gui_tab_sis2._users_bd_to_device_pipeline("127.0.0.1", port, 0, users_cfg, lambda m: None)
+    finally:
+        set_retry_policy("connect", None)
+
+    assert res["ok"] is False
+    assert res["stage"] == "device"
+    assert pending["reads"] == 0  # SIS2 ni se leyó
+    assert pending["marked"] == []
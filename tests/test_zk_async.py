@@ -0,0 +1,62 @@
+# tests/test_zk_async.py
+"""
+AsyncDeviceSession / zk_async contra el simulador (mismo resultado que pyzk).
+"""
+import asyncio
+
+from sis3_reloj.zk_client import AsyncDeviceSession, DeviceSession
+
+
+def _rows(records):
+    return [(r.user_id, r.status, r.punch, r.timestamp) for r in records]
+
+
+def test_async_read_matches_pyzk(sim, punches):
+    punches.punch(300)
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        expected = _rows(dev.read_attendance())
+
+    async def _read_concurrently():
+        async def _one():
+            async with AsyncDeviceSession("127.0.0.1", sim.port, 0) as dev:
+                return _rows(await dev.read_attendance())
+        return await asyncio.gather(*(_one() for _ in range(4)))
+
+    for rows in asyncio.run(_read_concurrently()):
+        assert rows == expected
+
+
+def test_async_cursor_and_verified_clear(sim, punches):
+    punches.punch(10)
+
+    async def _run():
+        async with AsyncDeviceSession("127.0.0.1", sim.port, 0) as dev:
+            stats: dict = {}
+            first = await dev.read_attendance_batch(stats=stats)
+            punches.punch(3)
+            stats2: dict = {}
+            tail = await dev.read_attendance_batch(cursor=stats["cursor"], stats=stats2)
+            stale = await dev.clear_attendance(expected_count=stats["total"])
+            cleared = await dev.clear_attendance(expected_count=stats2["total"])
+            return len(first), len(tail), stats2["cursor_skipped"], stale, cleared, await dev.record_count()
+
+    assert asyncio.run(_run()) == (10, 3, 10, False, True, 0)
+
+
+def test_async_user_writes(sim):
+    async def _run():
+        async with AsyncDeviceSession("127.0.0.1", sim.port, 0) as dev:
+            up = await dev.upsert_users([
+                {"user_id": "2", "name": "Renombrado"},
+                {"user_id": "77", "name": "Nuevo"},
+            ])
+            gone = await dev.delete_users(["1", "404"])
+            return up, gone
+
+    up, gone = asyncio.run(_run())
+    assert [(r["action"], r["ok"]) for r in up] == [("updated", True), ("created", True)]
+    assert [(r["action"], r["ok"]) for r in gone] == [("deleted", True), ("missing", True)]
+
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        users = {u.user_id: u.name for u in dev.read_users(refresh=True)}
+    assert users == {"2": "Renombrado", "3": "Empleado 3", "77": "Nuevo"}
@@ -0,0 +1,157 @@
+# tests/test_zk_client.py
+import time
+from datetime import datetime, timedelta
+
+from sis3_reloj.zk_client import DeviceSession
+
+
+def test_decode_span_excludes_consumer_time(sim, punches):
+    punches.punch(20)
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        for _ in dev.iter_attendance():
+            time.sleep(0.01)  # sink lento
+        [decode] = [s for s in dev.spans if s.phase == "decode"]
+
+    assert decode.ok
+    assert decode.records == 20
+    assert decode.elapsed_sec < 0.1
+
+
+def test_filter_stats_split_cursor_and_date(sim, punches):
+    punches.punch(10)
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        stats: dict = {}
+        since = sorted(r.timestamp for r in dev.iter_attendance())[3]
+        records = list(dev.iter_attendance(since=since, stats=stats))
+        assert len(records) == 6
+        assert (stats["total"], stats["cursor_skipped"], stats["filtered"], stats["yielded"]) == (10, 0, 4, 6)
+
+        punches.punch(5)
+        since = punches.ts - timedelta(minutes=3)  # las 2 primeras nuevas ya se entregaron
+        stats2: dict = {}
+        records = list(dev.iter_attendance(since=since, cursor=stats["cursor"], stats=stats2))
+
+    assert len(records) == 3
+    assert stats2["cursor_skipped"] == 10
+    assert stats2["filtered"] == 2
+    assert stats2["yielded"] == 3
+    assert stats2["total"] == stats2["cursor_skipped"] + stats2["filtered"] + stats2["yielded"] == 15
+
+
+def test_clear_retry_after_lost_reply_counts_as_cleared(sim, punches, monkeypatch):
+    from zk.base import ZK
+    from zk.exception import ZKNetworkError
+
+    from sis3_reloj.retry import RetryPolicy, set_retry_policy
+
+    punches.punch(5)
+    real_clear = ZK.clear_attendance
+    calls = []
+
+    def _clear_then_timeout(self):
+        calls.append(1)
+        real_clear(self)
+        if len(calls) == 1:
+            raise ZKNetworkError("timeout esperando respuesta")  # el reloj sí limpió
+
+    monkeypatch.setattr(ZK, "clear_attendance", _clear_then_timeout)
+    set_retry_policy("clear", RetryPolicy(attempts=2, base_delay_sec=0))
+    try:
+        with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+            assert dev.clear_attendance(expected_count=5) is True
+    finally:
+        set_retry_policy("clear", None)
+
+    assert len(calls) == 1
+    assert len(sim.device.attlog) == 0
+
+
+def test_shared_user_index_tolerates_concurrent_writes():
+    import threading
+
+    from sis3_reloj.zk_client import DeviceUser, DeviceUserIndex
+
+    index = DeviceUserIndex((DeviceUser(uid=i, user_id=str(i)) for i in range(1, 2001)), (2000, 0, 0, 0))
+    errors = []
+    stop = threading.Event()
+
+    def _writer(offset):
+        for i in range(20000):
+            user_id = str(5000 + offset + i % 500)
+            index.put(DeviceUser(uid=5000 + offset + i % 500, user_id=user_id))
+            index.remove(user_id)
+        stop.set()
+
+    def _reader():
+        try:
+            while not stop.is_set():
+                index.next_uid()
+                len(index.users())  # copia bajo el lock
+        except Exception as e:  # "dictionary changed size during iteration"
+            errors.append(e)
+
+    threads = [threading.Thread(target=_writer, args=(o,)) for o in (0, 1000)]
+    threads += [threading.Thread(target=_reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(index) == 2000
+
+
+def test_derived_batch_does_not_share_user_table():
+    from datetime import datetime
+
+    from sis3_reloj.zk_client import AttendanceBatch
+
+    t = datetime(2025, 3, 3, 8, 0, 0)
+    parent = AttendanceBatch()
+    for i in range(4):
+        parent.append_raw(str(i % 2), 1, 0, t + timedelta(minutes=i))
+
+    for derived in (parent[1:3], parent.filter_after(t)):
+        derived.append_raw("99", 1, 0, t + timedelta(hours=1))
+        assert derived[-1].user_id == "99"
+
+    assert parent._user_ids == ["0", "1"]
+    assert "99" not in parent._code_of
+    assert [r.user_id for r in parent] == ["0", "1", "0", "1"]
+
+
+def test_attlog_stride_tolerates_growth_after_read_sizes():
+    from sis3_reloj.zk_client import _attlog_stride
+
+    # 10 registros de 40 según read_sizes(); al leer ya hay 12
+    assert _attlog_stride(12 * 40, 10) == 40
+    assert _attlog_stride(10 * 40, 10) == 40
+    assert _attlog_stride(7 * 16, 5) == 16
+    assert _attlog_stride(3 * 8, 2) == 8
+    # read_sizes() vio el log vacío pero ya llegó una checada
+    assert _attlog_stride(40, 0) == 40
+    assert _attlog_stride(0, 0) == 0
+
+
+def test_cursor_read_with_punches_after_read_sizes(sim, punches, monkeypatch):
+    from sis3_reloj import zk_client
+
+    punches.punch(4)
+    stats = {}
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        list(dev.iter_attendance(stats=stats))
+    punches.punch(3)
+
+    real = zk_client._read_attlog_from
+
+    def _late(conn, first, records, **kw):
+        punches.punch(2)  # llegan entre read_sizes() y el prepare_data
+        return real(conn, first, records, **kw)
+
+    monkeypatch.setattr(zk_client, "_read_attlog_from", _late)
+    with DeviceSession("127.0.0.1", sim.port, 0) as dev:
+        got = list(dev.iter_attendance(cursor=stats["cursor"]))
+
+    t0 = datetime(2025, 3, 3, 8, 0, 0)
+    assert [r.timestamp for r in got][:3] == [t0 + timedelta(minutes=m) for m in (5, 6, 7)]
+    assert all(r.user_id in {"1", "2", "3"} for r in got)